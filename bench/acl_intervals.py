@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+#
+# Subscriber ACL startup and lookup: the old build_acl, which expanded every range into a
+# set of 3 byte radio IDs, against ipsc.dmrlink_acl's table of intervals. Each build runs in
+# its own process so that its peak RSS can be measured. The old set is only built for 1M and
+# 4M IDs; 16M (DENY:1-16777215) is extrapolated from those, which is how the old code got
+# the "about 1.5 seconds per 1 million IDs" it logged.
+#
+#   python bench/acl_intervals.py
+
+import os
+import sys
+import timeit
+import resource
+import subprocess
+
+from time import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ipsc.dmrlink_acl import subscriberACL
+
+FULL   = 16777215
+OLD_AT = (1000000, 4000000)
+N      = 200000
+
+
+# dmr_utils.utils.hex_str_3
+#
+def hex_str_3(_int_id):
+    return format(_int_id, 'x').rjust(6, '0').decode('hex')
+
+# What build_acl did with 'ACTION:id,start-end,...'
+#
+def old_build(_acl):
+    ACL = set()
+    sections = _acl.split(':')
+    ACL_ACTION = sections[0]
+    for entry in sections[1].split(','):
+        if '-' in entry:
+            start, end = entry.split('-')
+            start, end = int(start), int(end)
+            for id in range(start, end + 1):
+                ACL.add(hex_str_3(id))
+        else:
+            ACL.add(hex_str_3(int(entry)))
+    return ACL_ACTION, ACL
+
+def maxrss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+# Runs in a child process: build one ACL, print seconds and MB of RSS it added
+#
+def child(_kind, _ids):
+    _acl = 'DENY:1-{}'.format(_ids)
+    _rss = maxrss_mb()
+    _t0 = time()
+    if _kind == 'old':
+        _built = old_build(_acl)
+    else:
+        _built = subscriberACL(_acl)
+    print('{} {}'.format(time() - _t0, maxrss_mb() - _rss))
+
+def measure(_kind, _ids):
+    _out = subprocess.check_output([sys.executable, os.path.abspath(__file__), _kind, str(_ids)])
+    return [float(_x) for _x in _out.split()]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        child(sys.argv[1], int(sys.argv[2]))
+        sys.exit(0)
+
+    _old = [measure('old', _ids) for _ids in OLD_AT]
+    for _ids, (_secs, _mb) in zip(OLD_AT, _old):
+        print('old set, DENY:1-{:<9}  {:6.2f} s  {:7.0f} MB'.format(_ids, _secs, _mb))
+    # Straight line through the two measurements
+    _scale = (FULL - OLD_AT[0]) / float(OLD_AT[1] - OLD_AT[0])
+    _secs = _old[0][0] + (_old[1][0] - _old[0][0]) * _scale
+    _mb = _old[0][1] + (_old[1][1] - _old[0][1]) * _scale
+    print('old set, DENY:1-{:<9} ~{:5.1f} s  {:7.0f} MB (extrapolated)'.format(FULL, _secs, _mb))
+    _secs, _mb = measure('new', FULL)
+    print('intervals, DENY:1-{:<9} {:6.3f} ms {:5.1f} MB'.format(FULL, _secs * 1000, _mb))
+
+    # Lookups: a radio ID as it comes out of a packet, the same one every time as on the
+    # frames of a call (hot), and integer IDs straight into the table (cold)
+    _action, _set = old_build('DENY:1-{}'.format(OLD_AT[0]))
+    _sub = hex_str_3(3120001)
+
+    # The allow_sub() that build_acl defined for a DENY list
+    def allow_sub(_sub):
+        if _sub not in _set:
+            return True
+        else:
+            return False
+    for _ranges in (1, 100000):
+        _acl = subscriberACL('DENY:' + ','.join('{}-{}'.format(i * 100 + 1, i * 100 + 50) for i in xrange(_ranges)) if _ranges > 1 else 'DENY:1-{}'.format(FULL))
+        _hot = min(timeit.repeat(lambda: _acl.allow(_sub), number=N, repeat=5)) / N * 1e9
+        _cold = min(timeit.repeat(lambda: _acl.allow_id(3120001), number=N, repeat=5)) / N * 1e9
+        print('lookup, {:6} range(s): hot {:4.0f} ns, cold {:5.0f} ns'.format(len(_acl), _hot, _cold))
+    print('lookup, old set:          {:4.0f} ns'.format(min(timeit.repeat(lambda: allow_sub(_sub), number=N, repeat=5)) / N * 1e9))
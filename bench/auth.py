@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+#
+# Authenticated IPSC, HMAC work only: one 54 byte voice frame received (validate_auth) and
+# sent on to the IPSC (send_to_ipsc), with 1, 10 and 50 peers. The old path keyed a fresh
+# HMAC-SHA1 for every packet and went through hexdigest()/a2b_hex(); the new one copies the
+# template keyed once in IPSC.__init__ and truncates the raw digest. Both fan the frame out
+# with the same loop to a transport.write() that does nothing, so only the hashing differs.
+# The methods are copied from dmrlink.py, which can't be imported without Twisted.
+#
+#   python bench/auth.py
+
+import os
+import timeit
+
+from hmac import new as hmac_new
+from hmac import compare_digest
+from binascii import a2b_hex as bhex
+from hashlib import sha1
+
+PEERS  = (1, 10, 50)
+N      = 50000
+REPEAT = 5
+
+AUTH_KEY = bhex('0000000000000000000000000000000000012345')
+
+
+class transport(object):
+    def write(self, _packet, _dest):
+        pass
+
+
+class ipsc(object):
+    def __init__(self, _peers):
+        self._local = {'AUTH_ENABLED': True, 'AUTH_KEY': AUTH_KEY}
+        self._ipsc_dests = tuple(('10.0.0.{}'.format(i), 50000) for i in xrange(_peers))
+        self.transport = transport()
+
+    def strip_hash(self, _data):
+        return _data[:-10]
+
+    def send_to_ipsc(self, _packet):
+        if self._local['AUTH_ENABLED']:
+            _packet = _packet + self.outbound_hash(_packet)
+        _write = self.transport.write
+        for _dest in self._ipsc_dests:
+            _write(_packet, _dest)
+
+    def frame(self, _data):
+        if not self.validate_auth(self._local['AUTH_KEY'], _data):
+            raise ValueError('frame failed authentication')
+        self.send_to_ipsc(self.strip_hash(_data))
+
+
+# Before user-002: a fresh key schedule and a hex round trip for every packet
+#
+class old(ipsc):
+    def outbound_hash(self, _packet):
+        return bhex((hmac_new(self._local['AUTH_KEY'],_packet,sha1)).hexdigest()[:20])
+
+    def validate_auth(self, _key, _data):
+        _payload = self.strip_hash(_data)
+        _hash = _data[-10:]
+        _chk_hash = bhex((hmac_new(_key,_payload,sha1)).hexdigest()[:20])
+        if _chk_hash == _hash:
+            return True
+        else:
+            return False
+
+
+# Now: a copy of the keyed template, raw digest
+#
+class new(ipsc):
+    def __init__(self, _peers):
+        ipsc.__init__(self, _peers)
+        self._auth_hmac = hmac_new(self._local['AUTH_KEY'], digestmod=sha1)
+
+    def auth_hash(self, _data):
+        _hmac = self._auth_hmac.copy()
+        _hmac.update(_data)
+        return _hmac.digest()[:10]
+
+    outbound_hash = auth_hash
+
+    def validate_auth(self, _key, _data):
+        _payload = self.strip_hash(_data)
+        _hash = _data[-10:]
+        if _key == self._local['AUTH_KEY']:
+            _chk_hash = self.auth_hash(_payload)
+        else:
+            _chk_hash = hmac_new(_key,_payload,sha1).digest()[:10]
+        return compare_digest(_chk_hash, _hash)
+
+
+if __name__ == '__main__':
+    _payload = '\x80' + os.urandom(53)
+    _data = _payload + new(1).auth_hash(_payload)
+    assert old(1).outbound_hash(_payload) == new(1).auth_hash(_payload)
+
+    for _peers in PEERS:
+        _rates = []
+        for _cls in (old, new):
+            _frame = _cls(_peers).frame
+            _t = min(timeit.repeat(lambda: _frame(_data), number=N, repeat=REPEAT))
+            _rates.append(N / _t)
+        print('{:2} peer(s): old {:6.0f} frames/s, new {:6.0f} frames/s ({:.2f}x)'.format(_peers, _rates[0], _rates[1], _rates[1] / _rates[0]))
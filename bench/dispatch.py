@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+#
+# Opcode dispatch in IPSC.datagramReceived: the if/elif chain it used to be, with its list
+# membership tests against ANY_PEER_REQUIRED/PEER_REQUIRED/MASTER_REQUIRED/USER_PACKETS,
+# against the 256 entry dispatch table (see IPSC.build_dispatch). Both follow the real code
+# branch for branch; handlers and peer validation are stubs that do nothing, and both decode
+# the user packet header the same way, so only the dispatch itself differs. Needs neither
+# Twisted nor dmr_utils.
+#
+#   python bench/dispatch.py
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ipsc.ipsc_const import *
+from ipsc.ipsc_mask import END_MSK, TS_CALL_MSK
+
+VALID_NONE, VALID_ANY_PEER, VALID_PEER, VALID_MASTER = range(4)
+
+PEER   = '\x00\x00\x00\x01'
+MASTER = '\x00\x00\x00\x09'
+PEERS  = {PEER: {}}
+
+N      = 200000
+REPEAT = 15
+
+
+class base(object):
+    def valid_peer(self, _peerid):
+        return _peerid in PEERS
+
+    def valid_master(self, _peerid):
+        return _peerid == MASTER
+
+    def reset_keep_alive(self, _peerid):
+        pass
+
+    def handler(self, *_args):
+        pass
+
+    group_voice = private_voice = group_data = private_data = handler
+    xcmp_xnl = call_mon_status = call_mon_rpt = call_mon_nack = handler
+    de_register_peer = repeater_wake_up = unknown_message = handler
+    peer_alive_req = peer_reg_req = peer_alive_reply = peer_reg_reply = handler
+    master_alive_reply = peer_list_reply = master_reg_reply = handler
+    master_reg_req = master_alive_req = peer_list_req = handler
+
+
+# datagramReceived before the dispatch table (authentication and logging left out)
+#
+class chain(base):
+    def rx(self, data, host, port):
+        _packettype = data[0:1]
+        _peerid     = data[1:5]
+
+        if _packettype in ANY_PEER_REQUIRED:
+            if not(self.valid_master(_peerid) == False or self.valid_peer(_peerid) == False):
+                return
+            if _packettype in USER_PACKETS:
+                _src_sub    = data[6:9]
+                _dst_sub    = data[9:12]
+                _call_info  = ord(data[17])
+                _ts         = bool(_call_info & TS_CALL_MSK) + 1
+                _end        = bool(_call_info & END_MSK)
+                if _packettype == GROUP_VOICE:
+                    self.reset_keep_alive(_peerid)
+                    self.group_voice(_src_sub, _dst_sub, _ts, _end, _peerid, data)
+                    return
+                elif _packettype == PVT_VOICE:
+                    self.reset_keep_alive(_peerid)
+                    self.private_voice(_src_sub, _dst_sub, _ts, _end, _peerid, data)
+                    return
+                elif _packettype == GROUP_DATA:
+                    self.reset_keep_alive(_peerid)
+                    self.group_data(_src_sub, _dst_sub, _ts, _end, _peerid, data)
+                    return
+                elif _packettype == PVT_DATA:
+                    self.reset_keep_alive(_peerid)
+                    self.private_data(_src_sub, _dst_sub, _ts, _end, _peerid, data)
+                    return
+                return
+            elif _packettype == XCMP_XNL:
+                self.xcmp_xnl(data)
+                return
+            elif _packettype == CALL_MON_STATUS:
+                self.call_mon_status(data)
+                return
+            elif _packettype == CALL_MON_RPT:
+                self.call_mon_rpt(data)
+                return
+            elif _packettype == CALL_MON_NACK:
+                self.call_mon_nack(data)
+                return
+            elif _packettype == DE_REG_REQ:
+                self.de_register_peer(_peerid)
+                return
+            elif _packettype == DE_REG_REPLY:
+                return
+            elif _packettype == RPT_WAKE_UP:
+                self.repeater_wake_up(data)
+                return
+            return
+
+        if _packettype in PEER_REQUIRED:
+            if not self.valid_peer(_peerid):
+                return
+            if _packettype == PEER_ALIVE_REQ:
+                self.peer_alive_req(data, _peerid, host, port)
+                return
+            elif _packettype == PEER_REG_REQ:
+                self.peer_reg_req(_peerid, host, port)
+                return
+            elif _packettype == PEER_ALIVE_REPLY:
+                self.peer_alive_reply(_peerid)
+                return
+            elif _packettype == PEER_REG_REPLY:
+                self.peer_reg_reply(_peerid)
+                return
+            return
+
+        if _packettype in MASTER_REQUIRED:
+            if not self.valid_master(_peerid):
+                return
+            if _packettype == MASTER_ALIVE_REPLY:
+                self.master_alive_reply(_peerid)
+                return
+            elif _packettype == PEER_LIST_REPLY:
+                self.peer_list_reply(data, _peerid)
+                return
+            return
+
+        elif _packettype == MASTER_REG_REPLY:
+            self.master_reg_reply(data, _peerid)
+            return
+        elif _packettype == MASTER_REG_REQ:
+            self.master_reg_req(data, _peerid, host, port)
+            return
+        elif _packettype == MASTER_ALIVE_REQ:
+            self.master_alive_req(_peerid, host, port)
+            return
+        elif _packettype == PEER_LIST_REQ:
+            self.peer_list_req(_peerid)
+            return
+        else:
+            self.unknown_message(_packettype, _peerid, data)
+            return
+
+
+# datagramReceived with the dispatch table, registered as IPSC.build_dispatch does
+#
+class table(base):
+    def __init__(self):
+        self._dispatch = [(VALID_NONE, self.unknown_message, False)] * 256
+        for _opcode, _handler in ((GROUP_VOICE, self.group_voice), (PVT_VOICE, self.private_voice),
+                                  (GROUP_DATA, self.group_data), (PVT_DATA, self.private_data)):
+            self.register_opcode(_opcode, _handler, VALID_ANY_PEER, True)
+        for _opcode in (XCMP_XNL, CALL_MON_STATUS, CALL_MON_RPT, CALL_MON_NACK, DE_REG_REQ, DE_REG_REPLY, RPT_WAKE_UP):
+            self.register_opcode(_opcode, lambda _data, _peerid, _host, _port: self.handler(_data), VALID_ANY_PEER)
+        for _opcode in PEER_REQUIRED:
+            self.register_opcode(_opcode, lambda _data, _peerid, _host, _port: self.handler(_data, _peerid, _host, _port), VALID_PEER)
+        for _opcode in MASTER_REQUIRED:
+            self.register_opcode(_opcode, lambda _data, _peerid, _host, _port: self.handler(_data, _peerid), VALID_MASTER)
+        for _opcode in (MASTER_REG_REPLY, MASTER_REG_REQ, MASTER_ALIVE_REQ, PEER_LIST_REQ):
+            self.register_opcode(_opcode, lambda _data, _peerid, _host, _port: self.handler(_data, _peerid, _host, _port))
+
+    def register_opcode(self, _opcode, _handler, _policy=VALID_NONE, _user=False):
+        self._dispatch[ord(_opcode)] = (_policy, _handler, _user)
+
+    def rx(self, data, host, port):
+        _packettype = data[0:1]
+        _peerid     = data[1:5]
+
+        _policy, _handler, _user = self._dispatch[ord(_packettype)]
+        if _policy == VALID_ANY_PEER:
+            if not(self.valid_master(_peerid) == False or self.valid_peer(_peerid) == False):
+                return
+        elif _policy == VALID_PEER:
+            if not self.valid_peer(_peerid):
+                return
+        elif _policy == VALID_MASTER:
+            if not self.valid_master(_peerid):
+                return
+
+        if _user:
+            _src_sub    = data[6:9]
+            _dst_sub    = data[9:12]
+            _call_info  = ord(data[17])
+            _ts         = bool(_call_info & TS_CALL_MSK) + 1
+            _end        = bool(_call_info & END_MSK)
+            self.reset_keep_alive(_peerid)
+            _handler(_src_sub, _dst_sub, _ts, _end, _peerid, data)
+            return
+        _handler(data, _peerid, host, port)
+
+
+if __name__ == '__main__':
+    for _name, _opcode in (('GROUP_VOICE', GROUP_VOICE), ('PVT_DATA', PVT_DATA), ('RPT_WAKE_UP', RPT_WAKE_UP),
+                           ('PEER_ALIVE_REQ', PEER_ALIVE_REQ), ('PEER_REG_REPLY', PEER_REG_REPLY),
+                           ('MASTER_ALIVE_REPLY', MASTER_ALIVE_REPLY), ('MASTER_ALIVE_REQ', MASTER_ALIVE_REQ),
+                           ('PEER_LIST_REQ', PEER_LIST_REQ)):
+        _peer = MASTER if _opcode in MASTER_REQUIRED else PEER
+        _packet = _opcode + _peer + 'x' * 50
+        _rx = [chain().rx, table().rx]
+        _times = [float('inf')] * 2
+        # Alternate the two so that a noisy moment on the machine hits both alike
+        for _ in xrange(REPEAT):
+            for i in (0, 1):
+                _f = _rx[i]
+                _times[i] = min(_times[i], timeit.timeit(lambda: _f(_packet, '127.0.0.1', 50000), number=N) / N * 1e9)
+        print('{:20} chain {:5.0f} ns  table {:5.0f} ns  ({:+.0f}%)'.format(_name, _times[0], _times[1], (_times[1] / _times[0] - 1) * 100))
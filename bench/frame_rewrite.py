@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+#
+# Re-writing a bridged voice frame for each target in confbridge.group_voice: the three
+# str.replace() calls and re-slicing it used to do, against patching a bytearray at fixed
+# offsets. The call is the one in documents/voice_packets.txt (3 headers, 50 superframes of
+# bursts A-F, a terminator; 304 frames), sent to one bridge with 20 targets on alternating
+# timeslots. The re-write code is copied from confbridge.py, which can't be imported without
+# Twisted and dmr_utils. Also checks that the two give the same packets, apart from the TS2
+# burst type the old code got wrong.
+#
+#   python bench/frame_rewrite.py
+
+import os
+import sys
+import timeit
+
+from binascii import a2b_hex, b2a_hex as ahex
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ipsc.ipsc_const import BURST_DATA_TYPE
+
+TARGETS     = 20
+SUPERFRAMES = 50
+REPEAT      = 5
+
+RW_PEER       = 1
+RW_DST        = 9
+RW_CALL_INFO  = 17
+RW_TS_BIT     = 1 << 5
+RW_BURST      = 30
+RW_LC_HDR     = 41
+RW_LC_BURST_E = 59
+RW_BURST_E_LEN = 66
+
+
+def int_id(_hex_string):
+    return int(ahex(_hex_string), 16)
+
+
+def lc_dst_offset(_data, _burst_data_type, _lc):
+    if _burst_data_type == BURST_DATA_TYPE['VOICE_HEAD'] or _burst_data_type == BURST_DATA_TYPE['VOICE_TERM']:
+        _offset = RW_LC_HDR
+    elif len(_data) == RW_BURST_E_LEN:
+        _offset = RW_LC_BURST_E
+    else:
+        return 0
+    if _data[_offset:_offset+6] == _lc:
+        return _offset
+    return 0
+
+def mk_rewrite(_target_system, _target):
+    if _target['TS'] == 2:
+        return (_target_system['LOCAL']['RADIO_ID'], _target['TGID'], RW_TS_BIT, ord(BURST_DATA_TYPE['SLOT2_VOICE']))
+    return (_target_system['LOCAL']['RADIO_ID'], _target['TGID'], 0, ord(BURST_DATA_TYPE['SLOT1_VOICE']))
+
+
+# documents/voice_packets.txt: one packet per line, bytes as dotted hex with '|' between
+# the IPSC, RTP and payload parts
+#
+def load_call():
+    _path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'documents', 'voice_packets.txt')
+    with open(_path) as _f:
+        _packets = [a2b_hex(''.join(_line.replace('|', ' ').replace('.', ' ').split())) for _line in _f if _line.strip()]
+    _heads, _bursts, _term = _packets[0:3], _packets[3:9], _packets[9]
+    return _heads + _bursts * SUPERFRAMES + [_term]
+
+
+def old_forward(_frames, _routes, _send):
+    for _data in _frames:
+        _peerid = _data[1:5]
+        _src_sub = _data[6:9]
+        _dst_group = _data[9:12]
+        _burst_data_type = _data[30]
+        for _target, _target_system in _routes:
+            _tmp_data = _data
+            _tmp_data = _tmp_data.replace(_peerid,  _target_system['LOCAL']['RADIO_ID'], 1)
+            _tmp_data = _tmp_data.replace(_src_sub + _dst_group, _src_sub + _target['TGID'], 1)
+            _tmp_data = _tmp_data.replace(_dst_group + _src_sub, _target['TGID'] + _src_sub, 1)
+            _call_info = int_id(_data[17:18])
+            if _target['TS'] == 1:
+                _call_info &= ~(1 << 5)
+            elif _target['TS'] == 2:
+                _call_info |= 1 << 5
+            _call_info = chr(_call_info)
+            _tmp_data = _tmp_data[:17] + _call_info + _tmp_data[18:]
+            if _burst_data_type == BURST_DATA_TYPE['SLOT1_VOICE'] or _burst_data_type == BURST_DATA_TYPE['SLOT2_VOICE']:
+                _slot_valid = True
+            else:
+                _slot_valid = False
+            if _slot_valid:
+                if _target['TS'] == 1:
+                    _burst_data_type = BURST_DATA_TYPE['SLOT1_VOICE']
+                elif _target['TS'] == 1:
+                    _burst_data_type = BURST_DATA_TYPE['SLOT2_VOICE']
+                _tmp_data = _tmp_data[:30] + _burst_data_type + _tmp_data[31:]
+            _send(_tmp_data)
+
+
+def new_forward(_frames, _rewrites, _send):
+    for _data in _frames:
+        _src_sub = _data[6:9]
+        _dst_group = _data[9:12]
+        _burst_data_type = _data[30]
+        _lc_offset = lc_dst_offset(_data, _burst_data_type, _dst_group + _src_sub)
+        _call_info = ord(_data[RW_CALL_INFO]) & ~RW_TS_BIT
+        _slot_voice = (_burst_data_type == BURST_DATA_TYPE['SLOT1_VOICE'] or _burst_data_type == BURST_DATA_TYPE['SLOT2_VOICE'])
+        for _peer, _tgid, _ts_bit, _slot_burst in _rewrites:
+            _frame = bytearray(_data)
+            _frame[RW_PEER:RW_PEER+4] = _peer
+            _frame[RW_DST:RW_DST+3] = _tgid
+            _frame[RW_CALL_INFO] = _call_info | _ts_bit
+            if _slot_voice:
+                _frame[RW_BURST] = _slot_burst
+            if _lc_offset:
+                _frame[_lc_offset:_lc_offset+3] = _tgid
+            _send(str(_frame))
+
+
+if __name__ == '__main__':
+    _frames = load_call()
+    _routes = []
+    for i in xrange(TARGETS):
+        _target = {'SYSTEM': 'IPSC{}'.format(i), 'TS': i % 2 + 1, 'TGID': chr(0) + chr(0x10) + chr(i + 1)}
+        _target_system = {'LOCAL': {'RADIO_ID': '\x00\x31\x00' + chr(i + 1)}}
+        _routes.append((_target, _target_system))
+    _rewrites = [mk_rewrite(_target_system, _target) for _target, _target_system in _routes]
+
+    _old, _new = [], []
+    old_forward(_frames, _routes, _old.append)
+    new_forward(_frames, _rewrites, _new.append)
+    _same = sum(1 for _a, _b in zip(_old, _new) if _a == _b)
+    _burst_only = sum(1 for _a, _b in zip(_old, _new) if _a != _b and _a[:30] + _a[31:] == _b[:30] + _b[31:])
+    print('{} frames x {} targets: {} packets identical, {} differ only in the burst type, {} otherwise'.format(
+        len(_frames), TARGETS, _same, _burst_only, len(_old) - _same - _burst_only))
+
+    _sink = lambda _packet: None
+    for _name, _run, _arg in (('str.replace', old_forward, _routes), ('bytearray', new_forward, _rewrites)):
+        _t = min(timeit.repeat(lambda: _run(_frames, _arg, _sink), number=1, repeat=REPEAT))
+        print('{:12} {:6.1f} us/frame ({:.2f} us/packet)'.format(_name, _t / len(_frames) * 1e6, _t / len(_frames) / TARGETS * 1e6))
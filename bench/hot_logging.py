@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+#
+# Per-packet logging cost on the user packet path, old against new, at the INFO and WARNING
+# levels. Records go through a FileHandler to /dev/null, so formatting and the write are
+# counted but no disk is involved.
+#
+#   ts/end   datagramReceived logging _ts and _end at INFO for every packet, against the
+#            hot-path trace check that replaced it (trace off)
+#   data     group_data logging the packet hex at INFO, against the guarded DEBUG message
+#            with lazyHex
+#
+#   python bench/hot_logging.py
+
+import os
+import sys
+import logging
+import timeit
+
+from binascii import b2a_hex as ahex
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ipsc.dmrlink_log import lazyHex
+
+N      = 50000
+REPEAT = 3
+
+
+class ipsc(object):
+    def __init__(self, _logger):
+        self._logger = _logger
+        self._system = 'BENCH'
+        self._hot_trace = False
+
+    def old_ts_end(self, _ts, _end):
+        self._logger.info(_ts)
+        self._logger.info(_end)
+
+    def new_ts_end(self, _ts, _end):
+        if self._hot_trace:
+            self._logger.info('(%s) TRACE: TS: %s End: %s', self._system, _ts, _end)
+
+    def old_data(self, _data):
+        self._logger.info('Group data: ')
+        self._logger.info(ahex(_data))
+
+    def new_data(self, _data):
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug('(%s) Group Data Packet Received: %s', self._system, lazyHex(_data))
+
+
+if __name__ == '__main__':
+    _logger = logging.getLogger('bench')
+    _logger.propagate = False
+    _handler = logging.FileHandler(os.devnull)
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+    _logger.addHandler(_handler)
+
+    _ipsc = ipsc(_logger)
+    _data = '\x80' + os.urandom(53)
+
+    for _level in (logging.INFO, logging.WARNING):
+        _logger.setLevel(_level)
+        for _name, _old, _new in (('ts/end', lambda: _ipsc.old_ts_end(2, False), lambda: _ipsc.new_ts_end(2, False)),
+                                  ('data', lambda: _ipsc.old_data(_data), lambda: _ipsc.new_data(_data))):
+            _times = [min(timeit.repeat(_f, number=N, repeat=REPEAT)) / N * 1e9 for _f in (_old, _new)]
+            print('{:8} {:7} old {:6.0f} ns  new {:4.0f} ns'.format(logging.getLevelName(_level), _name, _times[0], _times[1]))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#
+# Reporting server pushes: pickling all of CONFIG['SYSTEMS'] and BRIDGES for every client
+# every interval, as it used to, against ipsc.report_state sending a snapshot on connect
+# and then only what changed. The state is 10 systems of 50 peers each and 200 bridges of
+# 3 rules, with 3 clients. Every interval every peer answers a keep-alive and one bridge
+# rule is toggled; once, a peer goes away and another one turns up. A client copy is kept
+# up to date from the deltas and checked against the real thing after every one.
+#
+#   python bench/report_delta.py
+
+import os
+import sys
+import random
+import cPickle as pickle
+
+from time import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ipsc.report_state import reportState, apply_delta
+
+SYSTEMS   = 10
+PEERS     = 50
+BRIDGES   = 200
+CLIENTS   = 3
+INTERVALS = 20
+
+
+def mk_peer(i):
+    return {
+        'IP': '10.0.{}.{}'.format(i // 250, i % 250), 'PORT': 50000, 'MODE': 'j',
+        'MODE_DECODE': {'PEER_OP': True, 'PEER_MODE': 'DIGITAL', 'TS_1': True, 'TS_2': True},
+        'FLAGS': '\x00\x00\x00\x0d',
+        'FLAGS_DECODE': {'CSBK': False, 'RCM': True, 'CON_APP': True, 'XNL_CON': False, 'XNL_MASTER': False, 'XNL_SLAVE': False, 'AUTH': True, 'DATA': True, 'VOICE': True, 'MASTER': False},
+        'STATUS': {'CONNECTED': True, 'KEEP_ALIVES_SENT': 0, 'KEEP_ALIVES_MISSED': 0, 'KEEP_ALIVES_OUTSTANDING': 0, 'KEEP_ALIVES_RECEIVED': 0, 'KEEP_ALIVE_RX_TIME': 0}
+    }
+
+def mk_state():
+    _systems = {}
+    for s in xrange(SYSTEMS):
+        _systems['SYS{}'.format(s)] = {
+            'LOCAL': dict(('K{}'.format(k), k) for k in xrange(40)),
+            'MASTER': mk_peer(999),
+            'PEERS': dict((os.urandom(4), mk_peer(i)) for i in xrange(PEERS)),
+            'SUPPRESSED': {}
+        }
+    _bridges = {}
+    for b in xrange(BRIDGES):
+        _bridges['B{}'.format(b)] = [{'SYSTEM': 'SYS{}'.format(k), 'TS': 1, 'TGID': '\x00\x0c\x30', 'ACTIVE': True, 'TIMEOUT': 600, 'TO_TYPE': 'ON',
+                                      'ON': set(['\x00\x00\x01']), 'OFF': set(), 'RESET': set(), 'TIMER': 0.0} for k in xrange(3)]
+    return _systems, _bridges
+
+def interval(_systems, _bridges, n):
+    for _system in _systems.values():
+        for _peer in _system['PEERS'].values():
+            _peer['STATUS']['KEEP_ALIVES_SENT'] += 1
+            _peer['STATUS']['KEEP_ALIVES_RECEIVED'] += 1
+            _peer['STATUS']['KEEP_ALIVE_RX_TIME'] = n
+    _rule = _bridges['B{}'.format(n % BRIDGES)][0]
+    _rule['ACTIVE'] = not _rule['ACTIVE']
+    _rule['TIMER'] = float(n)
+    if n == 5:
+        del _systems['SYS3']['PEERS'][_systems['SYS3']['PEERS'].keys()[0]]
+        _systems['SYS4']['PEERS']['NEW!'] = mk_peer(77)
+
+
+if __name__ == '__main__':
+    random.seed(1)
+    _systems, _bridges = mk_state()
+    _config_state = reportState(lambda: _systems)
+    _bridge_state = reportState(lambda: _bridges)
+    _client_systems = pickle.loads(_config_state.snapshot())
+    _client_bridges = pickle.loads(_bridge_state.snapshot())
+    print('snapshot on connect: config {} bytes, bridges {} bytes'.format(_config_state.snapshot_bytes, _bridge_state.snapshot_bytes))
+
+    _old_cpu = _new_cpu = 0.0
+    _old_bytes = _new_bytes = 0
+    for n in xrange(1, INTERVALS + 1):
+        interval(_systems, _bridges, n)
+
+        _t0 = time()
+        _config = pickle.dumps(_systems, 2)
+        _bridge = pickle.dumps(_bridges, 2)
+        _old_cpu += time() - _t0
+        _old_bytes += (len(_config) + len(_bridge)) * CLIENTS
+
+        _t0 = time()
+        _config = _config_state.delta()
+        _bridge = _bridge_state.delta()
+        _new_cpu += time() - _t0
+        _new_bytes += (len(_config or '') + len(_bridge or '')) * CLIENTS
+
+        apply_delta(_client_systems, pickle.loads(_config))
+        apply_delta(_client_bridges, pickle.loads(_bridge))
+        assert _client_systems == _systems and _client_bridges == _bridges, 'client copy differs after interval {}'.format(n)
+
+    print('per interval, {} systems x {} peers, {} bridges, {} clients:'.format(SYSTEMS, PEERS, BRIDGES, CLIENTS))
+    print('  full pickles:    {:5.1f} ms CPU, {:7} bytes sent'.format(_old_cpu / INTERVALS * 1e3, _old_bytes // INTERVALS))
+    print('  deltas:          {:5.1f} ms CPU, {:7} bytes sent'.format(_new_cpu / INTERVALS * 1e3, _new_bytes // INTERVALS))
+    _t0 = time()
+    _delta = _config_state.delta()
+    print('  nothing changed: {:5.1f} ms CPU, delta {!r}'.format((time() - _t0) * 1e3, _delta))
+    print('client copy matched after each of {} deltas'.format(INTERVALS))
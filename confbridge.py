@@ -58,8 +58,10 @@ import cPickle as pickle
 
 from dmr_utils.utils import hex_str_3, hex_str_4, int_id
 
-from dmrlink import IPSC, mk_ipsc_systems, systems, reportFactory, REPORT_OPCODES, build_aliases
+from dmrlink import IPSC, mk_ipsc_systems, systems, reportFactory, REPORT_OPCODES, build_aliases, toggle_hot_trace, dump_recorders
 from ipsc.ipsc_const import BURST_DATA_TYPE
+from ipsc.dmrlink_acl import load_acl, load_system_acl
+from ipsc.report_state import reportState
 
 
 __author__      = 'Cortney T. Buffington, N0MJS'
@@ -74,10 +76,44 @@ __email__       = 'n0mjs@me.com'
 #
 TS_CLEAR_TIME = .2
 
+# A cached call stream route is thrown away if no frame has used it for this long (seconds),
+# in case the voice terminator got lost
+#
+ROUTE_TIMEOUT = 1
+
 # Declare this here so that we can define functions around it
 #
 BRIDGES = {}
 
+# Rule indexes, built from BRIDGES by build_bridge_index() at startup:
+#   BRIDGE_INDEX:  (system, tgid, ts) -> [(bridge, rule), ...] rules traffic is bridged by
+#   TRIGGER_INDEX: (system, trigger tgid, ts) -> [(bridge, rule), ...] rules a call can turn on/off
+#
+BRIDGE_INDEX = {}
+TRIGGER_INDEX = {}
+
+# Compiled ACLs, (system, ts) -> streamACL, built by build_system_acl() at startup
+#
+STREAM_ACL = {}
+
+# Where the fields that change when a frame is bridged live in an IPSC voice packet (see
+# documents/voice_burst_decoding.txt). They are patched in place at these offsets rather
+# than found with str.replace(), which could just as well hit the same bytes in the payload.
+#
+RW_PEER       = 1       # [1:5]   IPSC peer ID
+RW_DST        = 9       # [9:12]  IPSC destination group
+RW_CALL_INFO  = 17      # IPSC call info, bit 5 is the timeslot
+RW_TS_BIT     = 1 << 5
+RW_BURST      = 30      # Burst data type, also carries the slot for voice bursts
+RW_LC_HDR     = 41      # [41:44] LC destination in voice headers and terminators
+RW_LC_BURST_E = 59      # [59:62] LC destination in voice burst E
+RW_BURST_E_LEN = 66     # Voice burst E is the only 66 byte voice packet
+
+# Bumped every time a rule's ACTIVE flag changes; cached routes from an older generation
+# get worked out again
+#
+RULE_GENERATION = 0
+
 # Timed loop used for reporting IPSC status
 #
 # REPORT BASED ON THE TYPE SELECTED IN THE MAIN CONFIG FILE
@@ -133,100 +169,125 @@ def make_bridge_config(_confbridge_rules):
                 sys.exit('ERROR: Conference bridges found for system not configured main configuration')
                 
             _system['TGID']       = hex_str_3(_system['TGID'])
-            for i, e in enumerate(_system['ON']):
-                _system['ON'][i]  = hex_str_3(_system['ON'][i])
-            for i, e in enumerate(_system['OFF']):
-                _system['OFF'][i] = hex_str_3(_system['OFF'][i])
-            for i, e in enumerate(_system['RESET']):
-                _system['RESET'][i] = hex_str_3(_system['RESET'][i])
+            _system['ON']         = set(hex_str_3(_tgid) for _tgid in _system['ON'])
+            _system['OFF']        = set(hex_str_3(_tgid) for _tgid in _system['OFF'])
+            _system['RESET']      = set(hex_str_3(_tgid) for _tgid in _system['RESET'])
             _system['TIMEOUT']    = _system['TIMEOUT']*60
             _system['TIMER']      = time()
 
     return {'BRIDGE_CONF': bridge_file.BRIDGE_CONF, 'BRIDGES': bridge_file.BRIDGES, 'TRUNKS': bridge_file.TRUNKS}
     
 
+# Index the bridge rules so a packet only ever looks at the rules that can match it, no
+# matter how many bridges there are. Rules are listed in the same order as in BRIDGES.
+#
+def build_bridge_index(_bridges):
+    _bridge_index = {}
+    _trigger_index = {}
+    for _bridge in _bridges:
+        for _system in _bridges[_bridge]:
+            _bridge_index.setdefault((_system['SYSTEM'], _system['TGID'], _system['TS']), []).append((_bridge, _system))
+            for _tgid in _system['ON'] | _system['OFF'] | _system['RESET']:
+                _trigger_index.setdefault((_system['SYSTEM'], _tgid, _system['TS']), []).append((_bridge, _system))
+    return _bridge_index, _trigger_index
+
+
+# Work out, once per frame, where (if anywhere) the DMR LC destination is in this packet.
+# It's only re-written if the destination and source are really there, like the old
+# str.replace() did, but without the chance of matching something in the voice payload.
+#
+def lc_dst_offset(_data, _burst_data_type, _lc):
+    if _burst_data_type == BURST_DATA_TYPE['VOICE_HEAD'] or _burst_data_type == BURST_DATA_TYPE['VOICE_TERM']:
+        _offset = RW_LC_HDR
+    elif len(_data) == RW_BURST_E_LEN:
+        _offset = RW_LC_BURST_E
+    else:
+        return 0
+    if _data[_offset:_offset+6] == _lc:
+        return _offset
+    return 0
+
+# Everything needed to re-write a frame for one target rule, worked out when the route is
+# built: (peer ID of our end of the target IPSC, target TGID, timeslot bit, voice burst type)
+#
+def mk_rewrite(_target_system, _target):
+    if _target['TS'] == 2:
+        return (_target_system['LOCAL']['RADIO_ID'], _target['TGID'], RW_TS_BIT, ord(BURST_DATA_TYPE['SLOT2_VOICE']))
+    return (_target_system['LOCAL']['RADIO_ID'], _target['TGID'], 0, ord(BURST_DATA_TYPE['SLOT1_VOICE']))
+
+
 # Import subscriber ACL
-# ACL may be a single list of subscriber IDs
-# Global action is to allow or deny them. Multiple lists with different actions and ranges
-# are not yet implemented.
+# ACL may be a single 'PERMIT|DENY:id,start-end,...' list, or several of them where the
+# first list containing an ID decides. See ipsc/dmrlink_acl.py
 def build_acl(_sub_acl):
-    ACL = set()
-    try:
-        logger.info('ACL file found, importing entries. This will take about 1.5 seconds per 1 million IDs')
-        acl_file = import_module(_sub_acl)
-        sections = acl_file.ACL.split(':')
-        ACL_ACTION = sections[0]
-        entries_str = sections[1]
-        for entry in entries_str.split(','):
-            if '-' in entry:
-                start,end = entry.split('-')
-                start,end = int(start), int(end)
-                for id in range(start, end+1):
-                    ACL.add(hex_str_3(id))
-            else:
-                id = int(entry)
-                ACL.add(hex_str_3(id))
-        
-        logger.info('ACL loaded: action "{}" for {:,} radio IDs'.format(ACL_ACTION, len(ACL)))
-    
-    except ImportError:
-        logger.info('ACL file not found or invalid - all subscriber IDs are valid')
-        ACL_ACTION = 'NONE'
+    ACL = load_acl(_sub_acl, logger)
 
-    # Depending on which type of ACL is used (PERMIT, DENY... or there isn't one)
-    # define a differnet function to be used to check the ACL
+    # The function used to check the ACL in the packet handlers
     global allow_sub
-    if ACL_ACTION == 'PERMIT':
-        def allow_sub(_sub):
-            if _sub in ACL:
-                return True
-            else:
-                return False
-    elif ACL_ACTION == 'DENY':
-        def allow_sub(_sub):
-            if _sub not in ACL:
-                return True
-            else:
-                return False
-    else:
-        def allow_sub(_sub):
-            return True
+    allow_sub = ACL.allow
     
     return ACL
 
+# Compile the per-system, per-timeslot ACLs (SYSTEM_ACL in the ACL file) along with the
+# global ACL, keyed by (system, timeslot)
+#
+def build_system_acl(_sub_acl, _acl):
+    global STREAM_ACL
+    STREAM_ACL = load_system_acl(_sub_acl, _acl, CONFIG['SYSTEMS'], logger)
+    return STREAM_ACL
 
-# Run this every minute for rule timer updates
-def rule_timer_loop():
-    logger.info('(ALL IPSC SYSTEMS) Rule timer loop started')
-    _now = time()
 
-    for _bridge in BRIDGES:
-        for _system in BRIDGES[_bridge]:
-            if _system['TO_TYPE'] == 'ON':
-                if _system['ACTIVE'] == True:
-                    if _system['TIMER'] < _now:
-                        _system['ACTIVE'] = False
-                        logger.info('Conference Bridge TIMEOUT: DEACTIVATE System: %s, Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
-                    else:
-                        timeout_in = _system['TIMER'] - _now
-                        logger.info('Conference Bridge ACTIVE (ON timer running): System: %s Bridge: %s, TS: %s, TGID: %s, Timeout in: %ss,', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']),  timeout_in)
-                elif _system['ACTIVE'] == False:
-                    logger.debug('Conference Bridge INACTIVE (no change): System: %s Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
-            elif _system['TO_TYPE'] == 'OFF':
-                if _system['ACTIVE'] == False:
-                    if _system['TIMER'] < _now:
-                        _system['ACTIVE'] = True
-                        logger.info('Conference Bridge TIMEOUT: ACTIVATE System: %s, Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
-                    else:
-                        timeout_in = _system['TIMER'] - _now
-                        logger.info('Conference Bridge INACTIVE (OFF timer running): System: %s Bridge: %s, TS: %s, TGID: %s, Timeout in: %ss,', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']),  timeout_in)
-                elif _system['ACTIVE'] == True:
-                    logger.debug('Conference Bridge ACTIVE (no change): System: %s Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
-            else:
-                logger.debug('Conference Bridge NO ACTION: System: %s, Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
+# Call whenever a rule's ACTIVE flag changes so cached call stream routes get rebuilt
+def rules_changed():
+    global RULE_GENERATION
+    RULE_GENERATION += 1
+
+# Rule timeouts. Each rule with a timer running ("ON" timeout and active, or "OFF" timeout
+# and inactive) has a reactor.callLater() handle, kept here by id() of the rule rather than
+# in the rule itself because BRIDGES gets pickled for the reporting clients.
+#
+RULE_TIMERS = {}
+
+# (Re-)arm the timeout for a rule from its TIMER value, or cancel it if the rule is in a
+# state where no timer runs. Call it every time a rule's TIMER or ACTIVE flag changes.
+#
+def schedule_rule_timer(_bridge, _system):
+    _handle = RULE_TIMERS.pop(id(_system), None)
+    if _handle is not None and _handle.active():
+        _handle.cancel()
+    if (_system['TO_TYPE'] == 'ON' and _system['ACTIVE'] == True) or (_system['TO_TYPE'] == 'OFF' and _system['ACTIVE'] == False):
+        RULE_TIMERS[id(_system)] = reactor.callLater(max(_system['TIMER'] - time(), 0), rule_timer_expired, _bridge, _system)
+
+# A rule's timeout has run out: flip its state
+#
+def rule_timer_expired(_bridge, _system):
+    RULE_TIMERS.pop(id(_system), None)
+    if _system['TIMER'] > time():
+        # Pushed back since this was scheduled without the handle being re-armed
+        schedule_rule_timer(_bridge, _system)
+        return
+
+    if _system['TO_TYPE'] == 'ON' and _system['ACTIVE'] == True:
+        _system['ACTIVE'] = False
+        rules_changed()
+        logger.info('Conference Bridge TIMEOUT: DEACTIVATE System: %s, Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
+    elif _system['TO_TYPE'] == 'OFF' and _system['ACTIVE'] == False:
+        _system['ACTIVE'] = True
+        rules_changed()
+        logger.info('Conference Bridge TIMEOUT: ACTIVATE System: %s, Bridge: %s, TS: %s, TGID: %s', _system['SYSTEM'], _bridge, _system['TS'], int_id(_system['TGID']))
+    else:
+        return
 
     if BRIDGE_CONF['REPORT'] == 'network':
-        report_server.send_clients('bridge updated')
+        report_server.send_bridge()
+
+# Arm the timers for every rule when we start up
+#
+def start_rule_timers():
+    for _bridge in BRIDGES:
+        for _system in BRIDGES[_bridge]:
+            schedule_rule_timer(_bridge, _system)
+    logger.info('(ALL IPSC SYSTEMS) Rule timers started: %s running', len(RULE_TIMERS))
 
     
 class confbridgeIPSC(IPSC):
@@ -240,17 +301,83 @@ class confbridgeIPSC(IPSC):
         
         self.last_seq_id = '\x00'
         self.call_start = 0
+        
+        # Routes for the call streams currently coming in on this system, keyed by
+        # (peer, source sub, destination group, timeslot, call sequence ID)
+        self._routes = {}
 
+    #************************************************
+    #     CALL STREAM ROUTING
+    #************************************************
+    
+    # Find every active rule that matches a call on this system, TGID and timeslot, and
+    # return the (target rule, target IPSC instance, target timeslot status, frame rewrite)
+    # for each bridged system that passes contention handling.
+    #
+    def route_stream(self, _src_sub, _dst_group, _ts, _burst_data_type, now):
+        _targets = []
+        for _bridge, _system in BRIDGE_INDEX.get((self._system, _dst_group, _ts), ()):
+            if _system['ACTIVE'] == True:
+                
+                for _target in BRIDGES[_bridge]:
+                    if _target['SYSTEM'] != self._system:
+                        if _target['ACTIVE']:
+                            _target_status = systems[_target['SYSTEM']].STATUS
+                            _target_system = self._CONFIG['SYSTEMS'][_target['SYSTEM']]
+                            
+                            # The target's ACLs have to allow the call as it will be sent there
+                            _denied = STREAM_ACL[(_target['SYSTEM'], _target['TS'])].check(_src_sub, _target['TGID'])
+                            if _denied:
+                                if _burst_data_type == BURST_DATA_TYPE['VOICE_HEAD']:
+                                    self._logger.info('(%s) Call not bridged to TGID%s, rejected by %s ACL: IPSC: %s, TS: %s, SUB: %s', self._system, int_id(_target['TGID']), _denied, _target['SYSTEM'], _target['TS'], int_id(_src_sub))
+                                continue
+            
+                            # BEGIN CONTENTION HANDLING
+                            #
+                            # If the system is listed as a "TRUNK", there will be no contention handling. All traffic is forwarded to it
+                            # 
+                            # The rules for each of the 4 "ifs" below are listed here for readability. The Frame To Send is:
+                            #   From a different group than last RX from this IPSC, but it has been less than Group Hangtime
+                            #   From a different group than last TX to this IPSC, but it has been less than Group Hangtime
+                            #   From the same group as the last RX from this IPSC, but from a different subscriber, and it has been less than TS Clear Time
+                            #   From the same group as the last TX to this IPSC, but from a different subscriber, and it has been less than TS Clear Time
+                            # The "continue" at the end of each means the next iteration of the for loop that tests for matching rules
+                            #
+                            if _target not in TRUNKS:                           
+                                if ((_target['TGID'] != _target_status[_target['TS']]['RX_TGID']) and ((now - _target_status[_target['TS']]['RX_TIME']) < _target_system['LOCAL']['GROUP_HANGTIME'])):
+                                    if _burst_data_type == BURST_DATA_TYPE['VOICE_HEAD']:
+                                        self._logger.info('(%s) Call not bridged to TGID%s, target active or in group hangtime: IPSC: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['RX_TGID']))
+                                    continue
+                                if ((_target['TGID'] != _target_status[_target['TS']]['TX_TGID']) and ((now - _target_status[_target['TS']]['TX_TIME']) < _target_system['LOCAL']['GROUP_HANGTIME'])):
+                                    if _burst_data_type == BURST_DATA_TYPE['VOICE_HEAD']:
+                                        self._logger.info('(%s) Call not bridged to TGID%s, target in group hangtime: IPSC: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['TX_TGID']))
+                                    continue
+                                if (_target['TGID'] == _target_status[_target['TS']]['RX_TGID']) and ((now - _target_status[_target['TS']]['RX_TIME']) < TS_CLEAR_TIME):
+                                    if _burst_data_type == BURST_DATA_TYPE['VOICE_HEAD']:
+                                        self._logger.info('(%s) Call not bridged to TGID%s, matching call already active on target: IPSC: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['RX_TGID']))
+                                    continue
+                                if (_target['TGID'] == _target_status[_target['TS']]['TX_TGID']) and (_src_sub != _target_status[_target['TS']]['TX_SRC_SUB']) and ((now - _target_status[_target['TS']]['TX_TIME']) < TS_CLEAR_TIME):
+                                    if _burst_data_type == BURST_DATA_TYPE['VOICE_HEAD']:
+                                        self._logger.info('(%s) Call not bridged for subscriber %s, call bridge in progress on target: IPSC: %s, TS: %s, TGID: %s SUB: %s', self._system, int_id(_src_sub), _target['SYSTEM'], _target['TGID'], int_id(_target_status[_target['TS']]['TX_TGID']), int_id(_target_status[_target['TS']]['TX_SRC_SUB']))
+                                    continue
+                            #
+                            # END CONTENTION HANDLING
+                            #
+                            _targets.append((_target, systems[_target['SYSTEM']], _target_status[_target['TS']], mk_rewrite(_target_system, _target)))
+        return _targets
+    
+    # Drop routes for call streams that ended without a voice terminator
+    #
+    def prune_routes(self, now):
+        for _stream_id in self._routes.keys():
+            if (now - self._routes[_stream_id]['SEEN']) > ROUTE_TIMEOUT:
+                del self._routes[_stream_id]
+    
     #************************************************
     #     CALLBACK FUNCTIONS FOR USER PACKET TYPES
     #************************************************
     #
     def group_voice(self, _src_sub, _dst_group, _ts, _end, _peerid, _data):
-
-        # Check for ACL match, and return if the subscriber is not allowed
-        if allow_sub(_src_sub) == False:
-            self._logger.warning('(%s) Group Voice Packet ***REJECTED BY ACL*** From: %s, IPSC Peer %s, Destination %s', self._system, int_id(_src_sub), int_id(_peerid), int_id(_dst_group))
-            return
         
         # Process the packet
         #self._logger.debug('(%s) Group Voice Packet Received From: %s, IPSC Peer %s, Destination %s', self._system, int_id(_src_sub), int_id(_peerid), int_id(_dst_group))
@@ -259,97 +386,76 @@ class confbridgeIPSC(IPSC):
         
         now = time() # Mark packet arrival time -- we'll need this for call contention handling 
         
-        for _bridge in BRIDGES:
-            for _system in BRIDGES[_bridge]:
-
-                if (_system['SYSTEM'] == self._system and _system['TGID'] == _dst_group and _system['TS'] == _ts and _system['ACTIVE'] == True):
-                    
-                    for _target in BRIDGES[_bridge]:
-                        if _target['SYSTEM'] != self._system:
-                            if _target['ACTIVE']:
-                                _target_status = systems[_target['SYSTEM']].STATUS
-                                _target_system = self._CONFIG['SYSTEMS'][_target['SYSTEM']]
-                
-                                # BEGIN CONTENTION HANDLING
-                                #
-                                # If the system is listed as a "TRUNK", there will be no contention handling. All traffic is forwarded to it
-                                # 
-                                # The rules for each of the 4 "ifs" below are listed here for readability. The Frame To Send is:
-                                #   From a different group than last RX from this IPSC, but it has been less than Group Hangtime
-                                #   From a different group than last TX to this IPSC, but it has been less than Group Hangtime
-                                #   From the same group as the last RX from this IPSC, but from a different subscriber, and it has been less than TS Clear Time
-                                #   From the same group as the last TX to this IPSC, but from a different subscriber, and it has been less than TS Clear Time
-                                # The "continue" at the end of each means the next iteration of the for loop that tests for matching rules
-                                #
-                                if _target not in TRUNKS:                           
-                                    if ((_target['TGID'] != _target_status[_target['TS']]['RX_TGID']) and ((now - _target_status[_target['TS']]['RX_TIME']) < _target_system['LOCAL']['GROUP_HANGTIME'])):
-                                        if _burst_data_type == BURST_DATA_TYPE['VOICE_HEAD']:
-                                            self._logger.info('(%s) Call not bridged to TGID%s, target active or in group hangtime: IPSC: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['RX_TGID']))
-                                        continue
-                                    if ((_target['TGID'] != _target_status[_target['TS']]['TX_TGID']) and ((now - _target_status[_target['TS']]['TX_TIME']) < _target_system['LOCAL']['GROUP_HANGTIME'])):
-                                        if _burst_data_type == BURST_DATA_TYPE['VOICE_HEAD']:
-                                            self._logger.info('(%s) Call not bridged to TGID%s, target in group hangtime: IPSC: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['TX_TGID']))
-                                        continue
-                                    if (_target['TGID'] == _target_status[_target['TS']]['RX_TGID']) and ((now - _target_status[_target['TS']]['RX_TIME']) < TS_CLEAR_TIME):
-                                        if _burst_data_type == BURST_DATA_TYPE['VOICE_HEAD']:
-                                            self._logger.info('(%s) Call not bridged to TGID%s, matching call already active on target: IPSC: %s, TS: %s, TGID: %s', self._system, int_id(_target['TGID']), _target['SYSTEM'], _target['TS'], int_id(_target_status[_target['TS']]['RX_TGID']))
-                                        continue
-                                    if (_target['TGID'] == _target_status[_target['TS']]['TX_TGID']) and (_src_sub != _target_status[_target['TS']]['TX_SRC_SUB']) and ((now - _target_status[_target['TS']]['TX_TIME']) < TS_CLEAR_TIME):
-                                        if _burst_data_type == BURST_DATA_TYPE['VOICE_HEAD']:
-                                            self._logger.info('(%s) Call not bridged for subscriber %s, call bridge in progress on target: IPSC: %s, TS: %s, TGID: %s SUB: %s', self._system, int_id(_src_sub), _target['SYSTEM'], _target['TGID'], int_id(_target_status[_target['TS']]['TX_TGID']), int_id(_target_status[_target['TS']]['TX_SRC_SUB']))
-                                        continue
-                                #
-                                # END CONTENTION HANDLING
-                                #
-
-                                #
-                                # BEGIN FRAME FORWARDING
-                                #
-                                # Make a copy of the payload
-                                _tmp_data = _data
-                                # Re-Write the PEER ID in the IPSC Header:
-                                _tmp_data = _tmp_data.replace(_peerid,  _target_system['LOCAL']['RADIO_ID'], 1)
-
-                                # Re-Write the IPSC SRC + DST GROUP in IPSC Headers:
-                                _tmp_data = _tmp_data.replace(_src_sub + _dst_group, _src_sub + _target['TGID'], 1)
-
-                                # Re-Write the DST GROUP + IPSC SRC in DMR LC (Header, Terminator and Voice Burst E):
-                                _tmp_data = _tmp_data.replace(_dst_group + _src_sub, _target['TGID'] + _src_sub, 1)
-
-                                # Re-Write IPSC timeslot value
-                                _call_info = int_id(_data[17:18])
-                                if _target['TS'] == 1:
-                                    _call_info &= ~(1 << 5)
-                                elif _target['TS'] == 2:
-                                    _call_info |= 1 << 5
-                                _call_info = chr(_call_info)
-                                _tmp_data = _tmp_data[:17] + _call_info + _tmp_data[18:] 
-
-                                # Re-Write DMR timeslot value
-                                # Determine if the slot is present, so we can translate if need be
-                                if _burst_data_type == BURST_DATA_TYPE['SLOT1_VOICE'] or _burst_data_type == BURST_DATA_TYPE['SLOT2_VOICE']:
-                                    _slot_valid = True
-                                else:
-                                    _slot_valid = False
-                                # Re-Write timeslot if necessary...
-                                if _slot_valid:
-                                    if _target['TS'] == 1:
-                                        _burst_data_type = BURST_DATA_TYPE['SLOT1_VOICE']
-                                    elif _target['TS'] == 1:
-                                        _burst_data_type = BURST_DATA_TYPE['SLOT2_VOICE']
-                                    _tmp_data = _tmp_data[:30] + _burst_data_type + _tmp_data[31:]
-
-                                # Send the packet to all peers in the target IPSC
-                                systems[_target['SYSTEM']].send_to_ipsc(_tmp_data)
-                                #
-                                # END FRAME FORWARDING
-                                #
-
-                                # Set values for the contention handler to test next time there is a frame to forward
-                                _target_status[_target['TS']]['TX_TGID'] = _target['TGID']
-                                _target_status[_target['TS']]['TX_TIME'] = now
-                                _target_status[_target['TS']]['TX_SRC_SUB'] = _src_sub
-                
+        # Work out where this call stream goes once, when it starts, and reuse the answer for
+        # the rest of the call. It is worked out again if the rules have changed since, if
+        # one of the targets has started receiving its own traffic (so contention has to be
+        # looked at again), or if the stream has gone quiet for longer than ROUTE_TIMEOUT.
+        # The ACLs for this system and timeslot are checked at the same time.
+        _stream_id = (_peerid, _src_sub, _dst_group, _ts, _seq_id)
+        _route = self._routes.get(_stream_id)
+        if _route is not None:
+            if _route['GEN'] != RULE_GENERATION or (now - _route['SEEN']) > ROUTE_TIMEOUT:
+                _route = None
+            else:
+                for _target, _target_ipsc, _target_slot, _rewrite in _route['TARGETS']:
+                    if _target_slot['RX_TIME'] > _route['TIME']:
+                        _route = None
+                        break
+        if _route is None:
+            _denied = STREAM_ACL[(self._system, _ts)].check(_src_sub, _dst_group)
+            if _denied:
+                if self._limiter.allow('ACL', int_id(_src_sub)):
+                    self._logger.warning('(%s) Group Voice Call ***REJECTED BY %s ACL*** From: %s, IPSC Peer %s, TS: %s, Destination %s', self._system, _denied, int_id(_src_sub), int_id(_peerid), _ts, int_id(_dst_group))
+                _targets = ()
+            else:
+                _targets = self.route_stream(_src_sub, _dst_group, _ts, _burst_data_type, now)
+            _route = {'GEN': RULE_GENERATION, 'TIME': now, 'DENIED': _denied, 'TARGETS': _targets}
+            self.prune_routes(now)
+            self._routes[_stream_id] = _route
+        _route['SEEN'] = now
+        
+        # Rejected by the ACL: not forwarded, and doesn't count as traffic on this system
+        if _route['DENIED']:
+            if _burst_data_type == BURST_DATA_TYPE['VOICE_TERM']:
+                self._routes.pop(_stream_id, None)
+            return
+        
+        # The parts of the frame re-writing that are the same for every target
+        _lc_offset = lc_dst_offset(_data, _burst_data_type, _dst_group + _src_sub)
+        _call_info = ord(_data[RW_CALL_INFO]) & ~RW_TS_BIT
+        _slot_voice = (_burst_data_type == BURST_DATA_TYPE['SLOT1_VOICE'] or _burst_data_type == BURST_DATA_TYPE['SLOT2_VOICE'])
+        
+        for _target, _target_ipsc, _target_slot, _rewrite in _route['TARGETS']:
+            #
+            # BEGIN FRAME FORWARDING
+            #
+            # Patch a copy of the payload: peer ID and destination group in the IPSC header,
+            # the timeslot in the IPSC call info, the slot in the burst type for voice bursts,
+            # and the destination group in the DMR LC (header, terminator and voice burst E)
+            _peer, _tgid, _ts_bit, _slot_burst = _rewrite
+            _frame = bytearray(_data)
+            _frame[RW_PEER:RW_PEER+4] = _peer
+            _frame[RW_DST:RW_DST+3] = _tgid
+            _frame[RW_CALL_INFO] = _call_info | _ts_bit
+            if _slot_voice:
+                _frame[RW_BURST] = _slot_burst
+            if _lc_offset:
+                _frame[_lc_offset:_lc_offset+3] = _tgid
+
+            # Send the packet to all peers in the target IPSC
+            _target_ipsc.send_to_ipsc(str(_frame))
+            #
+            # END FRAME FORWARDING
+            #
+
+            # Set values for the contention handler to test next time there is a frame to forward
+            _target_slot['TX_TGID'] = _target['TGID']
+            _target_slot['TX_TIME'] = now
+            _target_slot['TX_SRC_SUB'] = _src_sub
+        
+        # The call is over, so is its route
+        if _burst_data_type == BURST_DATA_TYPE['VOICE_TERM']:
+            self._routes.pop(_stream_id, None)
 
         # Mark the group and time that a packet was recieved for the contention handler to use later
         self.STATUS[_ts]['RX_TGID'] = _dst_group
@@ -384,56 +490,78 @@ class confbridgeIPSC(IPSC):
                     self._report.send_bridgeEvent('GROUP VOICE,UNMATCHED END,{},{},{},{},{},{}'.format(self._system, int_id(_seq_id), int_id(_peerid), int_id(_src_sub), _ts, int_id(_dst_group)))
                 
 
-            # Iterate the rules dictionary
-            for _bridge in BRIDGES:
-                for _system in BRIDGES[_bridge]:
-                    if _system['SYSTEM'] == self._system:
-
-                        # TGID matches an ACTIVATION trigger
-                        if (_dst_group in _system['ON']  or _dst_group in _system['RESET']) and _ts == _system['TS']:
-                            # Set the matching rule as ACTIVE
-                            if _dst_group in _system['ON']:
-                                if _system['ACTIVE'] == False:
-                                    _system['ACTIVE'] = True
-                                    self._logger.info('(%s) Bridge: %s, connection changed to state: %s', self._system, _bridge, _system['ACTIVE'])
-                                    # Cancel the timer if we've enabled an "OFF" type timeout
-                                    if _system['TO_TYPE'] == 'OFF':
-                                        _system['TIMER'] = now
-                                        self._logger.info('(%s) Bridge: %s set to "OFF" with an on timer rule: timeout timer cancelled', self._system, _bridge)
-                            # Reset the timer for the rule
-                            if _system['ACTIVE'] == True and _system['TO_TYPE'] == 'ON':
-                                _system['TIMER'] = now + _system['TIMEOUT']
-                                self._logger.info('(%s) Bridge: %s, timeout timer reset to: %s', self._system, _bridge, _system['TIMER'] - now)
-
-                        # TGID matches an DE-ACTIVATION trigger
-                        if (_dst_group in _system['OFF']  or _dst_group in _system['RESET']) and _ts == _system['TS']:
-                            # Set the matching rule as ACTIVE
-                            if _dst_group in _system['OFF']:
-                                if _system['ACTIVE'] == True:
-                                    _system['ACTIVE'] = False
-                                    self._logger.info('(%s) Bridge: %s, connection changed to state: %s', self._system, _bridge, _system['ACTIVE'])
-                                    # Cancel the timer if we've enabled an "ON" type timeout
-                                    if _system['TO_TYPE'] == 'ON':
-                                        _system['TIMER'] = now
-                                        self._logger.info('(%s) Bridge: %s set to ON with and "OFF" timer rule: timeout timer cancelled', self._system, _bridge)
-                            # Reset the timer for the rule
-                            if _system['ACTIVE'] == False and _system['TO_TYPE'] == 'OFF':
-                                _system['TIMER'] = now + _system['TIMEOUT']
-                                self._logger.info('(%s) Bridge: %s, timeout timer reset to: %s', self._system, _bridge, _system['TIMER'] - now)
+            # Only the rules that use this TGID as a trigger on this system and timeslot
+            for _bridge, _system in TRIGGER_INDEX.get((self._system, _dst_group, _ts), ()):
+
+                # TGID matches an ACTIVATION trigger
+                if (_dst_group in _system['ON']  or _dst_group in _system['RESET']) and _ts == _system['TS']:
+                    # Set the matching rule as ACTIVE
+                    if _dst_group in _system['ON']:
+                        if _system['ACTIVE'] == False:
+                            _system['ACTIVE'] = True
+                            rules_changed()
+                            self._logger.info('(%s) Bridge: %s, connection changed to state: %s', self._system, _bridge, _system['ACTIVE'])
+                            # Cancel the timer if we've enabled an "OFF" type timeout
+                            if _system['TO_TYPE'] == 'OFF':
+                                _system['TIMER'] = now
+                                self._logger.info('(%s) Bridge: %s set to "OFF" with an on timer rule: timeout timer cancelled', self._system, _bridge)
+                    # Reset the timer for the rule
+                    if _system['ACTIVE'] == True and _system['TO_TYPE'] == 'ON':
+                        _system['TIMER'] = now + _system['TIMEOUT']
+                        self._logger.info('(%s) Bridge: %s, timeout timer reset to: %s', self._system, _bridge, _system['TIMER'] - now)
+
+                # TGID matches an DE-ACTIVATION trigger
+                if (_dst_group in _system['OFF']  or _dst_group in _system['RESET']) and _ts == _system['TS']:
+                    # Set the matching rule as ACTIVE
+                    if _dst_group in _system['OFF']:
+                        if _system['ACTIVE'] == True:
+                            _system['ACTIVE'] = False
+                            rules_changed()
+                            self._logger.info('(%s) Bridge: %s, connection changed to state: %s', self._system, _bridge, _system['ACTIVE'])
                             # Cancel the timer if we've enabled an "ON" type timeout
-                            if _system['ACTIVE'] == True and _system['TO_TYPE'] == 'ON' and _dst_group in _system['OFF']:
+                            if _system['TO_TYPE'] == 'ON':
                                 _system['TIMER'] = now
                                 self._logger.info('(%s) Bridge: %s set to ON with and "OFF" timer rule: timeout timer cancelled', self._system, _bridge)
+                    # Reset the timer for the rule
+                    if _system['ACTIVE'] == False and _system['TO_TYPE'] == 'OFF':
+                        _system['TIMER'] = now + _system['TIMEOUT']
+                        self._logger.info('(%s) Bridge: %s, timeout timer reset to: %s', self._system, _bridge, _system['TIMER'] - now)
+                    # Cancel the timer if we've enabled an "ON" type timeout
+                    if _system['ACTIVE'] == True and _system['TO_TYPE'] == 'ON' and _dst_group in _system['OFF']:
+                        _system['TIMER'] = now
+                        self._logger.info('(%s) Bridge: %s set to ON with and "OFF" timer rule: timeout timer cancelled', self._system, _bridge)
+
+                # Re-arm (or cancel) the timeout to match whatever happened above
+                schedule_rule_timer(_bridge, _system)
 
         #
         # END IN-BAND SIGNALLING
         #
 
 class confbridgeReportFactory(reportFactory):
+    def __init__(self, config, logger):
+        reportFactory.__init__(self, config, logger)
+        self._bridge_state = reportState(lambda: BRIDGES)
         
     def send_bridge(self):
-        serialized = pickle.dumps(BRIDGES, protocol=pickle.HIGHEST_PROTOCOL)
-        self.send_clients(REPORT_OPCODES['BRIDGE_SND']+serialized)
+        if not self._delta:
+            serialized = pickle.dumps(BRIDGES, protocol=pickle.HIGHEST_PROTOCOL)
+            self.send_clients(REPORT_OPCODES['BRIDGE_SND']+serialized)
+            return
+        if not self.clients:
+            self._bridge_state.reset()
+            return
+        _delta = self._bridge_state.delta()
+        if _delta:
+            self.send_clients(REPORT_OPCODES['BRIDGE_UPD']+_delta)
+    
+    def bridge_snapshot(self):
+        if not self._delta:
+            return REPORT_OPCODES['BRIDGE_SND']+pickle.dumps(BRIDGES, protocol=pickle.HIGHEST_PROTOCOL)
+        return REPORT_OPCODES['BRIDGE_SND']+self._bridge_state.snapshot()
+    
+    def snapshots(self):
+        return [self.config_snapshot(), self.bridge_snapshot()]
         
     def send_bridgeEvent(self, _data):
         self.send_clients(REPORT_OPCODES['BRDG_EVENT']+_data)
@@ -446,7 +574,7 @@ if __name__ == '__main__':
     import signal
     
     from ipsc.dmrlink_config import build_config
-    from ipsc.dmrlink_log import config_logging
+    from ipsc.dmrlink_log import config_logging, flush_logging
     
     # Change the current directory to the location of the application
     os.chdir(os.path.dirname(os.path.realpath(sys.argv[0])))
@@ -478,10 +606,27 @@ if __name__ == '__main__':
         for system in systems:
             systems[system].de_register_self()
         reactor.stop()
+        flush_logging(logger)
     
     for sig in [signal.SIGTERM, signal.SIGINT, signal.SIGQUIT]:
         signal.signal(sig, sig_handler)
     
+    # The reactor replaces our SIGINT/SIGTERM handlers with its own, so flush the log queue
+    # on its way down too
+    reactor.addSystemEventTrigger('after', 'shutdown', flush_logging, logger)
+    
+    # SIGUSR1 toggles the hot-path (per packet) trace on every system
+    def trace_handler(_signal, _frame):
+        reactor.callFromThread(toggle_hot_trace, systems)
+    
+    signal.signal(signal.SIGUSR1, trace_handler)
+    
+    # SIGUSR2 dumps the call recorders to capture files
+    def recorder_handler(_signal, _frame):
+        reactor.callFromThread(dump_recorders, systems)
+    
+    signal.signal(signal.SIGUSR2, recorder_handler)
+    
     # INITIALIZE THE REPORTING LOOP
     report_server = config_reports(CONFIG, logger, confbridgeReportFactory)
     
@@ -500,13 +645,14 @@ if __name__ == '__main__':
     BRIDGE_CONF = CONFIG_DICT['BRIDGE_CONF']
     TRUNKS      = CONFIG_DICT['TRUNKS']
     BRIDGES     = CONFIG_DICT['BRIDGES']
+    BRIDGE_INDEX, TRIGGER_INDEX = build_bridge_index(BRIDGES)
 
     # Build the Access Control List
     ACL = build_acl('sub_acl')
+    STREAM_ACL = build_system_acl('sub_acl', ACL)
     
-    # Initialize the rule timer loop
-    rule_timer = task.LoopingCall(rule_timer_loop)
-    rule_timer.start(60)
+    # Initialize the rule timers
+    start_rule_timers()
     
     # INITIALIZATION COMPLETE -- START THE REACTOR
     reactor.run()
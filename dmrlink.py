@@ -31,9 +31,12 @@ import cPickle as pickle
 
 # Function Imports
 from hmac import new as hmac_new
+from hmac import compare_digest
 from binascii import b2a_hex as ahex
 from binascii import a2b_hex as bhex
 from hashlib import sha1
+from struct import Struct, error as struct_error
+from collections import namedtuple, deque
 from socket import inet_ntoa as IPAddr
 from socket import inet_aton as IPHexStr
 #from time import time
@@ -42,12 +45,24 @@ import time
 # Twisted Imports
 from twisted.internet.protocol import DatagramProtocol, Factory, Protocol
 from twisted.protocols.basic import NetstringReceiver
-from twisted.internet import reactor, task
+from twisted.internet import reactor, task, threads, defer
+from twisted.internet.interfaces import IPushProducer
+from zope.interface import implementer
 
 # Imports files in the dmrlink subdirectory (these things shouldn't change often)
 from ipsc.ipsc_const import *
 from ipsc.ipsc_mask import *
 from ipsc.reporting_const import *
+from ipsc.batch_tx import batchTransmit
+from ipsc.frame_pacer import framePacer
+from ipsc.capture import ringRecorder
+from ipsc.report_state import reportState
+from ipsc.dmrlink_log import lazyHex, warningLimiter
+from ipsc.aprs_client import aprsClient
+from ipsc.user_settings import userSettings
+from ipsc.data_assembly import dataReassembly
+from ipsc.worker_pool import workerPool
+from ipsc.maidenhead import grid_to_aprs
 
 # Imports from DMR Utilities package
 from dmr_utils.utils import hex_str_2, hex_str_3, hex_str_4, int_id, try_download, mk_id_dict, int_id, get_alias
@@ -70,6 +85,7 @@ import ast
 #from pathlib import Path
 import re
 import datetime
+import threading
 
 # Email modules
 import smtplib
@@ -85,77 +101,84 @@ __maintainer__  = 'Cort Buffington, N0MJS; Eric Craw, KF7EEL'
 __email__       = 'n0mjs@me.com; kf7eel@qsl.net'
 
 
-btf = ''
+# User settings (SSID, icon, comment) live in memory and are only read from user_settings_file
+# when it changes. Loaded the first time they're needed.
+USER_SETTINGS = None
 
-hdr_start = ''
+def user_settings_store():
+    global USER_SETTINGS
+    if USER_SETTINGS is None:
+        USER_SETTINGS = userSettings(user_settings_file, logger)
+        reactor.addSystemEventTrigger('before', 'shutdown', USER_SETTINGS.flush)
+    return USER_SETTINGS
 
-n_packet_assembly = 0
-
-packet_assembly = ''
+def user_setting_write(dmr_id, setting, value):
+    if setting.upper() == 'COM':
+        value = value[0:35]
+    try:
+        user_settings_store().set(dmr_id, setting, value, get_alias((dmr_id), subscriber_ids))
+    except KeyError as e:
+        logger.info('User setting not saved: %s', e)
+        return
+    logger.info('User setting saved')
 
-final_packet = ''
+# How often (seconds) the APRS-IS client and the D-APRS worker pool log their counters
+STATS_INTERVAL = 300
 
-#_rf_src = ''
-hdr_type = ''
+# One APRS-IS connection, kept open by its own thread and started with the first packet.
+# aprs_send only queues the packet, so the reactor never waits on APRS-IS.
+APRS_CLIENT = None
 
-def user_setting_write(dmr_id, setting, value):
-##    try:
-    # Open file and load as dict for modification
-        with open("./user_settings.txt", 'r') as f:
-##            if f.read() == '{}':
-##                user_dict = {}
-            user_dict = ast.literal_eval(f.read())
-            if dmr_id not in user_dict:
-                user_dict[dmr_id] = [{'call': str(get_alias((dmr_id), subscriber_ids))}, {'ssid': ''}, {'icon': ''}, {'comment': ''}]
-
-            if setting.upper() == 'ICON':
-                user_dict[dmr_id][2]['icon'] = value
-            if setting.upper() == 'SSID':
-                user_dict[dmr_id][1]['ssid'] = value  
-            if setting.upper() == 'COM':
-                user_comment = user_dict[dmr_id][3]['comment'] = value[0:35]
-    # Write modified dict to file
-        with open("./user_settings.txt", 'w') as user_dict_file:
-            user_dict_file.write(str(user_dict))
-            user_dict_file.close()
-            logger.info('User setting saved')
-            packet_assembly = ''
-##    except:
-##        logger.info('No data file found, creating one.')
-##        #Path('./user_settings.txt').mkdir(parents=True, exist_ok=True)
-##        Path('./user_settings.txt').touch()
-        
+def aprs_stats():
+    logger.info('APRS-IS client: %s', APRS_CLIENT.stats())
 
 def aprs_send(packet):
-    AIS = aprslib.IS(aprs_callsign, passwd=aprs_passcode, host=aprs_server, port=aprs_port)
-    AIS.connect()
-    AIS.sendall(packet)
-    AIS.close()
-    logger.info('Sent APRS packet')
+    global APRS_CLIENT
+    if APRS_CLIENT is None:
+        APRS_CLIENT = aprsClient(aprs_callsign, aprs_passcode, aprs_server, aprs_port, logger).start()
+        reactor.addSystemEventTrigger('before', 'shutdown', APRS_CLIENT.stop)
+        task.LoopingCall(aprs_stats).start(STATS_INTERVAL, now=False)
+    APRS_CLIENT.send(packet)
+
+# Slow side effects of D-APRS traffic (SMTP, dashboard files, user commands) are queued here and done by worker threads, never in the reactor
+SIDE_EFFECTS = None
+
+def side_effect_stats():
+    logger.info('D-APRS workers: %s', SIDE_EFFECTS.stats())
+
+def side_effect(_stage, _func, *_args, **_kwargs):
+    global SIDE_EFFECTS
+    if SIDE_EFFECTS is None:
+        SIDE_EFFECTS = workerPool(logger, _name='d-aprs').start()
+        reactor.addSystemEventTrigger('before', 'shutdown', SIDE_EFFECTS.stop)
+        task.LoopingCall(side_effect_stats).start(STATS_INTERVAL, now=False)
+    return SIDE_EFFECTS.submit(_stage, _func, *_args, **_kwargs)
+
+# Workers can write the dashboard files at the same time
+DASHBOARD_LOCK = threading.Lock()
 
 def dashboard_loc_write(call, lat, lon, time):
-    #try:
-    dash_entries = ast.literal_eval(os.popen('cat /tmp/gps_data_user_loc.txt').read())
-   # except:
-    #    dash_entries = []
-    dash_entries.insert(0, {'call': call, 'lat': lat, 'lon': lon, 'time':time})
-    with open("/tmp/gps_data_user_loc.txt", 'w') as user_loc_file:
+    with DASHBOARD_LOCK:
+        with open("/tmp/gps_data_user_loc.txt", 'r') as user_loc_file:
+            dash_entries = ast.literal_eval(user_loc_file.read())
+        dash_entries.insert(0, {'call': call, 'lat': lat, 'lon': lon, 'time':time})
+        with open("/tmp/gps_data_user_loc.txt", 'w') as user_loc_file:
             user_loc_file.write(str(dash_entries[:15]))
-            user_loc_file.close()
     logger.info('User location saved for dashboard')
-    #logger.info(dash_entries)
 
 def dashboard_bb_write(call, dmr_id, time, bulletin):
-    #try:
-    dash_bb = ast.literal_eval(os.popen('cat /tmp/gps_data_user_bb.txt').read())
-   # except:
-    #    dash_entries = []
-    dash_bb.insert(0, {'call': call, 'dmr_id': dmr_id, 'time': time, 'bulliten':bulletin})
-    with open("/tmp/gps_data_user_bb.txt", 'w') as user_bb_file:
+    with DASHBOARD_LOCK:
+        with open("/tmp/gps_data_user_bb.txt", 'r') as user_bb_file:
+            dash_bb = ast.literal_eval(user_bb_file.read())
+        dash_bb.insert(0, {'call': call, 'dmr_id': dmr_id, 'time': time, 'bulliten':bulletin})
+        with open("/tmp/gps_data_user_bb.txt", 'w') as user_bb_file:
             user_bb_file.write(str(dash_bb[:5]))
-            user_bb_file.close()
     logger.info('User bulletin entry saved.')
-    #logger.info(dash_bb)
+
+# Run a command from cmd_list
+#
+def run_command(command):
+    return os.popen(command).read()
 
 # Send email via SMTP function
 def send_email(to_email, email_subject, email_message):
@@ -164,12 +187,46 @@ def send_email(to_email, email_subject, email_message):
     account_password = EMAIL_PASSWORD
     smtp_server = smtplib.SMTP_SSL(SMTP_SERVER, int(SMTP_PORT))
     smtp_server.login(sender_address, account_password)
-    message = "From: " + aprs_callsign + " D-APRS Gateway\nTo: " + to_email + "\nContent-type: text/html\nSubject: " + email_subject + "\n\n" + '<strong>' + email_subject + '</strong><p>&nbsp;</p><h3>' + email_$
+    message = "From: " + aprs_callsign + " D-APRS Gateway\nTo: " + to_email + "\nContent-type: text/html\nSubject: " + email_subject + "\n\n" + '<strong>' + email_subject + '</strong><p>&nbsp;</p><h3>' + email_message + '</h3>'
     smtp_server.sendmail(sender_address, to_email, message)
     smtp_server.close()
 
 
 
+# Position report for a grid square sent by SMS (@MH)
+#
+def mh_position(from_id, aprs_coord):
+    aprs_lat = aprs_coord[0]
+    aprs_lon = aprs_coord[1]
+    logger.info('Latitude: ' + str(aprs_lat))
+    logger.info('Longitude: ' + str(aprs_lon))
+    user_settings = user_settings_store().settings()
+    if int_id(from_id) not in user_settings:
+        aprs_loc_packet = str(get_alias(int_id(from_id), subscriber_ids)) + '-' + str(user_ssid) + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(aprs_lat) + '/' + str(aprs_lon) + '[/' + aprs_comment + ' DMR ID: ' + str(int_id(from_id))
+    else:
+        if user_settings[int_id(from_id)][1]['ssid'] == '':
+            ssid = user_ssid
+        if user_settings[int_id(from_id)][3]['comment'] == '':
+            comment = aprs_comment + ' DMR ID: ' + str(int_id(from_id))
+        if user_settings[int_id(from_id)][2]['icon'] == '':
+            icon_table = '/'
+            icon_icon = '['
+        if user_settings[int_id(from_id)][2]['icon'] != '':
+            icon_table = user_settings[int_id(from_id)][2]['icon'][0]
+            icon_icon = user_settings[int_id(from_id)][2]['icon'][1]
+        if user_settings[int_id(from_id)][1]['ssid'] != '':
+            ssid = user_settings[int_id(from_id)][1]['ssid']
+        if user_settings[int_id(from_id)][3]['comment'] != '':
+            comment = user_settings[int_id(from_id)][3]['comment']
+        aprs_loc_packet = str(get_alias(int_id(from_id), subscriber_ids)) + '-' + ssid + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(aprs_lat) + icon_table + str(aprs_lon) + icon_icon + '/' + str(comment)
+    logger.info(aprs_loc_packet)
+    try:
+        aprslib.parse(aprs_loc_packet)
+        aprs_send(aprs_loc_packet)
+        side_effect('DASHBOARD', dashboard_loc_write, str(aprslib.parse(aprs_loc_packet)['from']), aprs_lat, aprs_lon, time.strftime('%H:%M:%S - %m/%d/%y'))
+    except:
+        logger.info('Exception. Not uploaded')
+
 # Process SMS, do something bases on message
 
 def process_sms(from_id, sms):
@@ -187,7 +244,7 @@ def process_sms(from_id, sms):
     elif '@COM' in sms:
         user_setting_write(int_id(from_id), re.sub(' .*|@','',sms), re.sub('@COM |@COM','',sms))
     elif '@BB' in sms:
-        dashboard_bb_write(get_alias(int_id(from_id), subscriber_ids), int_id(from_id), time.strftime('%H:%M:%S - %m/%d/%y'), re.sub('@BB|@BB ','',sms))
+        side_effect('DASHBOARD', dashboard_bb_write, get_alias(int_id(from_id), subscriber_ids), int_id(from_id), time.strftime('%H:%M:%S - %m/%d/%y'), re.sub('@BB|@BB ','',sms))
     elif '@' and 'E-' in sms:
         email_message = re.sub('.*@|.* E-', '', sms)
         to_email = re.sub(' E-.*', '', sms)
@@ -195,13 +252,13 @@ def process_sms(from_id, sms):
         logger.info(to_email)
         logger.info(email_message)
         logger.info(email_subject)
-        send_email(to_email, email_subject, email_message)
+        side_effect('EMAIL', send_email, to_email, email_subject, email_message)
     elif 'A-' in sms and '@' in sms:
         #Example SMS text: @ARMDS A-This is a test.
         aprs_dest = re.sub('@| A-.*','',sms)
         aprs_msg = re.sub('^@|.* A-|','',sms)
         logger.info('APRS message to ' + aprs_dest.upper() + '. Message: ' + aprs_msg)
-        user_settings = ast.literal_eval(os.popen('cat ../user_settings.txt').read())
+        user_settings = user_settings_store().settings()
 #        logger.info(user_settings)
         if int_id(from_id) in user_settings and user_settings[int_id(from_id)][1]['ssid'] != '':
             ssid = user_settings[int_id(from_id)][1]['ssid']
@@ -221,45 +278,18 @@ def process_sms(from_id, sms):
         if len(grid_square) < 6:
             pass
         else:
-            aprs_coord = ast.literal_eval(os.popen(str('./mh_to_aprs.py ' + grid_square)).read())
-            aprs_lat = aprs_coord[0]
-            aprs_lon = aprs_coord[1]
-            logger.info('Latitude: ' + str(aprs_lat))
-            logger.info('Longitude: ' + str(aprs_lon))
-            user_settings = ast.literal_eval(os.popen('cat ./user_settings.txt').read())
-            if int_id(from_id) not in user_settings:
-                aprs_loc_packet = str(get_alias(int_id(from_id), subscriber_ids)) + '-' + str(user_ssid) + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(aprs_lat) + '/' + str(aprs_lon) + '[/' + aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
+            try:
+                aprs_coord = grid_to_aprs(grid_square)
+            except ValueError as e:
+                logger.info('Invalid grid square %s: %s', grid_square, e)
             else:
-                if user_settings[int_id(from_id)][1]['ssid'] == '':
-                    ssid = user_ssid
-                if user_settings[int_id(from_id)][3]['comment'] == '':
-                    comment = aprs_comment + ' DMR ID: ' + str(int_id(from_id))
-                if user_settings[int_id(from_id)][2]['icon'] == '':
-                    icon_table = '/'
-                    icon_icon = '['
-                if user_settings[int_id(from_id)][2]['icon'] != '':
-                    icon_table = user_settings[int_id(from_id)][2]['icon'][0]
-                    icon_icon = user_settings[int_id(from_id)][2]['icon'][1]
-                if user_settings[int_id(from_id)][1]['ssid'] != '':
-                    ssid = user_settings[int_id(from_id)][1]['ssid']
-                if user_settings[int_id(from_id)][3]['comment'] != '':
-                    comment = user_settings[int_id(from_id)][3]['comment']
-                aprs_loc_packet = str(get_alias(int_id(from_id), subscriber_ids)) + '-' + ssid + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(aprs_lat) + icon_table + str(aprs_lon) + icon_icon + '/' + str(comment)
-            logger.info(aprs_loc_packet)
-        try:
-            aprslib.parse(aprs_loc_packet)
-            aprs_send(aprs_loc_packet)
-            dashboard_loc_write(str(aprslib.parse(aprs_loc_packet)['from']), aprs_lat, aprs_lon, time.strftime('%H:%M:%S - %m/%d/%y'))
-            pass
-        except:
-            logger.info('Exception. Not uploaded')
-        packet_assembly = ''
+                mh_position(from_id, aprs_coord)
 
 
     try:
         if sms in cmd_list:
             logger.info('Executing command/script.')
-            os.popen(cmd_list[sms]).read()
+            side_effect('COMMAND', run_command, cmd_list[sms])
     except:
         logger.info('Exception. Command possibly not in list, or other error.')
     
@@ -268,249 +298,189 @@ def process_sms(from_id, sms):
 
 
 
+# Data calls to the D-APRS gateway IDs are reassembled per (system, source, destination,
+# timeslot), and complete ones handed to process_location (MD-380 UDT position) or
+# process_data (NMEA position or SMS)
+DATA_REASSEMBLY = dataReassembly()
+
 def process_packet(self, _src_sub, _dst_sub, _ts, _end, _peerid, _data):
     if int_id(_dst_sub) == data_id_1 or int_id(_dst_sub) == data_id_2:
-        global btf
         dmr_data = ahex(_data)[76:100]
-        dmr_data_bits = h2b(dmr_data)
-        data_type = ahex(_data)[61]
-        dmr_data_bytes = str(dmr_data).decode("hex")
-    ##        if int(data_type) == 3:
-    ##            n_test= 1
-        #btf = bitarray.frombytes((dmr_data[57:64]))
-        #btf = ((dmr_data[57:64]))
-        btf_top = ba2num(decode.to_bits(str(dmr_data).decode("hex"))[65:72])
-        _dtype = int(data_type)
-        _rf_src = _src_sub
+        _dtype = int(ahex(_data)[61])
         self._logger.info('(%s) Data Packet Received From: %s, IPSC Peer %s, Destination %s', self._system, int_id(_src_sub), int_id(_peerid), int_id(_dst_sub))
-    ##        self._logger.info(_data[57:65])
-        #self._logger.info(type(dmr_data))
         self._logger.info('Data: ' + dmr_data)
-        #self._logger.info('full group data: ' + str(ahex(_data)))
-        #self._logger.info(str(int_id(_src_sub)))
-        #self._logger.info(str(btf_top))
-        #Sself._logger.info(str(data_type) + str(type(data_type)))
-        #self._logger.info('group data encode: ' + str(ahex(encode_header_lc((ahex(_data))[75:100]))))
-       # self._logger.info(_peerid)
-       #self._logger.info(bitarray(str(_data[:120])))
-        #process_dmr_data(_src_sub, data_type, btf, dmr_data)
-    ##########################################
-        global n_packet_assembly
-    ##        #logger.info(_dtype_vseq)
-    ##    if int_id(_dst_id) == data_id:
-    ##        #logger.info(type(_seq))
-    ##        if type(_seq) is bytes:
-    ##            pckt_seq = int.from_bytes(_seq, 'big')
-    ##        else:
-    ##            pckt_seq = _seq
-    ##        # Try to classify header
-    ##        if _call_type == call_type or (_call_type == 'vcsbk' and pckt_seq > 3): #int.from_bytes(_seq, 'big') > 3 ):
-
-# Begin MD-380 here
-        if _dtype == 6 and dmr_data[3] == '5':
-                global udt_block, hdr_type
+
+        _call = DATA_REASSEMBLY.receive(self._system, _src_sub, _dst_sub, _ts, _dtype, dmr_data)
+        if _dtype == 6:
+            if dmr_data[3] == '5':
                 logger.info('MD-380 type UDT header detected. Very next packet should be location.')
-                hdr_type = '380'
-##            if _dtype_vseq == 6 and hdr_type == '380' or _dtype_vseq == 'group' and hdr_type == '380':
-        if _dtype == 6 and hdr_type == '380':
-            udt_block = 1
-        if _dtype == 7 and hdr_type == '380':
-            udt_block = udt_block - 1
-            if udt_block == 0:
-                logger.info('MD-380 type packet. This should contain the GPS location.')
-                if ba2num(dmr_data_bits[1:2]) == 1:
-                    lat_dir = 'N'
-                if ba2num(dmr_data_bits[1:2]) == 0:
-                    lat_dir = 'S'
-                if ba2num(dmr_data_bits[2:3]) == 1:
-                    lon_dir = 'E'
-                if ba2num(dmr_data_bits[2:3]) == 0:
-                    lon_dir = 'W'
-                lat_deg = ba2num(dmr_data_bits[11:18])
-                lon_deg = ba2num(dmr_data_bits[38:46])
-                lat_min = ba2num(dmr_data_bits[18:24])
-                lon_min = ba2num(dmr_data_bits[46:52])
-                lat_min_dec = ba2num(dmr_data_bits[24:38]).zfill(4)
-                lon_min_dec = ba2num(dmr_data_bits[52:66]).zfill(4)
-                aprs_lat = str(str(lat_deg) + str(lat_min) + '.' + str(lat_min_dec)[0:2]).zfill(7) + lat_dir
-                aprs_lon = str(str(lon_deg) + str(lon_min) + '.' + str(lon_min_dec)[0:2]).zfill(8) + lon_dir
-                    # Form APRS packet
-                    # For future use below
-                    #aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + ssid + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(aprs_lat) + icon_table + str(aprs_lon) + icon_icon + '/' + str(comment)
-                    
-                    #logger.info(aprs_loc_packet)
-                logger.info('Lat: ' + str(aprs_lat) + ' Lon: ' + str(aprs_lon))
-                user_settings = ast.literal_eval(os.popen('cat ./user_settings.txt').read())
-                if int_id(_rf_src) not in user_settings:
-                    aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + str(user_ssid) + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(aprs_lat) + '/' + str(aprs_lon) + '[/' + aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
-                else:
-                    if user_settings[int_id(_rf_src)][1]['ssid'] == '':
-                        ssid = user_ssid
-                    if user_settings[int_id(_rf_src)][3]['comment'] == '':
-                        comment = aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
-                    if user_settings[int_id(_rf_src)][2]['icon'] == '':
-                        icon_table = '/'
-                        icon_icon = '['
-                    if user_settings[int_id(_rf_src)][2]['icon'] != '':
-                        icon_table = user_settings[int_id(_rf_src)][2]['icon'][0]
-                        icon_icon = user_settings[int_id(_rf_src)][2]['icon'][1]
-                    if user_settings[int_id(_rf_src)][1]['ssid'] != '':
-                        ssid = user_settings[int_id(_rf_src)][1]['ssid']
-                    if user_settings[int_id(_rf_src)][3]['comment'] != '':
-                        comment = user_settings[int_id(_rf_src)][3]['comment']
-                    aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + ssid + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(aprs_lat) + icon_table + str(aprs_lon) + icon_icon + '/' + str(comment)
-                logger.info(aprs_loc_packet)
-                # Attempt to prevent malformed packets from being uploaded.
-                try:
-                    aprslib.parse(aprs_loc_packet)
-                    float(lat) < 91
-                    float(lon) < 121
-                    aprs_send(aprs_loc_packet)
-                    dashboard_loc_write(str(aprslib.parse(aprs_loc_packet)['from']), aprs_lat, aprs_lon, time.strftime('%H:%M:%S - %m/%d/%y'))
-                    logger.info('Sent APRS packet')
-                except:
-                    logger.info('Error. Failed to send packet. Packet may be malformed.')
-                udt_block = 1
-                hdr_type = ''
             else:
-                  pass
-# End MD-380 here
+                self._logger.info('Header from ' + str(get_alias(int_id(_src_sub), subscriber_ids)) + '. DMR ID: ' + str(int_id(_src_sub)))
+                self._logger.info('Blocks to follow: ' + str(DATA_REASSEMBLY.pending(self._system, _src_sub, _dst_sub, _ts)))
+        elif _dtype == 7:
+            self._logger.info('Data block from ' + str(get_alias(int_id(_src_sub), subscriber_ids)) + '. DMR ID: ' + str(int_id(_src_sub)))
+        if _call is None:
+            return
 
-        
-        if _dtype == 6 and dmr_data[3] != '5':
-            global hdr_start, btf
-            hdr_start = dmr_data[0:3]
-            self._logger.info('Header from ' + str(get_alias(int_id(_rf_src), subscriber_ids)) + '. DMR ID: ' + str(int_id(_rf_src)))
-            #logger.info(ahex(bptc_decode(_data)))
-            self._logger.info('Blocks to follow: ' + str(btf))
-            btf = btf_top
-            packet_assembly = ''
-        # Data blocks at 1/2 rate, see https://github.com/g4klx/MMDVM/blob/master/DMRDefines.h for data types. _dtype_seq defined here also
-        if _dtype == 7 and hdr_type != '380':
-            #self._logger.info(str(btf))
-            btf = btf - 1
-            self._logger.info('Block #: ' + str(btf))
-            #logger.info(_seq)
-            global packet_assembly
-            self._logger.info('Data block from ' + str(get_alias(int_id(_rf_src), subscriber_ids)) + '. DMR ID: ' + str(int_id(_rf_src)))
-            #logger.info(ahex(bptc_decode(_data)))
-            
-    ##                if _seq == 0:
-    ##                    n_packet_assembly = 0
-    ##                    packet_assembly = ''
-                
-            if btf < btf + 1:
-                n_packet_assembly = n_packet_assembly + 1
-                packet_assembly = packet_assembly + str(dmr_data) #str((decode_full_lc(b_packet)).strip('bitarray('))
-                #self._logger.info(packet_assembly)
-            # Use block 0 as trigger. $GPRMC must also be in string to indicate NMEA.
-            # This triggers the APRS upload
-            if btf == 0:#_seq == 12:
-                #final_packet = str(bitarray(re.sub("\)|\(|bitarray|'", '', packet_assembly)).tobytes().decode('utf-8', 'ignore'))
-                final_packet = packet_assembly.decode("hex")
-                #sms_hex = str(ba2hx(bitarray(re.sub("\)|\(|bitarray|'", '', packet_assembly))))
-                sms_hex = packet_assembly[74:-8]
-                #NMEA GPS sentence
-                if '$GPRMC' in final_packet or '$GNRMC' in final_packet:
-                    self._logger.info(final_packet + '\n')
-                    nmea_parse = re.sub('A\*.*|.*\$', '', str(final_packet))
-                    loc = pynmea2.parse(nmea_parse, check=False)
-                    self._logger.info('Latitude: ' + str(loc.lat) + str(loc.lat_dir) + ' Longitude: ' + str(loc.lon) + str(loc.lon_dir) + ' Direction: ' + str(loc.true_course) + ' Speed: ' + str(loc.spd_over_grnd) + '\n')
-                    # Begin APRS format and upload
+        _kind, hdr_start, packet_assembly = _call
+        if _kind == 'UDT':
+            process_location(self, _src_sub, h2b(packet_assembly))
+        else:
+            process_data(self, _src_sub, hdr_start, packet_assembly)
+
+# Position from an MD-380 style UDT data call
+#
+def process_location(self, _rf_src, dmr_data_bits):
+    logger.info('MD-380 type packet. This should contain the GPS location.')
+    if ba2num(dmr_data_bits[1:2]) == 1:
+        lat_dir = 'N'
+    if ba2num(dmr_data_bits[1:2]) == 0:
+        lat_dir = 'S'
+    if ba2num(dmr_data_bits[2:3]) == 1:
+        lon_dir = 'E'
+    if ba2num(dmr_data_bits[2:3]) == 0:
+        lon_dir = 'W'
+    lat_deg = ba2num(dmr_data_bits[11:18])
+    lon_deg = ba2num(dmr_data_bits[38:46])
+    lat_min = ba2num(dmr_data_bits[18:24])
+    lon_min = ba2num(dmr_data_bits[46:52])
+    lat_min_dec = str(ba2num(dmr_data_bits[24:38])).zfill(4)
+    lon_min_dec = str(ba2num(dmr_data_bits[52:66])).zfill(4)
+    aprs_lat = str(str(lat_deg) + str(lat_min).zfill(2) + '.' + str(lat_min_dec)[0:2]).zfill(7) + lat_dir
+    aprs_lon = str(str(lon_deg) + str(lon_min).zfill(2) + '.' + str(lon_min_dec)[0:2]).zfill(8) + lon_dir
+    # Form APRS packet
+    # For future use below
+    #aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + ssid + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(aprs_lat) + icon_table + str(aprs_lon) + icon_icon + '/' + str(comment)
+    #logger.info(aprs_loc_packet)
+    logger.info('Lat: ' + str(aprs_lat) + ' Lon: ' + str(aprs_lon))
+    # Seven and eight bits of degrees and six of minutes can hold more than a position can be
+    if lat_deg > 90 or lon_deg > 180 or lat_min > 59 or lon_min > 59:
+        logger.info('Position out of range. Not uploaded.')
+        return
+    user_settings = user_settings_store().settings()
+    if int_id(_rf_src) not in user_settings:
+        aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + str(user_ssid) + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(aprs_lat) + '/' + str(aprs_lon) + '[/' + aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
+    else:
+        if user_settings[int_id(_rf_src)][1]['ssid'] == '':
+            ssid = user_ssid
+        if user_settings[int_id(_rf_src)][3]['comment'] == '':
+            comment = aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
+        if user_settings[int_id(_rf_src)][2]['icon'] == '':
+            icon_table = '/'
+            icon_icon = '['
+        if user_settings[int_id(_rf_src)][2]['icon'] != '':
+            icon_table = user_settings[int_id(_rf_src)][2]['icon'][0]
+            icon_icon = user_settings[int_id(_rf_src)][2]['icon'][1]
+        if user_settings[int_id(_rf_src)][1]['ssid'] != '':
+            ssid = user_settings[int_id(_rf_src)][1]['ssid']
+        if user_settings[int_id(_rf_src)][3]['comment'] != '':
+            comment = user_settings[int_id(_rf_src)][3]['comment']
+        aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + ssid + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(aprs_lat) + icon_table + str(aprs_lon) + icon_icon + '/' + str(comment)
+    logger.info(aprs_loc_packet)
+    # Attempt to prevent malformed packets from being uploaded.
+    try:
+        _parsed = aprslib.parse(aprs_loc_packet)
+    except (aprslib.ParseError, aprslib.UnknownFormat):
+        logger.info('Error. Failed to send packet. Packet may be malformed.')
+        return
+    aprs_send(aprs_loc_packet)
+    side_effect('DASHBOARD', dashboard_loc_write, str(_parsed['from']), aprs_lat, aprs_lon, time.strftime('%H:%M:%S - %m/%d/%y'))
+    logger.info('Sent APRS packet')
+
+# NMEA position or SMS from a reassembled data call. hdr_start is the start of the data
+# header (as hex), packet_assembly the blocks (as hex).
+#
+def process_data(self, _rf_src, hdr_start, packet_assembly):
+    final_packet = packet_assembly.decode("hex")
+    #sms_hex = str(ba2hx(bitarray(re.sub("\)|\(|bitarray|'", '', packet_assembly))))
+    sms_hex = packet_assembly[74:-8]
+    #NMEA GPS sentence
+    if '$GPRMC' in final_packet or '$GNRMC' in final_packet:
+        self._logger.info(final_packet + '\n')
+        nmea_parse = re.sub('A\*.*|.*\$', '', str(final_packet))
+        loc = pynmea2.parse(nmea_parse, check=False)
+        self._logger.info('Latitude: ' + str(loc.lat) + str(loc.lat_dir) + ' Longitude: ' + str(loc.lon) + str(loc.lon_dir) + ' Direction: ' + str(loc.true_course) + ' Speed: ' + str(loc.spd_over_grnd) + '\n')
+        # Begin APRS format and upload
     ##                            aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + str(user_ssid) + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(final_packet[29:36]) + str(final_packet[39]) + '/' + str(re.sub(',', '', final_packet[41:49])) + str(final_packet[52]) + '[/' + aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
-                    try:
-##                        with open("./user_settings.txt", 'r') as f:
-##                            user_settings = ast.literal_eval(f.read())
-                        user_settings = ast.literal_eval(os.popen('cat ' + user_settings_file).read())
-                        if int_id(_rf_src) not in user_settings:
-                            aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + str(user_ssid) + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(loc.lat[0:7]) + str(loc.lat_dir) + '/' + str(loc.lon[0:8]) + str(loc.lon_dir) + '[/' + aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
-                        else:
-                            global comment, ssid, icon_table, icon_icon, course, speed
-                            #logger.info(user_settings)
-                            if user_settings[int_id(_rf_src)][1]['ssid'] == '':
-                                ssid = user_ssid
-                            if user_settings[int_id(_rf_src)][3]['comment'] == '':
-                                comment = aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
-                            if user_settings[int_id(_rf_src)][2]['icon'] == '':
-                                icon_table = '/'
-                                icon_icon = '['
-                            if user_settings[int_id(_rf_src)][2]['icon'] != '':
-                                icon_table = user_settings[int_id(_rf_src)][2]['icon'][0]
-                                icon_icon = user_settings[int_id(_rf_src)][2]['icon'][1]
-                            if user_settings[int_id(_rf_src)][1]['ssid'] != '':
-                                ssid = user_settings[int_id(_rf_src)][1]['ssid']
-                            if user_settings[int_id(_rf_src)][3]['comment'] != '':
-                                comment = user_settings[int_id(_rf_src)][3]['comment']
-                            if loc.true_course == '0.0':
-                                course = '000'
-                            if loc.spd_over_grnd == float(0.0):
-                                speed = '000'
-                            if loc.true_course != '0.0':
-                                course = re.sub('.0','', str(round(loc.true_course))).zfill(3)
-                            if loc.spd_over_grnd != float(0.0):
-                                speed = re.sub('.0','', str(round(loc.spd_over_grnd))).zfill(3)
-                            #logger.info(type(loc.spd_over_grnd))
-                            #logger.info(course)
-                            #aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + ssid + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(loc.lat[0:7]) + str(loc.lat_dir) + icon_table + str(loc.lon[0:8]) + str(loc.lon_dir) + icon_icon + '/' + str(comment)
-                            aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + ssid + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(loc.lat[0:7]) + str(loc.lat_dir) + icon_table + str(loc.lon[0:8]) + str(loc.lon_dir) + icon_icon + str(course) + '/' + str(speed) + '/' + str(comment)
-                        self._logger.info(aprs_loc_packet)
-                        #self._logger.info('User comment: ' + comment)
-                        #self._logger.info('User SSID: ' + ssid)
-                        #self._logger.info('User icon: ' + icon_table + icon_icon)
+        try:
+            user_settings = user_settings_store().settings()
+            if int_id(_rf_src) not in user_settings:
+                aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + str(user_ssid) + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(loc.lat[0:7]) + str(loc.lat_dir) + '/' + str(loc.lon[0:8]) + str(loc.lon_dir) + '[/' + aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
+            else:
+                global comment, ssid, icon_table, icon_icon, course, speed
+                #logger.info(user_settings)
+                if user_settings[int_id(_rf_src)][1]['ssid'] == '':
+                    ssid = user_ssid
+                if user_settings[int_id(_rf_src)][3]['comment'] == '':
+                    comment = aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
+                if user_settings[int_id(_rf_src)][2]['icon'] == '':
+                    icon_table = '/'
+                    icon_icon = '['
+                if user_settings[int_id(_rf_src)][2]['icon'] != '':
+                    icon_table = user_settings[int_id(_rf_src)][2]['icon'][0]
+                    icon_icon = user_settings[int_id(_rf_src)][2]['icon'][1]
+                if user_settings[int_id(_rf_src)][1]['ssid'] != '':
+                    ssid = user_settings[int_id(_rf_src)][1]['ssid']
+                if user_settings[int_id(_rf_src)][3]['comment'] != '':
+                    comment = user_settings[int_id(_rf_src)][3]['comment']
+                if loc.true_course == '0.0':
+                    course = '000'
+                if loc.spd_over_grnd == float(0.0):
+                    speed = '000'
+                if loc.true_course != '0.0':
+                    course = re.sub('.0','', str(round(loc.true_course))).zfill(3)
+                if loc.spd_over_grnd != float(0.0):
+                    speed = re.sub('.0','', str(round(loc.spd_over_grnd))).zfill(3)
+                #logger.info(type(loc.spd_over_grnd))
+                #logger.info(course)
+                #aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + ssid + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(loc.lat[0:7]) + str(loc.lat_dir) + icon_table + str(loc.lon[0:8]) + str(loc.lon_dir) + icon_icon + '/' + str(comment)
+                aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + ssid + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(loc.lat[0:7]) + str(loc.lat_dir) + icon_table + str(loc.lon[0:8]) + str(loc.lon_dir) + icon_icon + str(course) + '/' + str(speed) + '/' + str(comment)
+            self._logger.info(aprs_loc_packet)
+            #self._logger.info('User comment: ' + comment)
+            #self._logger.info('User SSID: ' + ssid)
+            #self._logger.info('User icon: ' + icon_table + icon_icon)
 ##                        f.close()
-                    except:
-                        logger.info('Error or user settings file not found, proceeding with default settings.')
-                        logger.info(loc.true_course)
-                        #aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + str(15) + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(loc.lat[0:7]) + str(loc.lat_dir) + '/' + str(loc.lon[0:8]) + str(loc.lon_dir) + '[' + str(round(loc.true_course)).zfill(3) + '/' + str(round(loc.spd_over_grnd)).zfill(3) + '/' + aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
-                        aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + str(15) + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(loc.lat[0:7]) + str(loc.lat_dir) + '/' + str(loc.lon[0:8]) + str(loc.lon_dir) + '[/' + aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
-                        logger.info(aprs_loc_packet)
-                        #aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + str(user_ssid) + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(loc.lat[0:7]) + str(loc.lat_dir) + '/' + str(loc.lon[0:8]) + str(loc.lon_dir) + '[' + str(round(loc.true_course)).zfill(3) + '/' + str(round(loc.spd_over_grnd)).zfill(3) + '/' + aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
-
-                try:
-                    # Try parse of APRS packet. If it fails, it will not upload to APRS-IS
-                    #logger.info(re.sub('\..*', '', str(round(loc.true_course)).zfill(3)))
-                    aprslib.parse(aprs_loc_packet)
-                    # Float values of lat and lon. Anything that is not a number will cause it to fail.
-                    float(loc.lat)
-                    float(loc.lon)
-                    aprs_send(aprs_loc_packet)
-                    dashboard_loc_write(str(aprslib.parse(aprs_loc_packet)['from']), str(loc.lat[0:7]) + str(loc.lat_dir), str(loc.lon[0:8]) + str(loc.lon_dir), time.strftime('%H:%M:%S - %m/%d/%y'))
-                    packet_assembly = ''
-                except:
-
-                    self._logger.info('Failed to parse packet. Packet may be deformed. Not uploaded.')
-                    # Get callsign based on DMR ID
-                    # End APRS-IS upload
-                # Assume this is an SMS message
-                if '$GPRMC' not in final_packet or '$GNRMC' not in final_packet:
-                    # Motorola type SMS header
-                    if '824' in hdr_start or '024' in hdr_start:
-                        self._logger.info('\nMotorola type SMS')
-                        #sms = codecs.decode(bytes.fromhex(''.join(sms_hex[74:-8].split('00'))), 'utf-8')
-                        #sms = ''.join(sms_hex).split('00')).decode('hex')
-                        sms = ''.join((sms_hex.split('00')))
-                        sms = sms.decode('hex')
-                        logger.info(sms)
-                        self._logger.info('\n\n' + 'Received SMS from ' + str(get_alias(int_id(_rf_src), subscriber_ids)) + ', DMR ID: ' + str(int_id(_rf_src)) + ': ' + str(sms) + '\n')
-                        process_sms(_rf_src, sms)
-                    else:
-                        self._logger.info('Unknown type SMS')
-                        self._logger.info(final_packet)
-                        logger.info(hdr_start)
-                        pass
-                        #logger.info(bitarray(re.sub("\)|\(|bitarray|'", '', str(bptc_decode(_data)).tobytes().decode('utf-8', 'ignore'))))
-                    #logger.info('\n\n' + 'Received SMS from ' + str(get_alias(int_id(_rf_src), subscriber_ids)) + ', DMR ID: ' + str(int_id(_rf_src)) + ': ' + str(sms) + '\n')
-                # Reset the packet assembly to prevent old data from returning.
-                packet_assembly = ''
-                hdr_start = ''
-            #logger.info(_seq)
-            #logger.info(_dtype_vseq)
-        #logger.info(ahex(bptc_decode(_data)).decode('utf-8', 'ignore'))
-        #logger.info(bitarray(re.sub("\)|\(|bitarray|'", '', str(bptc_decode(_data)).tobytes().decode('utf-8', 'ignore'))))
-    else:
-        pass
+        except:
+            logger.info('Error or user settings file not found, proceeding with default settings.')
+            logger.info(loc.true_course)
+            #aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + str(15) + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(loc.lat[0:7]) + str(loc.lat_dir) + '/' + str(loc.lon[0:8]) + str(loc.lon_dir) + '[' + str(round(loc.true_course)).zfill(3) + '/' + str(round(loc.spd_over_grnd)).zfill(3) + '/' + aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
+            aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + str(15) + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(loc.lat[0:7]) + str(loc.lat_dir) + '/' + str(loc.lon[0:8]) + str(loc.lon_dir) + '[/' + aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
+            logger.info(aprs_loc_packet)
+            #aprs_loc_packet = str(get_alias(int_id(_rf_src), subscriber_ids)) + '-' + str(user_ssid) + '>APHBLD,TCPIP*:/' + str(datetime.datetime.utcnow().strftime("%H%M%Sh")) + str(loc.lat[0:7]) + str(loc.lat_dir) + '/' + str(loc.lon[0:8]) + str(loc.lon_dir) + '[' + str(round(loc.true_course)).zfill(3) + '/' + str(round(loc.spd_over_grnd)).zfill(3) + '/' + aprs_comment + ' DMR ID: ' + str(int_id(_rf_src))
 
+    try:
+        # Try parse of APRS packet. If it fails, it will not upload to APRS-IS
+        #logger.info(re.sub('\..*', '', str(round(loc.true_course)).zfill(3)))
+        aprslib.parse(aprs_loc_packet)
+        # Float values of lat and lon. Anything that is not a number will cause it to fail.
+        float(loc.lat)
+        float(loc.lon)
+        aprs_send(aprs_loc_packet)
+        side_effect('DASHBOARD', dashboard_loc_write, str(aprslib.parse(aprs_loc_packet)['from']), str(loc.lat[0:7]) + str(loc.lat_dir), str(loc.lon[0:8]) + str(loc.lon_dir), time.strftime('%H:%M:%S - %m/%d/%y'))
+    except:
 
+        self._logger.info('Failed to parse packet. Packet may be deformed. Not uploaded.')
+        # Get callsign based on DMR ID
+        # End APRS-IS upload
+    # Assume this is an SMS message
+    if '$GPRMC' not in final_packet or '$GNRMC' not in final_packet:
+        # Motorola type SMS header
+        if '824' in hdr_start or '024' in hdr_start:
+            self._logger.info('\nMotorola type SMS')
+            #sms = codecs.decode(bytes.fromhex(''.join(sms_hex[74:-8].split('00'))), 'utf-8')
+            #sms = ''.join(sms_hex).split('00')).decode('hex')
+            sms = ''.join((sms_hex.split('00')))
+            sms = sms.decode('hex')
+            logger.info(sms)
+            self._logger.info('\n\n' + 'Received SMS from ' + str(get_alias(int_id(_rf_src), subscriber_ids)) + ', DMR ID: ' + str(int_id(_rf_src)) + ': ' + str(sms) + '\n')
+            process_sms(_rf_src, sms)
+        else:
+            self._logger.info('Unknown type SMS')
+            self._logger.info(final_packet)
+            logger.info(hdr_start)
+            pass
+            #logger.info(bitarray(re.sub("\)|\(|bitarray|'", '', str(bptc_decode(_data)).tobytes().decode('utf-8', 'ignore'))))
+        #logger.info('\n\n' + 'Received SMS from ' + str(get_alias(int_id(_rf_src), subscriber_ids)) + ', DMR ID: ' + str(int_id(_rf_src)) + ': ' + str(sms) + '\n')
 
 
 # Global variables used whether we are a module or __main__
@@ -593,6 +563,21 @@ def mk_ipsc_systems(_config, _logger, _systems, _ipsc, _report_server):
             reactor.listenUDP(_config['SYSTEMS'][system]['LOCAL']['PORT'], _systems[system], interface=_config['SYSTEMS'][system]['LOCAL']['IP'])
     return _systems
 
+# Flip the hot-path trace on every system: if any of them is tracing, turn them all off,
+# otherwise turn them all on. Meant to be hooked to SIGUSR1.
+#
+def toggle_hot_trace(_systems):
+    _enable = not any(_systems[system]._hot_trace for system in _systems)
+    for system in _systems:
+        _systems[system].set_hot_trace(_enable)
+
+# Dump the call recorder of every system that has one (see IPSC.dump_recorder). Meant to be
+# hooked to SIGUSR2.
+#
+def dump_recorders(_systems):
+    for system in _systems:
+        _systems[system].dump_recorder()
+
 # Process the MODE byte in registration/peer list packets for determining master and peer capabilities
 #
 def process_mode_byte(_hex_mode):
@@ -730,6 +715,25 @@ def print_master(_config, _network):
 #     IPSC CLASS
 #************************************************
 
+# Validation policies for the opcode dispatch table. Every opcode in the table carries one
+# of these, and datagramReceived checks the originating peer against it before the handler
+# is called.
+#
+VALID_NONE      = 0     # Nothing to check (registration requests, unknown packet types)
+VALID_ANY_PEER  = 1     # Any valid peer or the master (ANY_PEER_REQUIRED)
+VALID_PEER      = 2     # Only a previously validated peer (PEER_REQUIRED)
+VALID_MASTER    = 3     # Only our master (MASTER_REQUIRED)
+
+# The fixed part of the header on every user (voice and data) packet, decoded with one
+# unpack_from() call straight out of the datagram instead of slicing it field by field:
+#   [0] packet type  [1:5] peer ID  [5] sequence  [6:9] source sub  [9:12] destination
+#   [12] call type  [13:17] unknown  [17] call info (timeslot and end-of-call bits)
+#
+IPSC_HEADER = Struct('>c4sc3s3sc4sB')
+
+class ipscHeader(namedtuple('ipscHeader', 'packettype peerid seq src_sub dst_sub call_type unknown_1 call_info')):
+    __slots__ = ()
+
 class IPSC(DatagramProtocol):
     def __init__(self, _name, _config, _logger, _report):
 
@@ -754,6 +758,32 @@ class IPSC(DatagramProtocol):
         #
         self._peers = self._config['PEERS']
         #
+        # Destinations for send_to_ipsc: (ip, port) of the master (if connected) and every connected
+        # peer. Only rebuilt when connectivity changes (see rebuild_destinations), so fanning out a
+        # voice frame doesn't have to walk the peer dictionaries.
+        self._ipsc_dests = ()
+        # Batched (sendmmsg) transmit for send_to_ipsc, set up in startProtocol if BATCH_TX is on
+        self._batch_tx = None
+        # Decoded header of the user packet currently being handled (see datagramReceived)
+        self._rx_header = None
+        # Hot-path (per user packet) trace, off unless HOT_TRACE is set or toggled at runtime
+        self._hot_trace = self._local.get('HOT_TRACE', False)
+        self._trace_sample = self._local.get('TRACE_SAMPLE', 1)
+        self._trace_count = 0
+        # Flood protection for per-packet warnings. Suppressed counts live in the system
+        # config so they go out with everything else to the reporting clients
+        self._config['SUPPRESSED'] = {}
+        self._limiter = warningLimiter(self._system, self._logger, self._config['SUPPRESSED'])
+        # Traffic we originate ourselves, paced out one frame at a time per timeslot (see send_paced)
+        self._pacers = {1: None, 2: None}
+        # Always-on recorder of the last RECORDER_MINUTES of user packets, if configured
+        if self._local.get('RECORDER_MINUTES'):
+            self._recorder = ringRecorder(self._system, self._local['RECORDER_MINUTES'])
+        else:
+            self._recorder = None
+        # One dump at a time per system, so two writer threads never race for a file name
+        self._dump_lock = defer.DeferredLock()
+        #
         # This is a regular list to store peers for the IPSC. At times, parsing a simple list is much less
         # Spendy than iterating a list of dictionaries... Maybe I'll find a better way in the future. Also
         # We have to know when we have a new peer list, so a variable to indicate we do (or don't)
@@ -784,9 +814,71 @@ class IPSC(DatagramProtocol):
         self.DE_REG_REQ_PKT         = (DE_REG_REQ + self._local_id)
         self.DE_REG_REPLY_PKT       = (DE_REG_REPLY + self._local_id)
         #
+        # Authenticated IPSC: key the HMAC-SHA1 once, each packet gets a copy of this template
+        # (see auth_hash) instead of a fresh key schedule.
+        self._auth_hmac = hmac_new(self._local['AUTH_KEY'], digestmod=sha1)
+        #
+        # Opcode dispatch table: 256 entries, indexed by the first byte of the packet. Built once
+        # here so the callbacks are already bound to whatever subclass we are.
+        self.build_dispatch()
+        #
         self._logger.info('(%s) IPSC Instance Created: %s, %s:%s', self._system, int_id(self._local['RADIO_ID']), self._local['IP'], self._local['PORT'])
 
 
+    #******************************************************
+    #     OPCODE DISPATCH TABLE
+    #******************************************************
+
+    # Build the table used by datagramReceived. Each entry is a (policy, handler, user) tuple.
+    # User packet handlers (user = True) are the group_voice/private_voice/etc. callbacks and are
+    # called with the decoded IPSC header, everything else is called as
+    # handler(_data, _peerid, _host, _port). Anything we don't know about goes to unknown_message.
+    #
+    def build_dispatch(self):
+        self._dispatch = [(VALID_NONE, self.unknown_packet, False)] * 256
+
+        # PACKETS THAT WE RECEIVE FROM ANY VALID PEER OR VALID MASTER
+        # Originated by subscriber units - a.k.a someone transmitted
+        self.register_opcode(GROUP_VOICE,      self.group_voice,      VALID_ANY_PEER, True)
+        self.register_opcode(PVT_VOICE,        self.private_voice,    VALID_ANY_PEER, True)
+        self.register_opcode(GROUP_DATA,       self.group_data,       VALID_ANY_PEER, True)
+        self.register_opcode(PVT_DATA,         self.private_data,     VALID_ANY_PEER, True)
+        # Motorola XCMP/XNL control protocol: we don't process these (yet)
+        self.register_opcode(XCMP_XNL,         lambda _data, _peerid, _host, _port: self.xcmp_xnl(_data), VALID_ANY_PEER)
+        # Originated by peers, not IPSC maintenance: call monitoring is all we've found here so far
+        self.register_opcode(CALL_MON_STATUS,  lambda _data, _peerid, _host, _port: self.call_mon_status(_data), VALID_ANY_PEER)
+        self.register_opcode(CALL_MON_RPT,     lambda _data, _peerid, _host, _port: self.call_mon_rpt(_data), VALID_ANY_PEER)
+        self.register_opcode(CALL_MON_NACK,    lambda _data, _peerid, _host, _port: self.call_mon_nack(_data), VALID_ANY_PEER)
+        # IPSC connection maintenance messages
+        self.register_opcode(DE_REG_REQ,       self.de_reg_req,       VALID_ANY_PEER)
+        self.register_opcode(DE_REG_REPLY,     self.de_reg_reply,     VALID_ANY_PEER)
+        self.register_opcode(RPT_WAKE_UP,      self.rpt_wake_up,      VALID_ANY_PEER)
+
+        # PACKETS ONLY ACCEPTED FROM A PREVIOUSLY VALIDATED PEER (WE ARE OPERATING AS A PEER)
+        self.register_opcode(PEER_ALIVE_REQ,   lambda _data, _peerid, _host, _port: self.peer_alive_req(_data, _peerid, _host, _port), VALID_PEER)
+        self.register_opcode(PEER_REG_REQ,     lambda _data, _peerid, _host, _port: self.peer_reg_req(_peerid, _host, _port), VALID_PEER)
+        self.register_opcode(PEER_ALIVE_REPLY, lambda _data, _peerid, _host, _port: self.peer_alive_reply(_peerid), VALID_PEER)
+        self.register_opcode(PEER_REG_REPLY,   lambda _data, _peerid, _host, _port: self.peer_reg_reply(_peerid), VALID_PEER)
+
+        # PACKETS ONLY ACCEPTED FROM OUR MASTER
+        self.register_opcode(MASTER_ALIVE_REPLY, lambda _data, _peerid, _host, _port: self.master_alive_reply(_peerid), VALID_MASTER)
+        self.register_opcode(PEER_LIST_REPLY,  lambda _data, _peerid, _host, _port: self.peer_list_reply(_data, _peerid), VALID_MASTER)
+
+        # THIS MEANS WE HAVE SUCCESSFULLY REGISTERED TO OUR MASTER - RECORD MASTER INFORMATION
+        self.register_opcode(MASTER_REG_REPLY, lambda _data, _peerid, _host, _port: self.master_reg_reply(_data, _peerid))
+
+        # THE FOLLOWING PACKETS ARE RECEIVED ONLY IF WE ARE OPERATING AS A MASTER
+        self.register_opcode(MASTER_REG_REQ,   lambda _data, _peerid, _host, _port: self.master_reg_req(_data, _peerid, _host, _port))
+        self.register_opcode(MASTER_ALIVE_REQ, lambda _data, _peerid, _host, _port: self.master_alive_req(_peerid, _host, _port))
+        self.register_opcode(PEER_LIST_REQ,    lambda _data, _peerid, _host, _port: self.peer_list_req(_peerid))
+
+    # Register (or override) the handler and validation policy for a single opcode. Subclasses
+    # call this after IPSC.__init__ to take over packet types the base class doesn't handle.
+    #
+    def register_opcode(self, _opcode, _handler, _policy=VALID_NONE, _user=False):
+        self._dispatch[ord(_opcode)] = (_policy, _handler, _user)
+
+
     #******************************************************
     #     SUPPORT FUNCTIONS FOR HANDLING IPSC OPERATIONS
     #******************************************************
@@ -812,6 +904,7 @@ class IPSC(DatagramProtocol):
         # Iterate for the peer in our data
         if _peerid in self._peers.keys():
             del self._peers[_peerid]
+            self.rebuild_destinations()
             self._logger.info('(%s) Peer De-Registration Requested for: %s', self._system, int_id(_peerid))
             return
         else:
@@ -890,6 +983,22 @@ class IPSC(DatagramProtocol):
                 self.de_register_peer(peer)
                 self._logger.warning('(%s) Peer Deleted (not in new peer list): %s', self._system, int_id(peer))
 
+        # Peer addresses may have changed with the new list
+        self.rebuild_destinations()
+
+    # Rebuild the tuple of (ip, port) destinations used by send_to_ipsc. This MUST be called any
+    # time the master or a peer is connected, disconnected, added, removed or changes address.
+    #
+    def rebuild_destinations(self):
+        _dests = []
+        if self._master_stat['CONNECTED']:
+            _dests.append((self._master['IP'], self._master['PORT']))
+        for peer in self._peers.keys():
+            if self._peers[peer]['STATUS']['CONNECTED']:
+                _dests.append((self._peers[peer]['IP'], self._peers[peer]['PORT']))
+        self._ipsc_dests = tuple(_dests)
+        self._logger.debug('(%s) IPSC destinations updated: %s', self._system, self._ipsc_dests)
+
 
     #************************************************
     #     CALLBACK FUNCTIONS FOR USER PACKET TYPES
@@ -923,27 +1032,80 @@ class IPSC(DatagramProtocol):
         self._logger.debug('(%s) Repeater Wake-Up Packet Received: %s', self._system, ahex(_data))
         #self._logger.info(_data)
         
+    # These run for every frame, so check the level before doing the int_id() conversions
+    # for a message that is probably going to be thrown away
+    #
     def group_voice(self, _src_sub, _dst_sub, _ts, _end, _peerid, _data):
-        self._logger.debug('(%s) Group Voice Packet Received From: %s, IPSC Peer %s, Destination %s', self._system, int_id(_src_sub), int_id(_peerid), int_id(_dst_sub))
-        #self._logger.info(_data)
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug('(%s) Group Voice Packet Received From: %s, IPSC Peer %s, Destination %s', self._system, int_id(_src_sub), int_id(_peerid), int_id(_dst_sub))
     
     def private_voice(self, _src_sub, _dst_sub, _ts, _end, _peerid, _data):
-        self._logger.debug('(%s) Private Voice Packet Received From: %s, IPSC Peer %s, Destination %s', self._system, int_id(_src_sub), int_id(_peerid), int_id(_dst_sub))
-        #self._logger.info(_data)
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug('(%s) Private Voice Packet Received From: %s, IPSC Peer %s, Destination %s', self._system, int_id(_src_sub), int_id(_peerid), int_id(_dst_sub))
     
     def group_data(self, _src_sub, _dst_sub, _ts, _end, _peerid, _data):
-        logger.info('Group data: ')
-        logger.info(ahex(_data))
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug('(%s) Group Data Packet Received From: %s, IPSC Peer %s, Destination %s: %s', self._system, int_id(_src_sub), int_id(_peerid), int_id(_dst_sub), lazyHex(_data))
         process_packet(self, _src_sub, _dst_sub, _ts, _end, _peerid, _data)
     
     def private_data(self, _src_sub, _dst_sub, _ts, _end, _peerid, _data):    
-        logger.info('Private data: ')
-        logger.info(ahex(_data))
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug('(%s) Private Data Packet Received From: %s, IPSC Peer %s, Destination %s: %s', self._system, int_id(_src_sub), int_id(_peerid), int_id(_dst_sub), lazyHex(_data))
         process_packet(self, _src_sub, _dst_sub, _ts, _end, _peerid, _data)
 
     def unknown_message(self, _packettype, _peerid, _data):
-        self._logger.info('Unknown data: ' + str(ahex(_data)))
-        self._logger.error('(%s) Unknown Message - Type: %s From: %s Packet: %s', self._system, ahex(_packettype), int_id(_peerid), ahex(_data))
+        self._logger.error('(%s) Unknown Message - Type: %s From: %s Packet: %s', self._system, ahex(_packettype), int_id(_peerid), lazyHex(_data))
+
+    #************************************************
+    #     HOT-PATH TRACE
+    #************************************************
+
+    # Turn per-packet tracing on or off, optionally changing the sample rate (log 1 in
+    # _sample packets). Call it in the reactor thread: signal handlers go through
+    # reactor.callFromThread, the reporting server (TRACE_REQ) is already there.
+    #
+    def set_hot_trace(self, _enable, _sample=None):
+        self._hot_trace = bool(_enable)
+        if _sample is not None:
+            self._trace_sample = max(int(_sample), 1)
+        self._trace_count = 0
+        self._logger.info('(%s) Hot-path trace %s (1 in %s packets)', self._system, 'ENABLED' if self._hot_trace else 'DISABLED', self._trace_sample)
+
+    # Only called when tracing is on: decide whether this packet is the 1-in-N that gets logged
+    #
+    def trace_frame(self):
+        self._trace_count += 1
+        if self._trace_count < self._trace_sample:
+            return False
+        self._trace_count = 0
+        return self._logger.isEnabledFor(logging.INFO)
+
+    #************************************************
+    #     CALL RECORDER
+    #************************************************
+
+    # Write what the call recorder holds to a capture file in RECORDER_PATH. The copy is taken
+    # here, the file is written from a thread so the reactor isn't held up. Dumps of the same
+    # system queue up behind each other. Returns a Deferred that fires with the file name, or
+    # None if this system has no recorder.
+    #
+    def dump_recorder(self):
+        if self._recorder is None:
+            return None
+        _packets = self._recorder.snapshot()
+        self._logger.info('(%s) Dumping call recorder: %s packets', self._system, len(_packets))
+        _d = self._dump_lock.run(threads.deferToThread, ringRecorder.dump, self._system, _packets, self._local['RECORDER_PATH'])
+
+        def _done(_file):
+            self._logger.info('(%s) Call recorder dumped to: %s', self._system, _file)
+            return _file
+
+        def _failed(_failure):
+            self._logger.error('(%s) Call recorder dump failed: %s', self._system, _failure.getErrorMessage())
+            return None
+
+        _d.addCallbacks(_done, _failed)
+        return _d
 
 
     #************************************************
@@ -954,8 +1116,7 @@ class IPSC(DatagramProtocol):
     #
     def send_packet(self, _packet, (_host, _port)):
         if self._local['AUTH_ENABLED']:
-            _hash = bhex((hmac_new(self._local['AUTH_KEY'],_packet,sha1)).hexdigest()[:20])
-            _packet = _packet + _hash
+            _packet = _packet + self.auth_hash(_packet)
         self.transport.write(_packet, (_host, _port))
         # USE THE FOLLOWING ONLY UNDER DIRE CIRCUMSTANCES -- PERFORMANCE IS ADVERSLY AFFECTED!
         #self._logger.debug('(%s) TX Packet to %s on port %s: %s', self._system, _host, _port, ahex(_packet))
@@ -964,15 +1125,35 @@ class IPSC(DatagramProtocol):
     #
     def send_to_ipsc(self, _packet):
         if self._local['AUTH_ENABLED']:
-            _hash = bhex((hmac_new(self._local['AUTH_KEY'],_packet,sha1)).hexdigest()[:20])
-            _packet = _packet + _hash
-        # Send to the Master
-        if self._master['STATUS']['CONNECTED']:
-            self.transport.write(_packet, (self._master['IP'], self._master['PORT']))
-        # Send to each connected Peer
-        for peer in self._peers.keys():
-            if self._peers[peer]['STATUS']['CONNECTED']:
-                self.transport.write(_packet, (self._peers[peer]['IP'], self._peers[peer]['PORT']))
+            _packet = _packet + self.auth_hash(_packet)
+        # Send to the Master and each connected Peer. With batched transmit, as many as the
+        # kernel takes in one call go that way and anything left is sent one at a time.
+        _dests = self._ipsc_dests
+        if self._batch_tx:
+            _dests = _dests[self._batch_tx.send(_packet, _dests):]
+        _write = self.transport.write
+        for _dest in _dests:
+            _write(_packet, _dest)
+    
+    # Send a stream of prebuilt frames to the IPSC on timeslot _ts, one every 60ms starting _delay
+    # seconds from now, without blocking the reactor. Only one stream can use a timeslot; one
+    # that is still running is stopped. _done is called with the pacer when it's finished, its
+    # stats() tell how well the timing was kept.
+    #
+    def send_paced(self, _ts, _frames, _delay=0, _done=None):
+        _pacer = self._pacers[_ts]
+        if _pacer and _pacer.active():
+            self._logger.warning('(%s) Paced transmission on TS%s interrupted by a new one, %s frames not sent', self._system, _ts, len(_pacer))
+            _pacer.stop()
+        
+        def _finished(_pacer):
+            if self._pacers[_ts] is _pacer:
+                self._pacers[_ts] = None
+            if _done:
+                _done(_pacer)
+        
+        self._pacers[_ts] = framePacer(self.send_to_ipsc, _frames, _done=_finished).start(_delay)
+        return self._pacers[_ts]
         
     
     # FUNTIONS FOR IPSC MAINTENANCE ACTIVITIES WE RESPOND TO
@@ -1002,20 +1183,21 @@ class IPSC(DatagramProtocol):
     def peer_alive_reply(self, _peerid):
         self.reset_keep_alive(_peerid)
         self._peers[_peerid]['STATUS']['KEEP_ALIVES_RECEIVED'] += 1
-        self._peers[_peerid]['STATUS']['KEEP_ALIVE_RX_TIME'] = int(time())
+        self._peers[_peerid]['STATUS']['KEEP_ALIVE_RX_TIME'] = int(time.time())
         self._logger.debug('(%s) Keep-Alive Reply (we sent the request) Received from Peer %s, %s:%s', self._system, int_id(_peerid), self._peers[_peerid]['IP'], self._peers[_peerid]['PORT'])
     
     # SOMEONE HAS ANSWERED OUR REQEST TO REGISTER WITH THEM - KEEP TRACK OF IT
     def peer_reg_reply(self, _peerid):
         if _peerid in self._peers.keys():
             self._peers[_peerid]['STATUS']['CONNECTED'] = True
+            self.rebuild_destinations()
             self._logger.info('(%s) Registration Reply From: %s, %s:%s', self._system, int_id(_peerid), self._peers[_peerid]['IP'], self._peers[_peerid]['PORT'])
 
     # OUR MASTER HAS ANSWERED OUR KEEP-ALIVE REQUEST - KEEP TRACK OF IT
     def master_alive_reply(self, _peerid):
         self.reset_keep_alive(_peerid)
         self._master['STATUS']['KEEP_ALIVES_RECEIVED'] += 1
-        self._master['STATUS']['KEEP_ALIVE_RX_TIME'] = int(time())
+        self._master['STATUS']['KEEP_ALIVE_RX_TIME'] = int(time.time())
         self._logger.debug('(%s) Keep-Alive Reply (we sent the request) Received from the Master %s, %s:%s', self._system, int_id(_peerid), self._master['IP'], self._master['PORT'])
     
     # OUR MASTER HAS SENT US A PEER LIST - PROCESS IT
@@ -1041,6 +1223,7 @@ class IPSC(DatagramProtocol):
         self._master['FLAGS_DECODE'] = _decoded_flags
         self._master_stat['CONNECTED'] = True
         self._master_stat['KEEP_ALIVES_OUTSTANDING'] = 0
+        self.rebuild_destinations()
         self._logger.warning('(%s) Registration response (we requested reg) from the Master: %s, %s:%s (%s peers)', self._system, int_id(_peerid), self._master['IP'], self._master['PORT'], self._local['NUM_PEERS'])
     
     # WE ARE MASTER AND SOMEONE HAS REQUESTED REGISTRATION FROM US - ANSWER IT
@@ -1071,9 +1254,10 @@ class IPSC(DatagramProtocol):
                     'KEEP_ALIVES_MISSED':      0,
                     'KEEP_ALIVES_OUTSTANDING': 0,
                     'KEEP_ALIVES_RECEIVED':    0,
-                    'KEEP_ALIVE_RX_TIME':      int(time())
+                    'KEEP_ALIVE_RX_TIME':      int(time.time())
                     }
                 }
+            self.rebuild_destinations()
         self._local['NUM_PEERS'] = len(self._peers)       
         self._logger.debug('(%s) Peer Added To Peer List: %s, %s:%s (IPSC now has %s Peers)', self._system, self._peers[_peerid], _host, _port, self._local['NUM_PEERS'])
     
@@ -1081,7 +1265,7 @@ class IPSC(DatagramProtocol):
     def master_alive_req(self, _peerid, _host, _port):
         if _peerid in self._peers.keys():
             self._peers[_peerid]['STATUS']['KEEP_ALIVES_RECEIVED'] += 1
-            self._peers[_peerid]['STATUS']['KEEP_ALIVE_RX_TIME'] = int(time())
+            self._peers[_peerid]['STATUS']['KEEP_ALIVE_RX_TIME'] = int(time.time())
             self.send_packet(self.MASTER_ALIVE_REPLY_PKT, (_host, _port))
             self._logger.debug('(%s) Master Keep-Alive Request Received from peer %s, %s:%s', self._system, int_id(_peerid), _host, _port)
         else:
@@ -1102,7 +1286,7 @@ class IPSC(DatagramProtocol):
     def reset_keep_alive(self, _peerid):
         if _peerid in self._peers.keys():
             self._peers[_peerid]['STATUS']['KEEP_ALIVES_OUTSTANDING'] = 0
-            self._peers[_peerid]['STATUS']['KEEP_ALIVE_RX_TIME'] = int(time())
+            self._peers[_peerid]['STATUS']['KEEP_ALIVE_RX_TIME'] = int(time.time())
         if _peerid == self._master['RADIO_ID']:
             self._master_stat['KEEP_ALIVES_OUTSTANDING'] = 0
 
@@ -1111,13 +1295,22 @@ class IPSC(DatagramProtocol):
     # HASHED MEANS AUTHENTICATED IPSC
     # UNHASHED MEANS UNAUTHENTICATED IPSC
 
-    # NEXT THREE FUNCITONS ARE FOR AUTHENTICATED PACKETS
+    # NEXT FOUR FUNCITONS ARE FOR AUTHENTICATED PACKETS
     
+    # Calculate the auth hash (HMAC-SHA1 truncated to 10 bytes) with this system's AUTH_KEY,
+    # using a copy of the keyed template made in __init__
+    #
+    def auth_hash(self, _data):
+        _hmac = self._auth_hmac.copy()
+        _hmac.update(_data)
+        return _hmac.digest()[:10]
+
     # Take a packet to be SENT, calculate auth hash and return the whole thing
     #
     def hashed_packet(self, _key, _data):
-        _hash = bhex((hmac_new(_key,_data,sha1)).hexdigest()[:20])
-        return _data + _hash
+        if _key == self._local['AUTH_KEY']:
+            return _data + self.auth_hash(_data)
+        return _data + hmac_new(_key,_data,sha1).digest()[:10]
     
     # Remove the hash from a packet and return the payload
     #
@@ -1129,12 +1322,13 @@ class IPSC(DatagramProtocol):
     def validate_auth(self, _key, _data):
         _payload = self.strip_hash(_data)
         _hash = _data[-10:]
-        _chk_hash = bhex((hmac_new(_key,_payload,sha1)).hexdigest()[:20])   
-
-        if _chk_hash == _hash:
-            return True
+        if _key == self._local['AUTH_KEY']:
+            _chk_hash = self.auth_hash(_payload)
         else:
-            return False
+            _chk_hash = hmac_new(_key,_payload,sha1).digest()[:10]
+
+        # Constant time comparison, so a forged packet can't learn the hash a byte at a time
+        return compare_digest(_chk_hash, _hash)
 
 
     #************************************************
@@ -1144,6 +1338,15 @@ class IPSC(DatagramProtocol):
     # Timed loop initialization (called by the twisted reactor)
     #       
     def startProtocol(self):
+        # Batched transmit needs the socket, so it can't be set up until now
+        if self._local.get('BATCH_TX'):
+            self._batch_tx = batchTransmit(self.transport.fileno())
+            if self._batch_tx.supported:
+                self._logger.info('(%s) Batched transmit (sendmmsg) enabled', self._system)
+            else:
+                self._batch_tx = None
+                self._logger.warning('(%s) Batched transmit (sendmmsg) not available on this platform, sending to each peer individually', self._system)
+        
         # Timed loops for:
         #   IPSC connection establishment and maintenance
         #   Reporting/Housekeeping
@@ -1163,7 +1366,8 @@ class IPSC(DatagramProtocol):
     #    
     def master_maintenance_loop(self):
         self._logger.debug('(%s) MASTER Connection Maintenance Loop Started', self._system)
-        update_time = int(time())
+        self._limiter.summarize()
+        update_time = int(time.time())
         
         for peer in self._peers.keys():
             keep_alive_delta = update_time - self._peers[peer]['STATUS']['KEEP_ALIVE_RX_TIME']
@@ -1178,6 +1382,7 @@ class IPSC(DatagramProtocol):
     #
     def peer_maintenance_loop(self):
         self._logger.debug('(%s) PEER Connection Maintenance Loop Started', self._system)
+        self._limiter.summarize()
 
         # If the master isn't connected, we have to do that before we can do anything else!
         #
@@ -1200,6 +1405,7 @@ class IPSC(DatagramProtocol):
             if self._master_stat['KEEP_ALIVES_OUTSTANDING'] >= self._local['MAX_MISSED']:
                 self._master_stat['CONNECTED'] = False
                 self._master_stat['KEEP_ALIVES_OUTSTANDING'] = 0
+                self.rebuild_destinations()
                 self._logger.error('(%s) Maximum Master Keep-Alives Missed -- De-registering the Master: %s:%s', self._system, self._master['IP'], self._master['PORT'])
             
             # Update our stats before we move on...
@@ -1210,6 +1416,7 @@ class IPSC(DatagramProtocol):
             # This is bad. If we get this message, we need to reset the state and try again
             self._logger.error('->> (%s) Master in UNKOWN STATE: %s:%s', self._system, self._master_sock)
             self._master_stat['CONNECTED'] = False
+            self.rebuild_destinations()
         
         
         # If the master is connected and we don't have a peer-list yet....
@@ -1252,6 +1459,7 @@ class IPSC(DatagramProtocol):
                     # If we have missed too many keep-alives, de-register the peer and start over.
                     if self._peers[peer]['STATUS']['KEEP_ALIVES_OUTSTANDING'] >= self._local['MAX_MISSED']:
                         self._peers[peer]['STATUS']['CONNECTED'] = False
+                        self.rebuild_destinations()
                         #del peer   # Becuase once it's out of the dictionary, you can't use it for anything else.
                         self._logger.warning('(%s) Maximum Peer Keep-Alives Missed -- De-registering the Peer: %s, %s:%s', self._system, int_id(peer), self._peers[peer]['IP'], self._peers[peer]['PORT'])
                     
@@ -1270,211 +1478,235 @@ class IPSC(DatagramProtocol):
     #   Check for auth and authenticate the packet
     #   Strip the hash from the end... we don't need it anymore
     #
-    # Once they're done, we move on to the processing or callbacks for each packet type.
-    #
-    # Callbacks are iterated in the order of "more likely" to "less likely" to reduce processing time
+    # Once they're done, we look up the opcode in the dispatch table (see build_dispatch), check
+    # the originating peer against the validation policy for that opcode and call the handler.
     #
     def datagramReceived(self, data, (host, port)):
+        if not data:
+            return
         _packettype = data[0:1]
         _peerid     = data[1:5]
-        _ipsc_seq   = data[5:6]
-        #self._logger.info(bitarray(str(data)))
-        #self._logger.info(type(data))
+
         # AUTHENTICATE THE PACKET
         if self._local['AUTH_ENABLED']:
             if not self.validate_auth(self._local['AUTH_KEY'], data):
-                self._logger.warning('(%s) AuthError: IPSC packet failed authentication. Type %s: Peer: %s, %s:%s', self._system, ahex(_packettype), int_id(_peerid), host, port)
+                if self._limiter.allow('AuthError', host):
+                    self._logger.warning('(%s) AuthError: IPSC packet failed authentication. Type %s: Peer: %s, %s:%s', self._system, ahex(_packettype), int_id(_peerid), host, port)
                 return
             
             # REMOVE SHA-1 AUTHENTICATION HASH: WE NO LONGER NEED IT
             else:
                 data = self.strip_hash(data)
 
+        _policy, _handler, _user = self._dispatch[ord(_packettype)]
+
         # PACKETS THAT WE RECEIVE FROM ANY VALID PEER OR VALID MASTER
-        if _packettype in ANY_PEER_REQUIRED:
+        if _policy == VALID_ANY_PEER:
             if not(self.valid_master(_peerid) == False or self.valid_peer(_peerid) == False):
-                self._logger.warning('(%s) PeerError: Peer not in peer-list: %s, %s:%s', self._system, int_id(_peerid), host, port)
-                return
-                
-            # ORIGINATED BY SUBSCRIBER UNITS - a.k.a someone transmitted
-            if _packettype in USER_PACKETS:
-                # Extract IPSC header not already extracted
-                _src_sub    = data[6:9]
-                _dst_sub    = data[9:12]
-                _call_type  = data[12:13]
-                _unknown_1  = data[13:17]
-                _call_info  = int_id(data[17:18])                
-                _ts         = bool(_call_info & TS_CALL_MSK) + 1
-                _end        = bool(_call_info & END_MSK)
-                
-                self._logger.info(_ts)
-                self._logger.info(_end)
-                  
-                # Extract RTP Header Fields
-                '''
-                Coming soon kids!!!
-                Looks like version, padding, extention, CSIC, payload type and SSID never change.
-                The things we might care about are below.
-                _rtp_byte_1 = int_id(data[18:19])
-                _rtp_byte_2 = int_id(data[19:20])
-                _rtp_seq    = int_id(data[20:22])
-                _rtp_tmstmp = int_id(data[22:26])
-                _rtp_ssid = int_id(data[26:30])
-                
-                # Extract RTP Payload Data Fields
-                _payload_type = int_id(data[30:31])
-                '''
-
-                # User Voice and Data Call Types:
-                if _packettype == GROUP_VOICE:
-                    self.reset_keep_alive(_peerid)
-                    self.group_voice(_src_sub, _dst_sub, _ts, _end, _peerid, data)
-                    return
-            
-                elif _packettype == PVT_VOICE:
-                    self.reset_keep_alive(_peerid)
-                    self.private_voice(_src_sub, _dst_sub, _ts, _end, _peerid, data)
-                    return
-                    
-                elif _packettype == GROUP_DATA:
-                    self.reset_keep_alive(_peerid)
-                    self.group_data(_src_sub, _dst_sub, _ts, _end, _peerid, data)
-                    return
-                    
-                elif _packettype == PVT_DATA:
-                    self.reset_keep_alive(_peerid)
-                    self.private_data(_src_sub, _dst_sub, _ts, _end, _peerid, data)
-                    return
-                return
-
-
-            # MOTOROLA XCMP/XNL CONTROL PROTOCOL: We don't process these (yet)   
-            elif _packettype == XCMP_XNL:
-                self.xcmp_xnl(data)
-                return
-
-
-            # ORIGINATED BY PEERS, NOT IPSC MAINTENANCE: Call monitoring is all we've found here so far 
-            elif _packettype == CALL_MON_STATUS:
-                self.call_mon_status(data)
-                return
-                
-            elif _packettype == CALL_MON_RPT:
-                self.call_mon_rpt(data)
-                return
-                
-            elif _packettype == CALL_MON_NACK:
-                self.call_mon_nack(data)
+                if self._limiter.allow('PeerError', host):
+                    self._logger.warning('(%s) PeerError: Peer not in peer-list: %s, %s:%s', self._system, int_id(_peerid), host, port)
                 return
-            
-            
-            # IPSC CONNECTION MAINTENANCE MESSAGES
-            elif _packettype == DE_REG_REQ:
-                self.de_register_peer(_peerid)
-                self._logger.warning('(%s) Peer De-Registration Request From: %s, %s:%s', self._system, int_id(_peerid), host, port)
-                return
-            
-            elif _packettype == DE_REG_REPLY:
-                self._logger.warning('(%s) Peer De-Registration Reply From: %s, %s:%s', self._system, int_id(_peerid), host, port)
-                return
-                
-            elif _packettype == RPT_WAKE_UP:
-                self.repeater_wake_up(data)
-                self._logger.debug('(%s) Repeater Wake-Up Packet From: %s, %s:%s', self._system, int_id(_peerid), host, port)
-                return
-            return
-
 
-        # THE FOLLOWING PACKETS ARE RECEIVED ONLY IF WE ARE OPERATING AS A PEER
-        
         # ONLY ACCEPT FROM A PREVIOUSLY VALIDATED PEER
-        if _packettype in PEER_REQUIRED:
+        elif _policy == VALID_PEER:
             if not self.valid_peer(_peerid):
-                self._logger.warning('(%s) PeerError: Peer not in peer-list: %s, %s:%s', self._system, int_id(_peerid), host, port)
-                return
-            
-            # REQUESTS FROM PEERS: WE MUST REPLY IMMEDIATELY FOR IPSC MAINTENANCE
-            if _packettype == PEER_ALIVE_REQ:
-                self.peer_alive_req(data, _peerid, host, port)
-                return
-                                
-            elif _packettype == PEER_REG_REQ:
-                self.peer_reg_req(_peerid, host, port)
-                return
-                
-            # ANSWERS FROM REQUESTS WE SENT TO PEERS: WE DO NOT REPLY
-            elif _packettype == PEER_ALIVE_REPLY:
-                self.peer_alive_reply(_peerid)
-                return                
-
-            elif _packettype == PEER_REG_REPLY:
-                self.peer_reg_reply(_peerid)
+                if self._limiter.allow('PeerError', host):
+                    self._logger.warning('(%s) PeerError: Peer not in peer-list: %s, %s:%s', self._system, int_id(_peerid), host, port)
                 return
-            return
-            
-        
-        # PACKETS ONLY ACCEPTED FROM OUR MASTER
 
         # PACKETS WE ONLY ACCEPT IF WE HAVE FINISHED REGISTERING WITH OUR MASTER
-        if _packettype in MASTER_REQUIRED:
+        elif _policy == VALID_MASTER:
             if not self.valid_master(_peerid):
-                self._logger.warning('(%s) MasterError: %s, %s:%s is not the master peer', self._system, int_id(_peerid), host, port)
-                return
-            
-            # ANSWERS FROM REQUESTS WE SENT TO THE MASTER: WE DO NOT REPLY    
-            if _packettype == MASTER_ALIVE_REPLY:
-                self.master_alive_reply(_peerid)
+                if self._limiter.allow('MasterError', host):
+                    self._logger.warning('(%s) MasterError: %s, %s:%s is not the master peer', self._system, int_id(_peerid), host, port)
                 return
-            
-            elif _packettype == PEER_LIST_REPLY:
-                self.peer_list_reply(data, _peerid)
+
+        # ORIGINATED BY SUBSCRIBER UNITS - a.k.a someone transmitted
+        if _user:
+            # Decode the rest of the IPSC header in one pass. Subclasses that need more than
+            # the callback arguments can find the whole thing in self._rx_header
+            try:
+                _header = tuple.__new__(ipscHeader, IPSC_HEADER.unpack_from(data))
+            except struct_error:
+                if self._limiter.allow('ShortPacket', host):
+                    self._logger.warning('(%s) Short user packet (%s bytes) from: %s, %s:%s', self._system, len(data), int_id(_peerid), host, port)
                 return
-            return
-            
-        # THIS MEANS WE HAVE SUCCESSFULLY REGISTERED TO OUR MASTER - RECORD MASTER INFORMATION
-        elif _packettype == MASTER_REG_REPLY:
-            self.master_reg_reply(data, _peerid)
-            return
-        
-        
-        # THE FOLLOWING PACKETS ARE RECEIVED ONLLY IF WE ARE OPERATING AS A MASTER
-        # REQUESTS FROM PEERS: WE MUST REPLY IMMEDIATELY FOR IPSC MAINTENANCE
-        
-        # REQUEST TO REGISTER TO THE IPSC
-        elif _packettype == MASTER_REG_REQ:
-            self.master_reg_req(data, _peerid, host, port)           
-            return
-          
-        # REQUEST FOR A KEEP-ALIVE REPLY (WE KNOW THE PEER IS STILL ALIVE TOO) 
-        elif _packettype == MASTER_ALIVE_REQ:
-            self.master_alive_req(_peerid, host, port)
-            return
+            self._rx_header = _header
+            if self._recorder is not None:
+                self._recorder.record(data, time.time())
+            _src_sub    = _header.src_sub
+            _dst_sub    = _header.dst_sub
+            _call_info  = _header.call_info
+            _ts         = bool(_call_info & TS_CALL_MSK) + 1
+            _end        = bool(_call_info & END_MSK)
+
+            if self._hot_trace and self.trace_frame():
+                self._logger.info('(%s) TRACE: Type: %s Peer: %s Src: %s Dst: %s TS: %s End: %s Packet: %s', self._system, ahex(_packettype), int_id(_peerid), int_id(_src_sub), int_id(_dst_sub), _ts, _end, lazyHex(data))
+
+            # Extract RTP Header Fields
+            '''
+            Coming soon kids!!!
+            Looks like version, padding, extention, CSIC, payload type and SSID never change.
+            The things we might care about are below.
+            _rtp_byte_1 = int_id(data[18:19])
+            _rtp_byte_2 = int_id(data[19:20])
+            _rtp_seq    = int_id(data[20:22])
+            _rtp_tmstmp = int_id(data[22:26])
+            _rtp_ssid = int_id(data[26:30])
             
-        # REQUEST FOR A PEER LIST
-        elif _packettype == PEER_LIST_REQ:
-            self.peer_list_req(_peerid)
-            return
+            # Extract RTP Payload Data Fields
+            _payload_type = int_id(data[30:31])
+            '''
 
-        # PACKET IS OF AN UNKNOWN TYPE. LOG IT AND IDENTTIFY IT!
-        else:
-            self.unknown_message(_packettype, _peerid, data)
+            # User Voice and Data Call Types:
+            self.reset_keep_alive(_peerid)
+            _handler(_src_sub, _dst_sub, _ts, _end, _peerid, data)
             return
 
+        _handler(data, _peerid, host, port)
+
+    # IPSC CONNECTION MAINTENANCE MESSAGES
+    def de_reg_req(self, _data, _peerid, _host, _port):
+        self.de_register_peer(_peerid)
+        self._logger.warning('(%s) Peer De-Registration Request From: %s, %s:%s', self._system, int_id(_peerid), _host, _port)
+
+    def de_reg_reply(self, _data, _peerid, _host, _port):
+        self._logger.warning('(%s) Peer De-Registration Reply From: %s, %s:%s', self._system, int_id(_peerid), _host, _port)
+
+    def rpt_wake_up(self, _data, _peerid, _host, _port):
+        self.repeater_wake_up(_data)
+        self._logger.debug('(%s) Repeater Wake-Up Packet From: %s, %s:%s', self._system, int_id(_peerid), _host, _port)
+
+    # PACKET IS OF AN UNKNOWN TYPE. LOG IT AND IDENTTIFY IT!
+    def unknown_packet(self, _data, _peerid, _host, _port):
+        self.unknown_message(_data[0:1], _peerid, _data)
+
 
 #
 # Socket-based reporting section
 #
+
+# Reporting messages that carry state (snapshots and updates). Anything else is an event.
+REPORT_STATE_OPCODES = frozenset([REPORT_OPCODES['CONFIG_SND'], REPORT_OPCODES['BRIDGE_SND'], REPORT_OPCODES['CONFIG_UPD'], REPORT_OPCODES['BRIDGE_UPD']])
+
+# What to do when a client that isn't keeping up has REPORT_QUEUE_SIZE messages waiting:
+#   coalesce   - throw away the waiting snapshots/updates and send one fresh snapshot when the
+#                client catches up; waiting events are kept, oldest dropped if need be
+#   drop       - as coalesce, but events aren't queued at all while the client is behind
+#   disconnect - hang up on the client
+REPORT_OVERFLOW_POLICIES = ('coalesce', 'drop', 'disconnect')
+
+# Each client is the producer for its own TCP connection. The transport pauses us when its
+# write buffer is full and resumes us when it has drained; in between, messages wait in a
+# bounded queue instead of piling up in the transport without limit, so a stalled client
+# costs a fixed amount of memory and the reactor (and voice) never waits on it.
+#
+@implementer(IPushProducer)
 class report(NetstringReceiver):
     def __init__(self, factory):
         self._factory = factory
+        self._queue = deque()
+        self._paused = False
+        self._resync = False
+        self._overflowed = False
+        self._closing = False
+        self._policy = 'coalesce'
+
+        # Counters, logged when the client goes away
+        self.pauses = 0
+        self.dropped = 0
+        self.coalesced = 0
 
     def connectionMade(self):
         self._factory.clients.append(self)
-        self._factory._logger.info('DMRlink reporting client connected: %s', self.transport.getPeer())
+        self._policy = self._factory.overflow_policy(self.transport.getPeer().host)
+        self._factory._logger.info('DMRlink reporting client connected: %s (overflow policy: %s)', self.transport.getPeer(), self._policy)
+        self.transport.registerProducer(self, True)
+        # Everything the client needs to start from. After this it only gets updates.
+        for _message in self._factory.snapshots():
+            self.send_message(_message)
 
     def connectionLost(self, reason):
-        self._factory._logger.info('DMRlink reporting client disconnected: %s', self.transport.getPeer())
+        self._factory._logger.info('DMRlink reporting client disconnected: %s (paused %s times, %s messages dropped, %s coalesced)', self.transport.getPeer(), self.pauses, self.dropped, self.coalesced)
         self._factory.clients.remove(self)
+        self._queue.clear()
+
+    # IPushProducer
+    def pauseProducing(self):
+        if not self._paused:
+            self._paused = True
+            self.pauses += 1
+
+    def resumeProducing(self):
+        self._paused = False
+        self._overflowed = False
+        self.flush_queue()
+
+    def stopProducing(self):
+        self._paused = True
+        self._queue.clear()
+
+    # Send a message to this client, or queue it if the client is behind
+    #
+    def send_message(self, _message):
+        if not self._paused and not self._queue and not self._resync:
+            self.sendString(_message)
+            return
+        if self._closing:
+            return
+        _state = _message[:1] in REPORT_STATE_OPCODES
+        if _state and self._resync:
+            # The snapshot sent on resume will include this
+            self.coalesced += 1
+            return
+        if not _state and self._policy == 'drop':
+            self.dropped += 1
+            return
+        if len(self._queue) >= self._factory.queue_size:
+            if not self.overflow():
+                return
+            if _state and self._resync:
+                self.coalesced += 1
+                return
+        self._queue.append(_message)
+
+    # The queue is full. Returns False if the client has been dropped.
+    #
+    def overflow(self):
+        if not self._overflowed:
+            self._overflowed = True
+            self._factory._logger.warning('DMRlink reporting client %s is not keeping up, %s messages queued (overflow policy: %s)', self.transport.getPeer(), len(self._queue), self._policy)
+        if self._policy == 'disconnect':
+            self.dropped += len(self._queue)
+            self._queue.clear()
+            self._closing = True
+            self.transport.abortConnection()
+            return False
+
+        # Already waiting to resync, so only events are queued: make room for one more
+        if self._resync:
+            self._queue.popleft()
+            self.dropped += 1
+            return True
+        _events = deque(_message for _message in self._queue if _message[:1] not in REPORT_STATE_OPCODES)
+        if len(_events) < len(self._queue):
+            self.coalesced += len(self._queue) - len(_events)
+            self._resync = True
+        while len(_events) >= self._factory.queue_size:
+            _events.popleft()
+            self.dropped += 1
+        self._queue = _events
+        return True
+
+    # Send what's waiting until the transport pauses us again
+    #
+    def flush_queue(self):
+        if self._resync:
+            self._resync = False
+            for _message in self._factory.snapshots():
+                self.sendString(_message)
+        while self._queue and not self._paused:
+            self.sendString(self._queue.popleft())
 
     def stringReceived(self, data):
         self.process_message(data)
@@ -1483,14 +1715,89 @@ class report(NetstringReceiver):
         opcode = _message[:1]
         if opcode == REPORT_OPCODES['CONFIG_REQ']:
             self._factory._logger.info('DMRlink reporting client sent \'CONFIG_REQ\': %s', self.transport.getPeer())
-            self.send_config()
+            self.send_message(self._factory.config_snapshot())
+        elif opcode == REPORT_OPCODES['BRIDGE_REQ'] and hasattr(self._factory, 'bridge_snapshot'):
+            self._factory._logger.info('DMRlink reporting client sent \'BRIDGE_REQ\': %s', self.transport.getPeer())
+            self.send_message(self._factory.bridge_snapshot())
+        elif opcode == REPORT_OPCODES['RECORD_REQ']:
+            self._factory._logger.info('DMRlink reporting client sent \'RECORD_REQ\': %s', self.transport.getPeer())
+            self.send_recordings(_message[1:])
+        elif opcode == REPORT_OPCODES['TRACE_REQ']:
+            self._factory._logger.info('DMRlink reporting client sent \'TRACE_REQ\': %s, %s', self.transport.getPeer(), _message[1:])
+            self.set_trace(_message[1:])
         else:
             print('got unknown opcode')
         
+    # Dump the call recorder of the named system, or of every system if no name is given, and
+    # tell the client the file name of each dump as it's written
+    #
+    def send_recordings(self, _system):
+        if _system and _system not in systems:
+            self._factory._logger.warning('DMRlink reporting client asked for recording of unknown system: %s', _system)
+            return
+        for system in ([_system] if _system else systems):
+            _d = systems[system].dump_recorder()
+            if _d is not None:
+                _d.addCallback(self._send_recording, system)
+    
+    def _send_recording(self, _file, _system):
+        if _file and self.transport.connected:
+            self.send_message(REPORT_OPCODES['RECORD_SND'] + _system + ',' + _file)
+    
+    # Turn the hot-path trace of one system on or off: 'SYSTEM,ON|OFF[,SAMPLE]'. The client
+    # is told the system's trace state afterwards: TRACE_SND 'SYSTEM,ON|OFF,SAMPLE'
+    #
+    def set_trace(self, _request):
+        _args = _request.split(',')
+        _system = _args[0]
+        if _system not in systems:
+            self._factory._logger.warning('DMRlink reporting client asked to trace unknown system: %s', _system)
+            return
+        if len(_args) > 1:
+            _state = _args[1].strip().upper()
+            if _state not in ('ON', 'OFF'):
+                self._factory._logger.warning('DMRlink reporting client sent bad TRACE_REQ: %s', _request)
+                return
+            try:
+                _sample = int(_args[2]) if len(_args) > 2 else None
+            except ValueError:
+                self._factory._logger.warning('DMRlink reporting client sent bad TRACE_REQ: %s', _request)
+                return
+            systems[_system].set_hot_trace(_state == 'ON', _sample)
+        self.send_message(REPORT_OPCODES['TRACE_SND'] + _system + ',' + ('ON' if systems[_system]._hot_trace else 'OFF') + ',' + str(systems[_system]._trace_sample))
+        
 class reportFactory(Factory):
     def __init__(self, config, logger):
         self._config = config
         self._logger = logger
+        # With REPORT_DELTA, clients get CONFIG['SYSTEMS'] in full when they connect and only
+        # what has changed (CONFIG_UPD) after that. See ipsc/report_state.py
+        self._delta = config['REPORTS'].get('REPORT_DELTA', True)
+        self._config_state = reportState(lambda: self._config['SYSTEMS'])
+        # Outbound queue limit and overflow policy for clients that fall behind (see report)
+        self.queue_size = config['REPORTS'].get('REPORT_QUEUE_SIZE', 100)
+        self._overflow = self.parse_overflow(config['REPORTS'].get('REPORT_OVERFLOW', 'coalesce'))
+    
+    # REPORT_OVERFLOW is a default policy, optionally followed by policies for particular
+    # clients, e.g. 'coalesce, 192.168.1.1=disconnect'
+    #
+    def parse_overflow(self, _setting):
+        _policies = {'*': 'coalesce'}
+        for _item in _setting.split(','):
+            _item = _item.strip()
+            if not _item:
+                continue
+            _host, _sep, _policy = _item.rpartition('=')
+            _host = _host.strip() or '*'
+            _policy = _policy.strip().lower()
+            if _policy not in REPORT_OVERFLOW_POLICIES:
+                self._logger.warning('Invalid REPORT_OVERFLOW policy "%s" for %s, using coalesce', _policy, _host)
+                _policy = 'coalesce'
+            _policies[_host] = _policy
+        return _policies
+    
+    def overflow_policy(self, _host):
+        return self._overflow.get(_host, self._overflow['*'])
         
     def buildProtocol(self, addr):
         if (addr.host) in self._config['REPORTS']['REPORT_CLIENTS'] or '*' in self._config['REPORTS']['REPORT_CLIENTS']:
@@ -1502,11 +1809,29 @@ class reportFactory(Factory):
             
     def send_clients(self, _message):
         for client in self.clients:
-            client.sendString(_message)
+            client.send_message(_message)
             
     def send_config(self):
-        serialized = pickle.dumps(self._config['SYSTEMS'], protocol=pickle.HIGHEST_PROTOCOL)
-        self.send_clients(REPORT_OPCODES['CONFIG_SND']+serialized)
+        if not self._delta:
+            serialized = pickle.dumps(self._config['SYSTEMS'], protocol=pickle.HIGHEST_PROTOCOL)
+            self.send_clients(REPORT_OPCODES['CONFIG_SND']+serialized)
+            return
+        if not self.clients:
+            self._config_state.reset()
+            return
+        _delta = self._config_state.delta()
+        if _delta:
+            self.send_clients(REPORT_OPCODES['CONFIG_UPD']+_delta)
+    
+    def config_snapshot(self):
+        if not self._delta:
+            return REPORT_OPCODES['CONFIG_SND']+pickle.dumps(self._config['SYSTEMS'], protocol=pickle.HIGHEST_PROTOCOL)
+        return REPORT_OPCODES['CONFIG_SND']+self._config_state.snapshot()
+    
+    # Messages that bring a newly connected client up to date
+    #
+    def snapshots(self):
+        return [self.config_snapshot()]
         
     def send_rcm(self, _data):
         self.send_clients(REPORT_OPCODES['RCM_SND']+_data)
@@ -1523,7 +1848,7 @@ if __name__ == '__main__':
     import signal
     
     from ipsc.dmrlink_config import build_config
-    from ipsc.dmrlink_log import config_logging
+    from ipsc.dmrlink_log import config_logging, flush_logging
     
     # Change the current directory to the location of the application
     os.chdir(os.path.dirname(os.path.realpath(sys.argv[0])))
@@ -1555,10 +1880,27 @@ if __name__ == '__main__':
         for system in systems:
             systems[system].de_register_self()
         reactor.stop()
+        flush_logging(logger)
     
     for sig in [signal.SIGTERM, signal.SIGINT, signal.SIGQUIT]:
         signal.signal(sig, sig_handler)
     
+    # The reactor replaces our SIGINT/SIGTERM handlers with its own, so flush the log queue
+    # on its way down too
+    reactor.addSystemEventTrigger('after', 'shutdown', flush_logging, logger)
+    
+    # SIGUSR1 toggles the hot-path (per packet) trace on every system
+    def trace_handler(_signal, _frame):
+        reactor.callFromThread(toggle_hot_trace, systems)
+    
+    signal.signal(signal.SIGUSR1, trace_handler)
+    
+    # SIGUSR2 dumps the call recorders to capture files
+    def recorder_handler(_signal, _frame):
+        reactor.callFromThread(dump_recorders, systems)
+    
+    signal.signal(signal.SIGUSR2, recorder_handler)
+    
     # INITIALIZE THE REPORTING LOOP
     report_server = config_reports(CONFIG, logger, reportFactory)
     
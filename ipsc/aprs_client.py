@@ -0,0 +1,235 @@
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# A long-lived APRS-IS connection for D-APRS uploads. One thread owns one logged-in
+# aprslib.IS connection and sends whatever is queued for it, so the reactor only ever puts a
+# packet on a queue and never waits on DNS, TCP or an APRS-IS server.
+#
+#   - The queue is bounded. If APRS-IS is unreachable for long enough to fill it, the oldest
+#     packets are thrown away; a position report that old isn't worth much anyway.
+#   - APRS-IS servers send a '#' comment line every 20 seconds or so. Those are read and
+#     thrown away, and if nothing at all has been heard for KEEPALIVE_TIMEOUT the connection
+#     is taken to be dead. When we've sent nothing for KEEPALIVE_INTERVAL we send a comment
+#     line of our own so that NAT and firewalls don't forget about us.
+#   - A lost connection is re-established with exponential backoff, and the packet that was
+#     being sent when it went is sent again.
+
+import socket
+
+from select import select
+from threading import Thread, Event, Lock
+from Queue import Queue, Empty, Full
+from time import time
+
+import aprslib
+from aprslib.exceptions import ConnectionError as APRSConnectionError, LoginError
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+APRS_QUEUE_SIZE    = 100
+KEEPALIVE_INTERVAL = 120
+KEEPALIVE_TIMEOUT  = 90
+BACKOFF_MIN        = 1
+BACKOFF_MAX        = 300
+
+# How long the sender waits on the queue before checking on the connection
+POLL_INTERVAL      = 1.0
+
+
+class aprsClient(object):
+    def __init__(self, _callsign, _passcode, _host, _port, _logger, _queue_size=APRS_QUEUE_SIZE):
+        self._callsign = _callsign
+        self._passcode = _passcode
+        self._host = _host
+        self._port = _port
+        self._logger = _logger
+        self._queue = Queue(_queue_size)
+        self._stop = Event()
+        self._thread = None
+        self._ais = None
+        self._pending = None
+        self._backoff = BACKOFF_MIN
+        self._last_rx = 0
+        self._last_tx = 0
+
+        # Counters. Latency is from when a packet was queued to when it went out.
+        self._stats_lock = Lock()
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.connects = 0
+        self.latency_max = 0.0
+        self._latency_sum = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = Thread(target=self._run, name='aprs-is')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    # Stop the sender, waiting up to _timeout seconds for it to finish what it's doing.
+    # Anything still queued is not sent.
+    #
+    def stop(self, _timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(_timeout)
+            self._thread = None
+        self._logger.info('APRS-IS client stopped: %s', self.stats())
+
+    # Queue a packet to be sent. Safe to call from any thread and never blocks. Returns False
+    # if the queue was full and an older packet was thrown away to make room.
+    #
+    def send(self, _packet):
+        _item = (_packet, time())
+        try:
+            self._queue.put_nowait(_item)
+            return True
+        except Full:
+            pass
+        try:
+            self._queue.get_nowait()
+        except Empty:
+            pass
+        with self._stats_lock:
+            self.dropped += 1
+        try:
+            self._queue.put_nowait(_item)
+        except Full:
+            with self._stats_lock:
+                self.dropped += 1
+        return False
+
+    def connected(self):
+        return self._ais is not None
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'CONNECTED': self._ais is not None,
+                'QUEUED': self._queue.qsize() + (1 if self._pending else 0),
+                'SENT': self.sent,
+                'DROPPED': self.dropped,
+                'FAILED': self.failed,
+                'CONNECTS': self.connects,
+                'LATENCY_MEAN': self._latency_sum / self.sent * 1000 if self.sent else 0.0,
+                'LATENCY_MAX': self.latency_max * 1000
+            }
+
+    # Sender thread
+    #
+    def _run(self):
+        while not self._stop.is_set():
+            if self._ais is None and not self._connect():
+                # Wait out the backoff, unless we're stopped in the meantime
+                self._stop.wait(self._backoff)
+                self._backoff = min(self._backoff * 2, BACKOFF_MAX)
+                continue
+
+            if self._pending is None:
+                try:
+                    self._pending = self._queue.get(timeout=POLL_INTERVAL)
+                except Empty:
+                    self._keepalive()
+                    continue
+
+            # Notice a hangup before writing into a dead connection, where the packet would
+            # be lost without an error
+            self._read()
+            if self._ais is None:
+                continue
+
+            _packet, _queued = self._pending
+            if self._write(_packet):
+                _latency = time() - _queued
+                self._pending = None
+                with self._stats_lock:
+                    self.sent += 1
+                    self._latency_sum += _latency
+                    if _latency > self.latency_max:
+                        self.latency_max = _latency
+                self._logger.debug('APRS-IS: sent packet (%.0f ms after it was queued)', _latency * 1000)
+        self._close()
+
+    def _connect(self):
+        _ais = aprslib.IS(self._callsign, passwd=str(self._passcode), host=self._host, port=self._port)
+        try:
+            _ais.connect(blocking=False)
+        except (APRSConnectionError, LoginError, socket.error) as e:
+            self._logger.warning('APRS-IS: could not connect to %s:%s (%s), retrying in %s seconds', self._host, self._port, e, self._backoff)
+            _ais.close()
+            return False
+        self._ais = _ais
+        self._backoff = BACKOFF_MIN
+        self._last_rx = self._last_tx = time()
+        with self._stats_lock:
+            self.connects += 1
+        self._logger.info('APRS-IS: connected to %s:%s as %s', self._host, self._port, self._callsign)
+        return True
+
+    def _close(self):
+        if self._ais is not None:
+            self._ais.close()
+            self._ais = None
+
+    def _lost(self, _reason):
+        self._logger.warning('APRS-IS: connection to %s:%s lost (%s), reconnecting', self._host, self._port, _reason)
+        self._close()
+
+    def _write(self, _line):
+        try:
+            self._ais.sendall(_line)
+        except (APRSConnectionError, socket.error) as e:
+            with self._stats_lock:
+                self.failed += 1
+            self._lost(e)
+            return False
+        self._last_tx = time()
+        return True
+
+    # Read (and ignore) anything the server has sent. An empty read means it has hung up.
+    #
+    def _read(self):
+        if self._ais is None:
+            return
+        _sock = self._ais.sock
+        try:
+            while select([_sock], [], [], 0)[0]:
+                if not _sock.recv(4096):
+                    self._lost('closed by server')
+                    return
+                self._last_rx = time()
+        except (socket.error, ValueError) as e:
+            self._lost(e)
+
+    def _keepalive(self):
+        self._read()
+        if self._ais is None:
+            return
+        _now = time()
+        if _now - self._last_rx > KEEPALIVE_TIMEOUT:
+            self._lost('nothing heard for {} seconds'.format(KEEPALIVE_TIMEOUT))
+        elif _now - self._last_tx > KEEPALIVE_INTERVAL:
+            self._write('# keepalive')
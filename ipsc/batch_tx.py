@@ -0,0 +1,149 @@
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# Batched UDP transmit for IPSC fan-out. One frame going to every peer in an
+# IPSC is handed to the kernel with a single sendmmsg(2) call instead of one
+# sendto(2) per peer. Python has no wrapper for sendmmsg, so we call it from
+# libc with ctypes. Where it isn't available (not Linux, no libc, IPv6 peers)
+# send() returns 0 and the caller falls back to writing each packet itself.
+
+import ctypes
+import ctypes.util
+
+from socket import AF_INET, htons, inet_aton, error as socket_error
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t)
+    ]
+
+class msghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(iovec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int)
+    ]
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_hdr', msghdr),
+        ('msg_len', ctypes.c_uint)
+    ]
+
+class sockaddr_in(ctypes.Structure):
+    _fields_ = [
+        ('sin_family', ctypes.c_ushort),
+        ('sin_port', ctypes.c_ushort),
+        ('sin_addr', ctypes.c_ubyte * 4),
+        ('sin_zero', ctypes.c_ubyte * 8)
+    ]
+
+
+def _load_sendmmsg():
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        _sendmmsg = _libc.sendmmsg
+    except (OSError, AttributeError, TypeError):
+        return None
+    _sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int]
+    _sendmmsg.restype = ctypes.c_int
+    return _sendmmsg
+
+_SENDMMSG = _load_sendmmsg()
+
+
+class batchTransmit(object):
+    def __init__(self, _fileno):
+        self._fileno = _fileno
+        self._sendmmsg = _SENDMMSG
+        self.supported = self._sendmmsg is not None
+
+        # Every message in a batch carries the same frame, so they all share one iovec. The
+        # message headers and socket addresses only change when the destinations do.
+        self._iov = iovec()
+        self._dests = None
+        self._msgs = None
+        self._addrs = None
+        self._count = 0
+
+        # Counters, handy for seeing whether batching is actually being used
+        self.batches = 0
+        self.fallbacks = 0
+
+    # Build the sockaddr_in and mmsghdr arrays for a tuple of (ip, port) destinations. Anything
+    # that isn't an IPv4 address means we can't batch for this set of destinations.
+    #
+    def _build(self, _dests):
+        self._dests = _dests
+        self._count = len(_dests)
+        self._msgs = None
+        self._addrs = None
+        if not self._count:
+            return
+
+        _addrs = (sockaddr_in * self._count)()
+        _msgs = (mmsghdr * self._count)()
+        _iov = ctypes.pointer(self._iov)
+        try:
+            for i, (_ip, _port) in enumerate(_dests):
+                _addrs[i].sin_family = AF_INET
+                _addrs[i].sin_port = htons(_port)
+                _addrs[i].sin_addr[:] = bytearray(inet_aton(_ip))
+                _msgs[i].msg_hdr.msg_name = ctypes.addressof(_addrs[i])
+                _msgs[i].msg_hdr.msg_namelen = ctypes.sizeof(sockaddr_in)
+                _msgs[i].msg_hdr.msg_iov = _iov
+                _msgs[i].msg_hdr.msg_iovlen = 1
+        except (socket_error, TypeError, ValueError):
+            return
+        self._addrs = _addrs
+        self._msgs = _msgs
+
+    # Send _packet to every destination in _dests with one system call. Returns how many
+    # destinations were sent to; the caller is responsible for the rest (_dests[sent:]).
+    #
+    def send(self, _packet, _dests):
+        if not self.supported:
+            return 0
+        if _dests is not self._dests:
+            self._build(_dests)
+        if self._msgs is None:
+            self.fallbacks += 1
+            return 0
+
+        # c_char_p points at the string's own buffer, so the frame isn't copied
+        _buf = ctypes.c_char_p(_packet)
+        self._iov.iov_base = ctypes.cast(_buf, ctypes.c_void_p)
+        self._iov.iov_len = len(_packet)
+        _sent = self._sendmmsg(self._fileno, self._msgs, self._count, 0)
+        if _sent < 0:
+            self.fallbacks += 1
+            return 0
+        self.batches += 1
+        return _sent
@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# Capture files: IPSC packets as they came off the wire, with their receive times.
+#
+#   File header:  'DMRLCAP1'
+#   Records:      time (double), length (ushort), the packet itself
+#   Index:        one entry per record: offset (uint64), packet type, burst data type
+#   Trailer:      index offset (uint64), record count (uint32), 'DMRLIDX1'
+#
+# All big endian. Records are only ever appended. The index and trailer are written when the
+# writer is closed; reopening a file for append picks the index back up and overwrites it.
+# A file that was never closed (crash, kill -9) has no trailer, and the reader rebuilds the
+# index by walking the records.
+#
+# The reader memory-maps the file, so getting at any record, or the first record of a given
+# burst type (templates), is a seek rather than reading everything in.
+#
+# ringRecorder keeps the last few minutes of packets on a system in memory, ready to be
+# dumped to a capture file when something interesting has just happened.
+#
+# Older recordings (pickled lists of packets from record.py, and the length-prefixed
+# template.bin used by ambe_audio.py) can be converted with:
+#
+#   python -m ipsc.capture <old file> <new file>
+
+import os
+import mmap
+import errno
+
+from array import array
+from struct import Struct
+from time import time, strftime, localtime
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+CAPTURE_MAGIC = 'DMRLCAP1'
+INDEX_MAGIC   = 'DMRLIDX1'
+
+RECORD_HEADER = Struct('>dH')
+INDEX_ENTRY   = Struct('>QBB')
+TRAILER       = Struct('>QI8s')
+
+# Where the burst data type is in a voice packet, and the value stored when there isn't one
+BURST_OFFSET  = 30
+NO_BURST      = 0xFF
+
+
+class CaptureError(Exception):
+    pass
+
+
+# Packet type and burst data type of a packet, as kept in the index
+#
+def packet_types(_data):
+    return ord(_data[0]), ord(_data[BURST_OFFSET]) if len(_data) > BURST_OFFSET else NO_BURST
+
+
+# Find the index of a mapped (or string) capture from its trailer. Returns (index offset,
+# record count), or None if the file has no usable trailer.
+#
+def find_index(_buf):
+    if _buf[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+        raise CaptureError('not a capture file')
+    _size = len(_buf)
+    if _size >= len(CAPTURE_MAGIC) + TRAILER.size:
+        _index_offset, _count, _magic = TRAILER.unpack_from(_buf, _size - TRAILER.size)
+        if _magic == INDEX_MAGIC and _index_offset + _count * INDEX_ENTRY.size + TRAILER.size == _size:
+            return _index_offset, _count
+    return None
+
+# Read all of the index entries from a capture. Returns (entries, end of the records), where
+# entries is a list of (offset, packet type, burst type).
+#
+def read_index(_buf):
+    _index = find_index(_buf)
+    if _index is None:
+        return scan_records(_buf)
+    _index_offset, _count = _index
+    return [INDEX_ENTRY.unpack_from(_buf, _index_offset + i * INDEX_ENTRY.size) for i in xrange(_count)], _index_offset
+
+# No usable trailer: walk the records to rebuild the index. A partly written record at the
+# end is left out.
+#
+def scan_records(_buf):
+    _entries = []
+    _offset = len(CAPTURE_MAGIC)
+    _size = len(_buf)
+    while _offset + RECORD_HEADER.size <= _size:
+        _time, _length = RECORD_HEADER.unpack_from(_buf, _offset)
+        _start = _offset + RECORD_HEADER.size
+        if _length == 0 or _start + _length > _size:
+            break
+        _entries.append((_offset,) + packet_types(_buf[_start:_start + _length]))
+        _offset = _start + _length
+    return _entries, _offset
+
+
+class captureWriter(object):
+    # Create _path, or append to it if it already exists. With _new, _path must not exist:
+    # OSError (EEXIST) is raised if it does, rather than adding to someone else's capture.
+    def __init__(self, _path, _new=False):
+        self.path = _path
+        self._entries = []
+        if _new:
+            self._file = os.fdopen(os.open(_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644), 'wb')
+            self._file.write(CAPTURE_MAGIC)
+            self._offset = len(CAPTURE_MAGIC)
+        elif os.path.exists(_path) and os.path.getsize(_path) > 0:
+            with open(_path, 'rb') as _f:
+                _map = mmap.mmap(_f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                self._entries, _end = read_index(_map)
+            finally:
+                _map.close()
+            self._file = open(_path, 'r+b')
+            self._file.seek(_end)
+            self._file.truncate()
+            self._offset = _end
+        else:
+            self._file = open(_path, 'wb')
+            self._file.write(CAPTURE_MAGIC)
+            self._offset = len(CAPTURE_MAGIC)
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Append one packet. _time defaults to now.
+    #
+    def write(self, _data, _time=None):
+        if _time is None:
+            _time = time()
+        self._file.write(RECORD_HEADER.pack(_time, len(_data)))
+        self._file.write(_data)
+        self._entries.append((self._offset,) + packet_types(_data))
+        self._offset += RECORD_HEADER.size + len(_data)
+
+    def flush(self):
+        self._file.flush()
+
+    # Write the index and trailer and close the file
+    #
+    def close(self):
+        if self._file is None:
+            return
+        self._file.write(''.join(INDEX_ENTRY.pack(*_entry) for _entry in self._entries))
+        self._file.write(TRAILER.pack(self._offset, len(self._entries), INDEX_MAGIC))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+
+class captureReader(object):
+    def __init__(self, _path):
+        self.path = _path
+        with open(_path, 'rb') as _f:
+            # mmap can't map an empty file, and it wouldn't be a capture anyway
+            if os.fstat(_f.fileno()).st_size == 0:
+                raise CaptureError('{} is empty, not a capture file'.format(_path))
+            self._map = mmap.mmap(_f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            _index = find_index(self._map)
+        except CaptureError:
+            self._map.close()
+            raise
+        # Index entries are read straight out of the map as they're needed. Only a file without
+        # an index has to be walked, and then the whole index is kept in memory.
+        if _index is not None:
+            self._index_offset, self._count = _index
+            self._entries = None
+        else:
+            self._entries = scan_records(self._map)[0]
+            self._count = len(self._entries)
+        # Record numbers for each burst data type, built the first time find() is used
+        self._by_burst = None
+
+    def __len__(self):
+        return self._count
+
+    # Index entry _i: (offset, packet type, burst type)
+    #
+    def entry(self, _i):
+        if self._entries is not None:
+            return self._entries[_i]
+        if _i < 0:
+            _i += self._count
+        if not 0 <= _i < self._count:
+            raise IndexError('capture record out of range')
+        return INDEX_ENTRY.unpack_from(self._map, self._index_offset + _i * INDEX_ENTRY.size)
+
+    # Record number _i as (receive time, packet)
+    #
+    def record(self, _i):
+        _offset = self.entry(_i)[0]
+        _time, _length = RECORD_HEADER.unpack_from(self._map, _offset)
+        _start = _offset + RECORD_HEADER.size
+        return _time, self._map[_start:_start + _length]
+
+    def packet(self, _i):
+        return self.record(_i)[1]
+
+    def packets(self):
+        for i in xrange(self._count):
+            yield self.packet(i)
+
+    # Numbers of the records with burst data type _burst_type (a one character string, as in
+    # BURST_DATA_TYPE), optionally only those of packet type _packet_type
+    #
+    def find(self, _burst_type, _packet_type=None):
+        if self._by_burst is None:
+            self._by_burst = {}
+            for i in xrange(self._count):
+                self._by_burst.setdefault(chr(self.entry(i)[2]), []).append(i)
+        _found = self._by_burst.get(_burst_type, [])
+        if _packet_type is not None:
+            _found = [i for i in _found if self.entry(i)[1] == ord(_packet_type)]
+        return _found
+
+    # The packet of the _n'th record with burst data type _burst_type, or None
+    #
+    def template(self, _burst_type, _n=0):
+        _found = self.find(_burst_type)
+        if _n < len(_found):
+            return self.packet(_found[_n])
+        return None
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.close()
+
+
+# The last _minutes of user packets on one system, in a ring of fixed size slots allocated up
+# front, so recording never allocates and memory use never grows. The ring is sized for
+# RATE packets a second (voice on both timeslots); when traffic is heavier than that it
+# covers less time. Packets longer than SLOT_SIZE are cut short.
+#
+class ringRecorder(object):
+    RATE = 34
+    SLOT_SIZE = 256
+
+    def __init__(self, _system, _minutes):
+        self.system = _system
+        self.window = _minutes * 60
+        self._slots = max(int(self.window * self.RATE), 1)
+        self._buf = bytearray(self._slots * self.SLOT_SIZE)
+        self._lengths = array('H', [0]) * self._slots
+        self._times = array('d', [0.0]) * self._slots
+        self._next = 0
+        self._count = 0
+        self.truncated = 0
+
+    def __len__(self):
+        return self._count
+
+    def record(self, _data, _time):
+        i = self._next
+        _length = len(_data)
+        if _length > self.SLOT_SIZE:
+            _data = _data[:self.SLOT_SIZE]
+            _length = self.SLOT_SIZE
+            self.truncated += 1
+        _start = i * self.SLOT_SIZE
+        self._buf[_start:_start + _length] = _data
+        self._lengths[i] = _length
+        self._times[i] = _time
+        self._next = (i + 1) % self._slots
+        if self._count < self._slots:
+            self._count += 1
+
+    # Copy out what's in the ring, oldest first, as a list of (time, packet) from the last
+    # window. Cheap enough to do in the reactor; writing it out can then happen elsewhere.
+    #
+    def snapshot(self, _now=None):
+        if _now is None:
+            _now = time()
+        _oldest = _now - self.window
+        _buf = str(self._buf)
+        _packets = []
+        _first = (self._next - self._count) % self._slots
+        for n in xrange(self._count):
+            i = (_first + n) % self._slots
+            if self._times[i] >= _oldest:
+                _start = i * self.SLOT_SIZE
+                _packets.append((self._times[i], _buf[_start:_start + self._lengths[i]]))
+        return _packets
+
+    # Write a snapshot to a new capture file in _path, named for the system and the time to
+    # the millisecond. An existing file is never added to: if the name is taken, -1, -2, ...
+    # is put on the end until one isn't. Returns the file name.
+    #
+    @staticmethod
+    def dump(_system, _packets, _path):
+        _now = time()
+        _base = os.path.join(_path, '{}-{}.{:03d}'.format(_system, strftime('%Y%m%d-%H%M%S', localtime(_now)), int(_now * 1000) % 1000))
+        _file = _base + '.cap'
+        n = 0
+        while True:
+            try:
+                _writer = captureWriter(_file, _new=True)
+                break
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+                n += 1
+                _file = '{}-{}.cap'.format(_base, n)
+        with _writer:
+            for _time, _packet in _packets:
+                _writer.write(_packet, _time)
+        return _file
+
+
+# Convert an older recording to a capture: a pickled list of packets (record.py) or 4-byte
+# length-prefixed packets (template.bin). Returns the number of packets converted.
+#
+def convert_legacy(_src, _dst):
+    import cPickle as pickle
+    from struct import unpack_from
+
+    with open(_src, 'rb') as _f:
+        _raw = _f.read()
+    try:
+        _packets = pickle.loads(_raw)
+    except Exception:
+        _packets = []
+        _offset = 0
+        while _offset + 4 <= len(_raw):
+            _length, = unpack_from('<i', _raw, _offset)
+            if _length <= 0 or _offset + 4 + _length > len(_raw):
+                break
+            _packets.append(_raw[_offset + 4:_offset + 4 + _length])
+            _offset += 4 + _length
+    if not _packets:
+        raise CaptureError('{} is not a recording this can convert'.format(_src))
+
+    with captureWriter(_dst) as _writer:
+        for _packet in _packets:
+            _writer.write(_packet, 0.0)
+    return len(_packets)
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) != 3:
+        sys.exit('usage: python -m ipsc.capture <pickle or template.bin file> <capture file>')
+    print('{} packets converted'.format(convert_legacy(sys.argv[1], sys.argv[2])))
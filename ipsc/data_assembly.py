@@ -0,0 +1,154 @@
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# Reassembly of DMR data calls (GPS, SMS) from their blocks. Every call in progress is kept
+# separately, keyed by (system, source, destination, timeslot), so two radios sending data at
+# once no longer end up in each other's messages.
+#
+# A data header (data type 6) starts a call. It says how many blocks follow, and a buffer
+# with a slot for each of them is set up there and then. The blocks (data type 7, rate 1/2)
+# fill it in order; when the last one is in, the call is complete and handed back, and its
+# state dropped. Blocks with no header in front of them are ignored. A call that stops
+# getting blocks is thrown away after DATA_TIMEOUT seconds.
+#
+# Blocks are the 24 hex characters of the BPTC payload, as process_packet has always handled
+# them; a completed call is the blocks joined together.
+#
+# An MD-380 style UDT header (4th hex digit of the header is 5) is followed by a single block
+# holding the position. It's handed back with the kind 'UDT' rather than 'DATA'.
+
+from time import time
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+DATA_HEADER   = 6
+DATA_BLOCK    = 7
+
+# How long a call in progress waits for its next block. Blocks come every 60ms, so this is
+# only ever reached by a call that has been abandoned.
+DATA_TIMEOUT  = 5.0
+
+# Where blocks-to-follow is in a data header: bits 65-71 of the 12 decoded bytes
+BTF_BYTE      = 8
+BTF_MASK      = 0x7F
+
+
+class dataCall(object):
+    __slots__ = ('kind', 'header', 'blocks', 'received', 'started', 'last')
+
+    def __init__(self, _kind, _header, _btf, _now):
+        self.kind = _kind
+        self.header = _header
+        self.blocks = [None] * _btf
+        self.received = 0
+        self.started = _now
+        self.last = _now
+
+
+# Number of blocks to follow, from a data header as hex
+#
+def blocks_to_follow(_header):
+    return int(_header[BTF_BYTE * 2:BTF_BYTE * 2 + 2], 16) & BTF_MASK
+
+
+class dataReassembly(object):
+    def __init__(self, _timeout=DATA_TIMEOUT):
+        self._timeout = _timeout
+        self._calls = {}
+        self._swept = 0
+
+        # Counters
+        self.completed = 0
+        self.expired = 0
+        self.abandoned = 0
+        self.orphans = 0
+
+    def __len__(self):
+        return len(self._calls)
+
+    # Take one data burst. Returns (kind, header, payload) when it completes a call, otherwise
+    # None. _block is the burst's payload as hex, _now defaults to the time.
+    #
+    def receive(self, _system, _src_sub, _dst_sub, _ts, _dtype, _block, _now=None):
+        if _now is None:
+            _now = time()
+        if _now - self._swept > self._timeout:
+            self.expire(_now)
+        _key = (_system, _src_sub, _dst_sub, _ts)
+
+        if _dtype == DATA_HEADER:
+            if _key in self._calls:
+                # The radio started over; whatever it sent before is no use now
+                self.abandoned += 1
+                del self._calls[_key]
+            if _block[3] == '5':
+                self._calls[_key] = dataCall('UDT', _block[0:3], 1, _now)
+            else:
+                _btf = blocks_to_follow(_block)
+                if _btf:
+                    self._calls[_key] = dataCall('DATA', _block[0:3], _btf, _now)
+            return None
+
+        if _dtype != DATA_BLOCK:
+            return None
+        _call = self._calls.get(_key)
+        if _call is None:
+            self.orphans += 1
+            return None
+        _call.blocks[_call.received] = _block
+        _call.received += 1
+        _call.last = _now
+        if _call.received < len(_call.blocks):
+            return None
+        del self._calls[_key]
+        self.completed += 1
+        return _call.kind, _call.header, ''.join(_call.blocks)
+
+    # Blocks still wanted by the call from _src_sub to _dst_sub, or None if there isn't one
+    #
+    def pending(self, _system, _src_sub, _dst_sub, _ts):
+        _call = self._calls.get((_system, _src_sub, _dst_sub, _ts))
+        if _call is None:
+            return None
+        return len(_call.blocks) - _call.received
+
+    # Throw away calls that haven't had a block for the timeout. Returns their keys.
+    #
+    def expire(self, _now=None):
+        if _now is None:
+            _now = time()
+        self._swept = _now
+        _stale = [_key for _key, _call in self._calls.iteritems() if _now - _call.last > self._timeout]
+        for _key in _stale:
+            del self._calls[_key]
+        self.expired += len(_stale)
+        return _stale
+
+    def stats(self):
+        return {
+            'ACTIVE': len(self._calls),
+            'COMPLETED': self.completed,
+            'EXPIRED': self.expired,
+            'ABANDONED': self.abandoned,
+            'ORPHANS': self.orphans
+        }
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+#
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# Radio ID access control lists. An ACL is written the same way it always has been in
+# sub_acl.py:
+#
+#   ACL = 'DENY:1-2999,16777215'
+#
+# or as a list of them, where the first list that contains an ID decides for it:
+#
+#   ACL = ['PERMIT:3120001-3120099', 'DENY:3120000-3129999']
+#
+# An ID that isn't in any list gets the opposite of the last list's action, so a single
+# PERMIT list allows only what it names and a single DENY list allows everything else.
+#
+# Rather than expanding every range into a set of IDs, the lists are compiled into one
+# table of sorted, non-overlapping ID intervals, and an ID is looked up with a binary
+# search. Memory and startup time depend on the number of ranges written,
+# not the number of IDs they cover. The interval bounds are kept in array('L'), a few bytes
+# each rather than a Python int apiece.
+#
+# sub_acl.py may also hold SYSTEM_ACL, which scopes ACLs to an IPSC system, and within that
+# to a timeslot and a destination TGID:
+#
+#   SYSTEM_ACL = {
+#       'IPSC1': {
+#           'SUB':      'DENY:1-2999',              # source radio IDs
+#           'TGID':     'PERMIT:1-99,3100',         # destination groups
+#           'TGID_SUB': {3100: 'PERMIT:3120000-3129999'},   # source radio IDs, per TGID
+#           'TS2':      {'TGID': 'PERMIT:9'}        # same keys again, timeslot 2 only
+#       }
+#   }
+#
+# Every ACL that applies to a call has to allow it. These are compiled into one streamACL
+# per (system, timeslot) at startup.
+
+from array import array
+from bisect import bisect_right
+from struct import Struct
+from importlib import import_module
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+ACL_ACTIONS = ('PERMIT', 'DENY')
+
+# Radio IDs out of packets are 3 bytes, network order
+RADIO_ID = Struct('>I')
+
+# How many looked-up radio IDs to remember. The same few IDs show up on every frame of a
+# call, so this keeps lookups down to a dict hit. Cleared when it fills.
+ACL_CACHE_SIZE = 4096
+
+
+# Parse one 'ACTION:id,start-end,...' list into its action and a list of [start, end] ranges
+#
+def parse_acl(_acl):
+    _action, _entries = _acl.split(':', 1)
+    _action = _action.strip().upper()
+    if _action not in ACL_ACTIONS:
+        raise ValueError('ACL action must be PERMIT or DENY, not "{}"'.format(_action))
+    _ranges = []
+    for _entry in _entries.split(','):
+        _entry = _entry.strip()
+        if not _entry:
+            continue
+        if '-' in _entry:
+            _start, _end = _entry.split('-')
+            _start, _end = int(_start), int(_end)
+        else:
+            _start = _end = int(_entry)
+        if _start > _end:
+            _start, _end = _end, _start
+        _ranges.append([_start, _end])
+    return _action, _ranges
+
+# Sort ranges and merge any that overlap or touch
+#
+def merge_ranges(_ranges):
+    _merged = []
+    for _start, _end in sorted(_ranges):
+        if _merged and _start <= _merged[-1][1] + 1:
+            if _end > _merged[-1][1]:
+                _merged[-1][1] = _end
+        else:
+            _merged.append([_start, _end])
+    return _merged
+
+# Take the parts of (merged) _ranges that are not in (merged) _covered
+#
+def subtract_ranges(_ranges, _covered):
+    _result = []
+    i = 0
+    for _start, _end in _ranges:
+        while i < len(_covered) and _covered[i][1] < _start:
+            i += 1
+        j = i
+        while _start <= _end:
+            if j >= len(_covered) or _covered[j][0] > _end:
+                _result.append([_start, _end])
+                break
+            if _covered[j][0] > _start:
+                _result.append([_start, _covered[j][0] - 1])
+            _start = _covered[j][1] + 1
+            j += 1
+    return _result
+
+
+class subscriberACL(object):
+    # _acls is a single 'ACTION:...' string, a list of them in order of precedence, or
+    # empty/None for an ACL that allows everything
+    def __init__(self, _acls=None):
+        if not _acls:
+            _acls = []
+        elif isinstance(_acls, basestring):
+            _acls = [_acls]
+
+        self.lists = []
+        _covered = []
+        _table = []
+        for _acl in _acls:
+            _action, _ranges = parse_acl(_acl)
+            _ranges = merge_ranges(_ranges)
+            self.lists.append((_action, sum(_end - _start + 1 for _start, _end in _ranges)))
+            # Only the IDs that no earlier list has claimed
+            for _start, _end in subtract_ranges(_ranges, _covered):
+                _table.append((_start, _end, _action == 'PERMIT'))
+            _covered = merge_ranges(_covered + _ranges)
+
+        if self.lists:
+            self.default = (self.lists[-1][0] == 'DENY')
+        else:
+            self.default = True
+
+        # Drop the ranges that match the default and coalesce neighbours, so the table only
+        # holds the exceptions to the default
+        _table.sort()
+        self._starts = array('L')
+        self._ends = array('L')
+        for _start, _end, _verdict in _table:
+            if _verdict == self.default:
+                continue
+            if self._starts and self._ends[-1] + 1 == _start:
+                self._ends[-1] = _end
+            else:
+                self._starts.append(_start)
+                self._ends.append(_end)
+        self._cache = {}
+
+    def __len__(self):
+        return len(self._starts)
+
+    # Look up an integer radio ID
+    #
+    def allow_id(self, _id):
+        i = bisect_right(self._starts, _id) - 1
+        if i >= 0 and _id <= self._ends[i]:
+            return not self.default
+        return self.default
+
+    # Look up a radio ID the way it comes out of a packet: 3 bytes, network order
+    #
+    def allow(self, _sub):
+        _verdict = self._cache.get(_sub)
+        if _verdict is not None:
+            return _verdict
+        if len(self._cache) >= ACL_CACHE_SIZE:
+            self._cache.clear()
+        _verdict = self._cache[_sub] = self.allow_id(RADIO_ID.unpack('\x00' + _sub)[0])
+        return _verdict
+
+
+# Load the ACL from the sub_acl module (normally sub_acl.py). No module, or no ACL in it,
+# means everybody is allowed.
+#
+def load_acl(_sub_acl, _logger):
+    try:
+        acl_file = import_module(_sub_acl)
+    except ImportError:
+        _logger.info('ACL file not found or invalid - all subscriber IDs are valid')
+        return subscriberACL()
+
+    _acl = subscriberACL(getattr(acl_file, 'ACL', None))
+    for _action, _count in _acl.lists:
+        _logger.info('ACL loaded: action "{}" for {:,} radio IDs'.format(_action, _count))
+    _logger.info('ACL compiled to {:,} ranges, default action: {}'.format(len(_acl), 'PERMIT' if _acl.default else 'DENY'))
+    return _acl
+
+
+# All of the ACLs that apply to calls on one IPSC system and timeslot
+#
+class streamACL(object):
+    def __init__(self, _sub=(), _tgid=(), _tgid_sub=None):
+        # Empty ACLs allow everything, so don't bother checking them
+        self._sub = tuple(_acl for _acl in _sub if len(_acl) or not _acl.default)
+        self._tgid = tuple(_acl for _acl in _tgid if len(_acl) or not _acl.default)
+        self._tgid_sub = _tgid_sub or {}
+
+    # Check a call from _src_sub to _dst_group (both as they come out of a packet). Returns
+    # None if the call is allowed, otherwise which ACL stopped it: 'SUB', 'TGID' or 'TGID_SUB'
+    #
+    def check(self, _src_sub, _dst_group):
+        for _acl in self._sub:
+            if not _acl.allow(_src_sub):
+                return 'SUB'
+        for _acl in self._tgid:
+            if not _acl.allow(_dst_group):
+                return 'TGID'
+        for _acl in self._tgid_sub.get(_dst_group, ()):
+            if not _acl.allow(_src_sub):
+                return 'TGID_SUB'
+        return None
+
+
+# Compile SYSTEM_ACL from the sub_acl module into a streamACL for every (system, timeslot)
+# in _systems. _acl is the global ACL (from load_acl), which applies everywhere.
+#
+def load_system_acl(_sub_acl, _acl, _systems, _logger):
+    try:
+        _system_acl = getattr(import_module(_sub_acl), 'SYSTEM_ACL', None) or {}
+    except ImportError:
+        _system_acl = {}
+
+    for _system in _system_acl:
+        if _system not in _systems:
+            _logger.warning('SYSTEM_ACL: system "%s" is not configured, its ACLs are ignored', _system)
+
+    _stream_acls = {}
+    for _system in _systems:
+        _config = _system_acl.get(_system, {})
+        for _ts in (1, 2):
+            _scopes = (_config, _config.get('TS{}'.format(_ts), {}))
+            _sub = [_acl] + [subscriberACL(_scope['SUB']) for _scope in _scopes if 'SUB' in _scope]
+            _tgid = [subscriberACL(_scope['TGID']) for _scope in _scopes if 'TGID' in _scope]
+            _tgid_sub = {}
+            for _scope in _scopes:
+                for _group, _group_acl in _scope.get('TGID_SUB', {}).items():
+                    _tgid_sub.setdefault(RADIO_ID.pack(_group)[1:], []).append(subscriberACL(_group_acl))
+            _stream_acls[(_system, _ts)] = streamACL(_sub, _tgid, _tgid_sub)
+            if _config:
+                _logger.info('SYSTEM_ACL loaded: %s TS%s: %s subscriber, %s TGID and %s per-TGID subscriber ACLs', _system, _ts, len(_sub) - 1, len(_tgid), sum(len(_acls) for _acls in _tgid_sub.values()))
+    return _stream_acls
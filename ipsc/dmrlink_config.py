@@ -75,7 +75,10 @@ def build_config(_config_file):
                     'REPORT_PORT': config.get(section, 'REPORT_PORT'),
                     'REPORT_CLIENTS': config.get(section, 'REPORT_CLIENTS').split(','),
                     'PRINT_PEERS_INC_MODE': config.getboolean(section, 'PRINT_PEERS_INC_MODE'),
-                    'PRINT_PEERS_INC_FLAGS': config.getboolean(section, 'PRINT_PEERS_INC_FLAGS')
+                    'PRINT_PEERS_INC_FLAGS': config.getboolean(section, 'PRINT_PEERS_INC_FLAGS'),
+                    'REPORT_DELTA': config.getboolean(section, 'REPORT_DELTA') if config.has_option(section, 'REPORT_DELTA') else True,
+                    'REPORT_QUEUE_SIZE': max(config.getint(section, 'REPORT_QUEUE_SIZE'), 1) if config.has_option(section, 'REPORT_QUEUE_SIZE') else 100,
+                    'REPORT_OVERFLOW': config.get(section, 'REPORT_OVERFLOW') if config.has_option(section, 'REPORT_OVERFLOW') else 'coalesce'
                 })
                 if CONFIG['REPORTS']['REPORT_PORT']:
                     CONFIG['REPORTS']['REPORT_PORT'] = int(CONFIG['REPORTS']['REPORT_PORT'])
@@ -87,7 +90,11 @@ def build_config(_config_file):
                     'LOG_FILE': config.get(section, 'LOG_FILE'),
                     'LOG_HANDLERS': config.get(section, 'LOG_HANDLERS'),
                     'LOG_LEVEL': config.get(section, 'LOG_LEVEL'),
-                    'LOG_NAME': config.get(section, 'LOG_NAME')
+                    'LOG_NAME': config.get(section, 'LOG_NAME'),
+
+                    # Optional items, only used by the *-async handlers
+                    'LOG_QUEUE_SIZE': config.getint(section, 'LOG_QUEUE_SIZE') if config.has_option(section, 'LOG_QUEUE_SIZE') else 10000,
+                    'LOG_QUEUE_OVERFLOW': config.get(section, 'LOG_QUEUE_OVERFLOW') if config.has_option(section, 'LOG_QUEUE_OVERFLOW') else 'drop-oldest'
                 })
                 
             elif section == 'ALIASES':
@@ -138,6 +145,13 @@ def build_config(_config_file):
                     'AUTH_KEY':     (config.get(section, 'AUTH_KEY').rjust(40,'0')).decode('hex'),
                     'GROUP_HANGTIME': config.getint(section, 'GROUP_HANGTIME'),
                     'NUM_PEERS': 0,
+
+                    # Optional items, older configuration files won't have these
+                    'BATCH_TX':     config.getboolean(section, 'BATCH_TX') if config.has_option(section, 'BATCH_TX') else False,
+                    'HOT_TRACE':    config.getboolean(section, 'HOT_TRACE') if config.has_option(section, 'HOT_TRACE') else False,
+                    'TRACE_SAMPLE': max(config.getint(section, 'TRACE_SAMPLE'), 1) if config.has_option(section, 'TRACE_SAMPLE') else 1,
+                    'RECORDER_MINUTES': max(config.getint(section, 'RECORDER_MINUTES'), 0) if config.has_option(section, 'RECORDER_MINUTES') else 0,
+                    'RECORDER_PATH': config.get(section, 'RECORDER_PATH') if config.has_option(section, 'RECORDER_PATH') else './',
                     })
                 # Master means things we need to know about the master peer of the network
                 CONFIG['SYSTEMS'][section]['MASTER'].update({
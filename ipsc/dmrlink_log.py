@@ -19,7 +19,12 @@
 ###############################################################################
 
 import logging
+import logging.handlers
+import threading
+import time
 from logging.config import dictConfig
+from binascii import b2a_hex as ahex
+from collections import deque
 
 # Does anybody read this stuff? There's a PEP somewhere that says I should do this.
 __author__     = 'Cortney T. Buffington, N0MJS'
@@ -29,7 +34,230 @@ __maintainer__ = 'Cort Buffington, N0MJS'
 __email__      = 'n0mjs@me.com'
 
 
+# Wrap a packet so it's only hex-encoded if the log record is actually written out. Pass it
+# as a logging argument (never concatenate it into the message) and the encoding cost is
+# only paid when the message gets past the logger's level.
+#
+class lazyHex(object):
+    __slots__ = ('_data',)
+
+    def __init__(self, _data):
+        self._data = _data
+
+    def __str__(self):
+        return ahex(self._data)
+
+
+# Asynchronous log handler. Records are put on a bounded in-memory queue and a background
+# thread hands them to the real (target) handler, so file and syslog I/O never happens on
+# the reactor thread. The writer takes everything that is queued in one go and writes it
+# with a single flush. If the queue fills up, the oldest record (or, with 'drop-newest',
+# the new one) is thrown away and counted; the count is logged once the writer catches up.
+#
+class asyncHandler(logging.Handler):
+    BATCH_WINDOW = 0.02
+
+    def __init__(self, _target, _capacity=10000, _overflow='drop-oldest'):
+        logging.Handler.__init__(self)
+        self._target = _target
+        self._capacity = max(int(_capacity), 1)
+        self._drop_newest = (_overflow == 'drop-newest')
+        self._queue = deque()
+        # RLock: a signal handler may log (or flush) while the reactor thread is in emit()
+        self._cond = threading.Condition(threading.RLock())
+        self._busy = False
+        self._closed = False
+        self._thread = None
+        self.dropped = 0
+        self._dropped_reported = 0
+
+    # The formatter is applied by the target, on the writer thread
+    def setFormatter(self, fmt):
+        logging.Handler.setFormatter(self, fmt)
+        self._target.setFormatter(fmt)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._writer, name='dmrlink-log-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def emit(self, record):
+        # Merge the arguments into the message now: they may be objects that change (or
+        # go away) before the writer thread gets to them
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+        except Exception:
+            self.handleError(record)
+            return
+
+        with self._cond:
+            if self._closed:
+                return
+            if self._thread is None:
+                self._start()
+            if len(self._queue) >= self._capacity:
+                self.dropped += 1
+                if self._drop_newest:
+                    return
+                self._queue.popleft()
+            self._queue.append(record)
+            if len(self._queue) == 1:
+                self._cond.notify()
+
+    def _writer(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                _linger = not self._closed
+            # Let a burst finish queueing so it goes out as one write instead of waking
+            # up (and fighting the reactor thread for the GIL) once per record
+            if _linger:
+                time.sleep(self.BATCH_WINDOW)
+            with self._cond:
+                _batch = list(self._queue)
+                self._queue.clear()
+                _dropped = self.dropped - self._dropped_reported
+                self._dropped_reported = self.dropped
+                self._busy = True
+            try:
+                if _dropped:
+                    _batch.append(logging.makeLogRecord({
+                        'name': _batch[-1].name, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                        'msg': 'Log queue overflow: %s messages dropped' % _dropped
+                    }))
+                self._write(_batch)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    # Stream based handlers (console, file) get the whole batch in one write and one flush,
+    # anything else gets the records one at a time.
+    #
+    def _write(self, _batch):
+        _target = self._target
+        if isinstance(_target, logging.StreamHandler) and getattr(_target, 'stream', None) is not None:
+            _lines = []
+            for record in _batch:
+                try:
+                    _lines.append(_target.format(record))
+                except Exception:
+                    _target.handleError(record)
+            _target.acquire()
+            try:
+                _target.stream.write('\n'.join(_lines) + '\n')
+                _target.flush()
+            except Exception:
+                _target.handleError(_batch[-1])
+            finally:
+                _target.release()
+        else:
+            for record in _batch:
+                _target.handle(record)
+
+    # Block until everything queued so far has been written, or the timeout runs out
+    #
+    def flush(self, _timeout=5.0):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        with self._cond:
+            self._cond.notify()
+            _waited = 0.0
+            while (self._queue or self._busy) and _waited < _timeout:
+                self._cond.wait(0.05)
+                _waited += 0.05
+        self._target.flush()
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(1.0)
+        self._target.close()
+        logging.Handler.close(self)
+
+
+# Token bucket rate limiter for warnings that bad traffic can trigger once per packet
+# (authentication failures, unknown peers, ACL rejections). Each (reason, source) pair gets
+# its own bucket of BURST messages, refilled at RATE per second. Anything over that is
+# counted instead of logged, and summarize() - called from a maintenance loop - logs one
+# line per flooding source every INTERVAL seconds. Running totals are kept in _counts
+# (reason -> source -> total) so the reporting server can see them.
+#
+class warningLimiter(object):
+    RATE = 1.0
+    BURST = 10
+    INTERVAL = 10
+    MAX_SOURCES = 1000
+
+    def __init__(self, _system, _logger, _counts):
+        self._system = _system
+        self._logger = _logger
+        self._counts = _counts
+        self._buckets = {}
+        self._last_summary = time.time()
+
+    # True if this warning should be logged, False if it was counted and suppressed
+    #
+    def allow(self, _reason, _source):
+        _now = time.time()
+        _key = (_reason, _source)
+        _bucket = self._buckets.get(_key)
+        if _bucket is None:
+            # [tokens, last refill time, suppressed since the last summary]
+            _bucket = self._buckets[_key] = [self.BURST, _now, 0]
+        else:
+            _bucket[0] = min(self.BURST, _bucket[0] + (_now - _bucket[1]) * self.RATE)
+            _bucket[1] = _now
+        if _bucket[0] >= 1:
+            _bucket[0] -= 1
+            return True
+
+        _bucket[2] += 1
+        _totals = self._counts.setdefault(_reason, {})
+        if _source not in _totals and len(_totals) >= self.MAX_SOURCES:
+            _source = 'OTHER'
+        _totals[_source] = _totals.get(_source, 0) + 1
+        return False
+
+    # Log what was suppressed since the last summary and forget quiet sources
+    #
+    def summarize(self):
+        _now = time.time()
+        _elapsed = _now - self._last_summary
+        if _elapsed < self.INTERVAL:
+            return
+        self._last_summary = _now
+        for _key in self._buckets.keys():
+            _bucket = self._buckets[_key]
+            if _bucket[2]:
+                self._logger.warning('(%s) Suppressed %s %s messages from %s in last %ss', self._system, _bucket[2], _key[0], _key[1], int(_elapsed))
+                _bucket[2] = 0
+            elif _now - _bucket[1] > self.INTERVAL:
+                del self._buckets[_key]
+
+
+# Flush any asynchronous handlers on the way out so queued messages aren't lost
+#
+def flush_logging(_logger):
+    for handler in _logger.handlers:
+        handler.flush()
+
+
 def config_logging(_logger):
+    # Only used by the *-async handlers
+    _queue_size = _logger.get('LOG_QUEUE_SIZE', 10000)
+    _queue_overflow = _logger.get('LOG_QUEUE_OVERFLOW', 'drop-oldest')
+
     dictConfig({
         'version': 1,
         'disable_existing_loggers': False,
@@ -74,6 +302,18 @@ def config_logging(_logger):
             'syslog': {
                 'class': 'logging.handlers.SysLogHandler',
                 'formatter': 'syslog',
+            },
+            'file-async': {
+                '()': lambda: asyncHandler(logging.FileHandler(_logger['LOG_FILE']), _queue_size, _queue_overflow),
+                'formatter': 'simple',
+            },
+            'file-timed-async': {
+                '()': lambda: asyncHandler(logging.FileHandler(_logger['LOG_FILE']), _queue_size, _queue_overflow),
+                'formatter': 'timed',
+            },
+            'syslog-async': {
+                '()': lambda: asyncHandler(logging.handlers.SysLogHandler(), _queue_size, _queue_overflow),
+                'formatter': 'syslog',
             }
         },
         'loggers': {
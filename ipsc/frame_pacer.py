@@ -0,0 +1,176 @@
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# Frame pacing for traffic that DMRlink originates itself (playback, generated voice).
+# A stream of prebuilt frames for one system and timeslot is sent from the reactor, one
+# frame per reactor.callLater(), against a fixed schedule: frame n goes out at
+# t0 + n * interval. Lateness on one frame is taken out of the wait for the next instead of
+# adding up, and nothing ever sleeps in the reactor thread.
+#
+# The schedule runs on the monotonic clock so it isn't thrown by NTP stepping the wall
+# clock. Python 2 has no time.monotonic(), so clock_gettime() is called from libc with
+# ctypes, falling back to time.time() where that isn't possible.
+
+import ctypes
+import ctypes.util
+
+from collections import deque
+from time import time
+
+from twisted.internet import reactor
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+# One DMR voice burst every 60ms
+FRAME_INTERVAL = 0.06
+
+CLOCK_MONOTONIC = 1
+
+class timespec(ctypes.Structure):
+    _fields_ = [
+        ('tv_sec', ctypes.c_long),
+        ('tv_nsec', ctypes.c_long)
+    ]
+
+def _load_monotonic():
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        _clock_gettime = _libc.clock_gettime
+    except (OSError, AttributeError, TypeError):
+        return time
+    _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+    _clock_gettime.restype = ctypes.c_int
+    _ts = timespec()
+    _ts_ref = ctypes.byref(_ts)
+    if _clock_gettime(CLOCK_MONOTONIC, _ts_ref) != 0:
+        return time
+
+    def monotonic():
+        _clock_gettime(CLOCK_MONOTONIC, _ts_ref)
+        return _ts.tv_sec + _ts.tv_nsec * 1e-9
+    return monotonic
+
+monotonic = _load_monotonic()
+
+
+class framePacer(object):
+    # _send is called with each frame in turn (normally an IPSC instance's send_to_ipsc).
+    # _done, if given, is called with the pacer once the queue has been sent.
+    def __init__(self, _send, _frames=(), _interval=FRAME_INTERVAL, _done=None):
+        self._send = _send
+        self._frames = deque(_frames)
+        self._interval = _interval
+        self._done = _done
+        self._call = None
+        self._t0 = None
+        self._index = 0
+        self._last = None
+
+        # Jitter statistics: how far each frame was from its deadline, and how far each gap
+        # between frames was from the interval (seconds)
+        self.sent = 0
+        self.late = 0
+        self.offset_max = 0.0
+        self._offset_sum = 0.0
+        self.jitter_max = 0.0
+        self._jitter_sum = 0.0
+        self._jitter_count = 0
+
+    # Add frames to the end of the queue. They keep the schedule of the frames ahead of them,
+    # unless the queue had already run dry, in which case the schedule restarts from now
+    # rather than trying to catch up with a burst.
+    #
+    def push(self, _frame):
+        self.extend((_frame,))
+
+    def extend(self, _frames):
+        self._frames.extend(_frames)
+        if self._t0 is not None and self._call is None:
+            _now = monotonic()
+            if self._t0 + self._index * self._interval < _now:
+                self._t0 = _now - self._index * self._interval
+                self._last = None
+            self._schedule()
+
+    # Send the first frame _delay seconds from now, the rest on the schedule after it
+    #
+    def start(self, _delay=0):
+        self.stop()
+        self._t0 = monotonic() + _delay
+        self._index = 0
+        self._schedule()
+        return self
+
+    def stop(self):
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
+
+    def active(self):
+        return self._call is not None
+
+    def __len__(self):
+        return len(self._frames)
+
+    def _schedule(self):
+        if not self._frames:
+            self._call = None
+            if self._done:
+                self._done(self)
+            return
+        _delay = self._t0 + self._index * self._interval - monotonic()
+        self._call = reactor.callLater(max(_delay, 0), self._tick)
+
+    def _tick(self):
+        _now = monotonic()
+        self._send(self._frames.popleft())
+
+        _offset = _now - (self._t0 + self._index * self._interval)
+        if _offset > self._interval:
+            self.late += 1
+        self._offset_sum += abs(_offset)
+        if abs(_offset) > self.offset_max:
+            self.offset_max = abs(_offset)
+        if self._last is not None:
+            _jitter = abs(_now - self._last - self._interval)
+            self._jitter_sum += _jitter
+            self._jitter_count += 1
+            if _jitter > self.jitter_max:
+                self.jitter_max = _jitter
+        self._last = _now
+        self.sent += 1
+        self._index += 1
+        self._schedule()
+
+    # Achieved timing so far, in milliseconds. LATE counts frames sent more than a whole
+    # interval after their deadline.
+    #
+    def stats(self):
+        return {
+            'FRAMES': self.sent,
+            'LATE': self.late,
+            'OFFSET_MEAN': self._offset_sum / self.sent * 1000 if self.sent else 0.0,
+            'OFFSET_MAX': self.offset_max * 1000,
+            'JITTER_MEAN': self._jitter_sum / self._jitter_count * 1000 if self._jitter_count else 0.0,
+            'JITTER_MAX': self.jitter_max * 1000
+        }
@@ -0,0 +1,113 @@
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# Maidenhead grid squares to APRS latitude and longitude, for the @MH SMS command. This used
+# to be done by running mh_to_aprs.py (Python 3 and the maidenhead module) for every message;
+# it gives exactly what that script prints:
+#
+#   - the south-west corner of the square, worked out the way the maidenhead module does
+#     (as one fraction, divided once) so the floating point comes out the same
+#   - degrees and whole minutes from decdeg2dms, with the seconds dropped and the hundredths
+#     of minutes left as spaces (APRS position ambiguity), e.g. ('4726.  N', '12220.  W')
+#
+# Results are kept in a small LRU cache, since the same few squares get sent over and over.
+
+from __future__ import division
+
+import re
+
+from collections import OrderedDict
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+GRID_CACHE_SIZE = 1024
+
+_GRID_CACHE = OrderedDict()
+
+
+# Value of one character of a locator: pairs alternate between letters (the first pair
+# A-R, the rest A-X) and digits
+#
+def _grid_value(_char, _pair):
+    if _pair % 2:
+        if not '0' <= _char <= '9':
+            raise ValueError('Maidenhead locator digit expected, not "{}"'.format(_char))
+        return ord(_char) - ord('0')
+    _value = ord(_char) - ord('A')
+    if not 0 <= _value < (18 if _pair == 0 else 24):
+        raise ValueError('Maidenhead locator letter out of range: "{}"'.format(_char))
+    return _value
+
+# One axis of a locator as a fraction (numerator, denominator) of its field
+#
+def _grid_axis(_chars):
+    _pairs = len(_chars)
+    _num, _den = 0, 1
+    for i, _char in enumerate(_chars):
+        _weight = 1 if i == _pairs - 1 else (24 if i % 2 else 10)
+        _num = (_num + _grid_value(_char, i)) * _weight
+        _den = _den * _weight
+    return _num, _den
+
+# South-west corner of a grid square as (latitude, longitude) in decimal degrees
+#
+def to_location(_grid):
+    _grid = _grid.strip().upper()
+    if len(_grid) < 2 or len(_grid) % 2:
+        raise ValueError('Maidenhead locator requires an even number of characters')
+    _lat_num, _lat_den = _grid_axis(_grid[1::2])
+    _lon_num, _lon_den = _grid_axis(_grid[::2])
+    return (10 * (_lat_num - 9 * _lat_den)) / _lat_den, (20 * (_lon_num - 9 * _lon_den)) / _lon_den
+
+# Decimal degrees to (degrees, minutes, seconds), degrees carrying the sign
+#
+def decdeg2dms(_dd):
+    _is_positive = _dd >= 0
+    _dd = abs(_dd)
+    _minutes, _seconds = divmod(_dd * 3600, 60)
+    _degrees, _minutes = divmod(_minutes, 60)
+    _degrees = _degrees if _is_positive else -_degrees
+    return (_degrees, _minutes, _seconds)
+
+def _aprs_coord(_dms, _width, _positive, _negative):
+    if _dms[0] > 0:
+        _dir = _positive
+    elif _dms[0] < 0:
+        _dir = _negative
+    else:
+        # mh_to_aprs.py has no answer for these either
+        raise ValueError('no hemisphere for a position within a degree of the equator or meridian')
+    return str(re.sub(r'\..*|-', '', str(_dms[0])) + re.sub(r'\..*', '', str(_dms[1])) + '.').zfill(_width) + '  ' + _dir
+
+# APRS (latitude, longitude) strings for a grid square
+#
+def grid_to_aprs(_grid):
+    _key = _grid.strip().upper()
+    _coord = _GRID_CACHE.pop(_key, None)
+    if _coord is None:
+        _lat, _lon = to_location(_key)
+        _coord = (_aprs_coord(decdeg2dms(_lat), 5, 'N', 'S'), _aprs_coord(decdeg2dms(_lon), 6, 'E', 'W'))
+        if len(_GRID_CACHE) >= GRID_CACHE_SIZE:
+            _GRID_CACHE.popitem(last=False)
+    _GRID_CACHE[_key] = _coord
+    return _coord
@@ -0,0 +1,156 @@
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# Versioned copies of the data structures sent to reporting clients (CONFIG['SYSTEMS'],
+# confbridge's BRIDGES), so that a client can be sent the whole thing once when it connects
+# and only what has changed after that.
+#
+# A snapshot is the structure exactly as it has always been sent (CONFIG_SND, BRIDGE_SND).
+# A delta (CONFIG_UPD, BRIDGE_UPD) is a pickled dict:
+#
+#   {'VERSION': n, 'BASE': n - 1, 'SET': [(path, value), ...], 'DEL': [path, ...]}
+#
+# where a path is a tuple of keys (or list indexes) from the top of the structure. To apply
+# one, delete every DEL path, then for each SET path assign the value at that path. A SET
+# value replaces everything under it. Snapshots and deltas go out in order on one TCP
+# connection, so a client that applies every delta after its snapshot stays in step; if it
+# ever sees a BASE it doesn't have, it can ask for a new snapshot.
+
+import cPickle as pickle
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+# Stands in for a key that isn't there, since None is a perfectly good value
+_MISSING = object()
+
+# Walk two versions of a structure side by side and collect what changed. Dicts are compared
+# key by key, lists of the same length item by item; anything else is compared as a value.
+# Branches that compare equal (which Python does in C) aren't walked at all.
+#
+def diff_tree(_old, _new, _path, _set, _del):
+    _is_dict = type(_new) is dict
+    if _is_dict:
+        _items = _new.iteritems()
+    elif len(_new) == len(_old):
+        _items = enumerate(_new)
+    else:
+        _set.append((_path, _new))
+        return
+    _added = 0
+    for _key, _value in _items:
+        if _is_dict:
+            _old_value = _old.get(_key, _MISSING)
+            if _old_value is _MISSING:
+                _added += 1
+                _set.append((_path + (_key,), _value))
+                continue
+        else:
+            _old_value = _old[_key]
+        if _value == _old_value:
+            continue
+        _type = type(_value)
+        if (_type is dict or _type is list) and _type is type(_old_value):
+            diff_tree(_old_value, _value, _path + (_key,), _set, _del)
+        else:
+            _set.append((_path + (_key,), _value))
+    # Only look for removed keys if there are more old keys than the new ones account for
+    if _is_dict and len(_old) > len(_new) - _added:
+        for _key in _old:
+            if _key not in _new:
+                _del.append(_path + (_key,))
+
+# Apply a delta to a structure. Used to keep our own copy up to date, and handy for clients.
+#
+def apply_delta(_tree, _delta):
+    for _path in _delta['DEL']:
+        _node = _tree
+        for _key in _path[:-1]:
+            _node = _node[_key]
+        del _node[_path[-1]]
+    for _path, _value in _delta['SET']:
+        if not _path:
+            if isinstance(_tree, dict):
+                _tree.clear()
+                _tree.update(_value)
+            else:
+                _tree[:] = _value
+            continue
+        _node = _tree
+        for _key in _path[:-1]:
+            _node = _node[_key]
+        _node[_path[-1]] = _value
+
+
+class reportState(object):
+    # _source is called to get the live structure, since some of them (BRIDGES) are only
+    # built after the report server is
+    def __init__(self, _source):
+        self._source = _source
+        self.version = 0
+        self._shadow = None
+        self._snapshot = None
+
+        # Counters: how many deltas went out and how big they and the snapshots were
+        self.deltas = 0
+        self.delta_bytes = 0
+        self.snapshot_bytes = 0
+
+    # The pickled structure as of the current version
+    #
+    def snapshot(self):
+        if self._snapshot is None:
+            if self._shadow is None:
+                self._snapshot = pickle.dumps(self._source(), protocol=pickle.HIGHEST_PROTOCOL)
+                self._shadow = pickle.loads(self._snapshot)
+            else:
+                self._snapshot = pickle.dumps(self._shadow, protocol=pickle.HIGHEST_PROTOCOL)
+            self.snapshot_bytes = len(self._snapshot)
+        return self._snapshot
+
+    # Forget our copy, e.g. when the last client has gone. The next snapshot is taken fresh.
+    #
+    def reset(self):
+        self._shadow = None
+        self._snapshot = None
+
+    # Compare the live structure with our copy. Returns the pickled delta and moves on a
+    # version, or None if nothing has changed (or no snapshot has been taken yet, so there's
+    # nobody to send a delta to).
+    #
+    def delta(self):
+        if self._shadow is None:
+            return None
+        _set = []
+        _del = []
+        diff_tree(self._shadow, self._source(), (), _set, _del)
+        if not _set and not _del:
+            return None
+
+        _serialized = pickle.dumps({'VERSION': self.version + 1, 'BASE': self.version, 'SET': _set, 'DEL': _del}, protocol=pickle.HIGHEST_PROTOCOL)
+        # Our copy is updated from the pickle, so it doesn't share anything with the live one
+        apply_delta(self._shadow, pickle.loads(_serialized))
+        self.version += 1
+        self._snapshot = None
+        self.deltas += 1
+        self.delta_bytes += len(_serialized)
+        return _serialized
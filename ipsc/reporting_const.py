@@ -27,5 +27,9 @@ REPORT_OPCODES = {
     'BRIDGE_UPD': '\x05',
     'LINK_EVENT': '\x06',
     'BRDG_EVENT': '\x07',
-    'RCM_SND':    '\x08'
+    'RCM_SND':    '\x08',
+    'RECORD_REQ': '\x09',
+    'RECORD_SND': '\x0A',
+    'TRACE_REQ':  '\x0B',
+    'TRACE_SND':  '\x0C'
     }
\ No newline at end of file
@@ -0,0 +1,215 @@
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# Tests for ipsc.aprs_client against a stand-in APRS-IS server on 127.0.0.1. Needs aprslib.
+#
+#   python -m unittest ipsc.test_aprs_client
+
+import socket
+import logging
+import unittest
+
+from threading import Thread, Lock
+from time import time, sleep
+
+try:
+    from ipsc import aprs_client
+except ImportError:
+    aprs_client = None
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+PACKET = 'N0CALL-15>APHBLD,TCPIP*:/123456h4903.50N/07201.75W[/test {}'
+
+
+# Wait up to _timeout seconds for _test() to come true
+#
+def wait_for(_test, _timeout=5.0):
+    _deadline = time() + _timeout
+    while not _test():
+        if time() > _deadline:
+            return False
+        sleep(0.01)
+    return True
+
+
+# Just enough of an APRS-IS server: sends a banner, answers the login and keeps every line
+# it's sent after that. kick() hangs up on everybody connected.
+#
+class fakeServer(object):
+    def __init__(self):
+        self._listen = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listen.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listen.bind(('127.0.0.1', 0))
+        self._listen.listen(5)
+        self._listen.settimeout(0.1)
+        self.port = self._listen.getsockname()[1]
+        self._lock = Lock()
+        self._conns = []
+        self._running = True
+        self.logins = []
+        self.lines = []
+        _thread = Thread(target=self._accept)
+        _thread.daemon = True
+        _thread.start()
+
+    def _accept(self):
+        while self._running:
+            try:
+                _conn, _addr = self._listen.accept()
+            except socket.timeout:
+                continue
+            except socket.error:
+                return
+            with self._lock:
+                self._conns.append(_conn)
+            _thread = Thread(target=self._handle, args=(_conn,))
+            _thread.daemon = True
+            _thread.start()
+
+    def _handle(self, _conn):
+        try:
+            _conn.sendall('# stand-in 1.0\r\n')
+            _login = _conn.recv(512)
+            with self._lock:
+                self.logins.append(_login.strip())
+            _conn.sendall('# logresp {} verified, server TEST\r\n'.format(_login.split()[1]))
+            _buffer = ''
+            while True:
+                _data = _conn.recv(4096)
+                if not _data:
+                    return
+                _buffer += _data
+                while '\r\n' in _buffer:
+                    _line, _buffer = _buffer.split('\r\n', 1)
+                    with self._lock:
+                        self.lines.append(_line)
+        except socket.error:
+            pass
+
+    def received(self):
+        with self._lock:
+            return list(self.lines)
+
+    def kick(self):
+        with self._lock:
+            _conns, self._conns = self._conns, []
+        for _conn in _conns:
+            try:
+                _conn.shutdown(socket.SHUT_RDWR)
+                _conn.close()
+            except socket.error:
+                pass
+
+    def close(self):
+        self._running = False
+        self.kick()
+        self._listen.close()
+
+
+@unittest.skipIf(aprs_client is None, 'aprslib is not installed')
+class aprsClientTest(unittest.TestCase):
+    def setUp(self):
+        self._saved = dict((_name, getattr(aprs_client, _name)) for _name in ('KEEPALIVE_INTERVAL', 'POLL_INTERVAL', 'BACKOFF_MIN'))
+        aprs_client.POLL_INTERVAL = 0.05
+        aprs_client.BACKOFF_MIN = 0.05
+        self.logger = logging.getLogger('test_aprs_client')
+        self.logger.addHandler(logging.NullHandler())
+        self.logger.propagate = False
+        self.server = fakeServer()
+        self.client = None
+
+    def tearDown(self):
+        if self.client is not None:
+            self.client.stop()
+        self.server.close()
+        for _name, _value in self._saved.items():
+            setattr(aprs_client, _name, _value)
+
+    def mk_client(self, _queue_size=None):
+        self.client = aprs_client.aprsClient('N0CALL', 12345, '127.0.0.1', self.server.port, self.logger, _queue_size or aprs_client.APRS_QUEUE_SIZE)
+        return self.client
+
+    def packets(self):
+        return [_line for _line in self.server.received() if not _line.startswith('#')]
+
+    def test_login_and_send(self):
+        _client = self.mk_client().start()
+        for i in range(3):
+            self.assertTrue(_client.send(PACKET.format(i)))
+        self.assertTrue(wait_for(lambda: len(self.packets()) == 3))
+        self.assertEqual(self.packets(), [PACKET.format(i) for i in range(3)])
+        self.assertEqual(len(self.server.logins), 1)
+        self.assertTrue(self.server.logins[0].startswith('user N0CALL pass 12345'))
+        self.assertTrue(_client.connected())
+        _stats = _client.stats()
+        self.assertEqual(_stats['SENT'], 3)
+        self.assertEqual(_stats['CONNECTS'], 1)
+        self.assertEqual(_stats['DROPPED'], 0)
+        self.assertEqual(_stats['QUEUED'], 0)
+
+    def test_full_queue_drops_oldest(self):
+        # Not started yet, so nothing is taken off the queue
+        _client = self.mk_client(_queue_size=3)
+        self.assertEqual([_client.send(PACKET.format(i)) for i in range(5)], [True, True, True, False, False])
+        self.assertEqual(_client.dropped, 2)
+        self.assertEqual(_client.stats()['QUEUED'], 3)
+
+        _client.start()
+        self.assertTrue(wait_for(lambda: len(self.packets()) == 3))
+        self.assertEqual(self.packets(), [PACKET.format(i) for i in range(2, 5)])
+
+    def test_reconnect_resends_pending(self):
+        _client = self.mk_client()
+        # Only notice the hangup when there is a packet to send, so that it's the one taken
+        # off the queue (the pending packet) that has to survive the reconnect
+        _client._keepalive = lambda: None
+        _client.start()
+        _client.send(PACKET.format(0))
+        self.assertTrue(wait_for(lambda: len(self.packets()) == 1))
+
+        self.server.kick()
+        sleep(0.2)
+        _client.send(PACKET.format(1))
+        self.assertTrue(wait_for(lambda: len(self.packets()) == 2))
+        self.assertEqual(self.packets(), [PACKET.format(0), PACKET.format(1)])
+        self.assertEqual(len(self.server.logins), 2)
+        _stats = _client.stats()
+        self.assertEqual(_stats['CONNECTS'], 2)
+        self.assertEqual(_stats['SENT'], 2)
+        self.assertEqual(_stats['QUEUED'], 0)
+
+    def test_keepalive(self):
+        aprs_client.KEEPALIVE_INTERVAL = 0.3
+        _client = self.mk_client().start()
+        self.assertTrue(wait_for(lambda: len(self.server.logins) == 1))
+        _connected = time()
+        self.assertTrue(wait_for(lambda: '# keepalive' in self.server.received()))
+        # Not before KEEPALIVE_INTERVAL (less the time it took to see the login)
+        self.assertTrue(time() - _connected >= 0.25)
+        self.assertEqual(self.packets(), [])
+        self.assertEqual(_client.stats()['SENT'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
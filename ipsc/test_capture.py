@@ -0,0 +1,291 @@
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# Tests for ipsc.capture. Files are written to a temporary directory.
+#
+#   python -m unittest ipsc.test_capture
+
+import os
+import shutil
+import unittest
+import tempfile
+import threading
+import cPickle as pickle
+
+from struct import pack
+
+from ipsc import capture
+from ipsc.capture import captureWriter, captureReader, ringRecorder, convert_legacy, CaptureError, CAPTURE_MAGIC, NO_BURST
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+TEMPLATE_BIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'template.bin')
+
+VOICE_HEAD  = '\x01'
+VOICE_TERM  = '\x02'
+SLOT1_VOICE = '\x0A'
+GROUP_VOICE = '\x80'
+GROUP_DATA  = '\x83'
+
+
+# A user packet of _length bytes with packet type _type, burst data type _burst at byte 30
+# and _n in the bytes after it, so every packet is different
+#
+def mk_packet(_type, _burst, _n, _length=54):
+    return _type + '\x00' * 29 + _burst + pack('>I', _n) + '\x55' * (_length - 35)
+
+# A call: voice header, _bursts voice bursts, terminator
+#
+def mk_call(_bursts, _first=0):
+    _packets = [mk_packet(GROUP_VOICE, VOICE_HEAD, _first)]
+    _packets.extend(mk_packet(GROUP_VOICE, SLOT1_VOICE, _first + 1 + i, 52 + i % 15) for i in range(_bursts))
+    _packets.append(mk_packet(GROUP_VOICE, VOICE_TERM, _first + _bursts + 1))
+    return _packets
+
+
+class captureTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'test.cap')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, _packets, _start=1000.0):
+        with captureWriter(self.path) as _writer:
+            for i, _packet in enumerate(_packets):
+                _writer.write(_packet, _start + i * 0.06)
+        return _writer
+
+    def assertRecords(self, _reader, _packets, _start=1000.0):
+        self.assertEqual(len(_reader), len(_packets))
+        for i, _packet in enumerate(_packets):
+            _time, _data = _reader.record(i)
+            self.assertEqual(_data, _packet)
+            self.assertAlmostEqual(_time, _start + i * 0.06)
+        self.assertEqual(list(_reader.packets()), _packets)
+
+    def test_round_trip(self):
+        _packets = mk_call(30)
+        _writer = self.write(_packets)
+        self.assertEqual(len(_writer), len(_packets))
+        with captureReader(self.path) as _reader:
+            self.assertRecords(_reader, _packets)
+            self.assertEqual(_reader.packet(-1), _packets[-1])
+            self.assertRaises(IndexError, _reader.record, len(_packets))
+            self.assertEqual(_reader.entry(0)[1:], (ord(GROUP_VOICE), ord(VOICE_HEAD)))
+
+    def test_short_packet(self):
+        # Too short to have a burst type
+        _packets = [GROUP_DATA + 'x' * 10, mk_packet(GROUP_DATA, '\x06', 1)]
+        self.write(_packets)
+        with captureReader(self.path) as _reader:
+            self.assertRecords(_reader, _packets)
+            self.assertEqual(_reader.entry(0)[2], NO_BURST)
+
+    def test_append(self):
+        _first, _second = mk_call(10), mk_call(5, 100)
+        self.write(_first)
+        with captureWriter(self.path) as _writer:
+            self.assertEqual(len(_writer), len(_first))
+            for i, _packet in enumerate(_second):
+                _writer.write(_packet, 1000.0 + (len(_first) + i) * 0.06)
+        with captureReader(self.path) as _reader:
+            self.assertRecords(_reader, _first + _second)
+            # The old index was overwritten, not left in the middle of the records
+            self.assertEqual(len(_reader.find(VOICE_HEAD)), 2)
+
+    def test_never_closed(self):
+        _packets = mk_call(10)
+        _writer = captureWriter(self.path)
+        for i, _packet in enumerate(_packets):
+            _writer.write(_packet, 1000.0 + i * 0.06)
+        # Killed before close(): records but no index or trailer, and half of a record
+        _writer._file.write(pack('>dH', 2000.0, 54) + 'half')
+        _writer._file.close()
+
+        with captureReader(self.path) as _reader:
+            self.assertRecords(_reader, _packets)
+
+        # Opened for append, the half record goes and the index comes back
+        with captureWriter(self.path) as _writer:
+            self.assertEqual(len(_writer), len(_packets))
+            _writer.write(_packets[0], 1000.0 + len(_packets) * 0.06)
+        with captureReader(self.path) as _reader:
+            self.assertRecords(_reader, _packets + _packets[:1])
+
+    def test_find_and_template(self):
+        _call = mk_call(6)
+        _packets = _call + [mk_packet(GROUP_DATA, '\x06', 50)] + mk_call(3, 200)
+        self.write(_packets)
+        with captureReader(self.path) as _reader:
+            self.assertEqual(_reader.find(VOICE_HEAD), [0, 9])
+            self.assertEqual(_reader.find(VOICE_TERM), [7, 13])
+            self.assertEqual(_reader.find(SLOT1_VOICE), [1, 2, 3, 4, 5, 6, 10, 11, 12])
+            self.assertEqual(_reader.find('\x06'), [8])
+            self.assertEqual(_reader.find('\x06', GROUP_VOICE), [])
+            self.assertEqual(_reader.find('\x06', GROUP_DATA), [8])
+            self.assertEqual(_reader.find('\x8A'), [])
+            self.assertEqual(_reader.template(VOICE_HEAD), _packets[0])
+            self.assertEqual(_reader.template(SLOT1_VOICE, 7), _packets[11])
+            self.assertIsNone(_reader.template(SLOT1_VOICE, 9))
+            self.assertIsNone(_reader.template('\x8A'))
+
+    def test_not_a_capture(self):
+        open(self.path, 'wb').close()
+        self.assertRaises(CaptureError, captureReader, self.path)
+        with open(self.path, 'wb') as _f:
+            _f.write('not a capture at all')
+        self.assertRaises(CaptureError, captureReader, self.path)
+        self.assertRaises(CaptureError, captureWriter, self.path)
+
+    def test_empty_capture(self):
+        self.write([])
+        with captureReader(self.path) as _reader:
+            self.assertEqual(len(_reader), 0)
+            self.assertEqual(_reader.find(VOICE_HEAD), [])
+        # Just the magic, as left by a writer that was never closed
+        with open(self.path, 'wb') as _f:
+            _f.write(CAPTURE_MAGIC)
+        with captureReader(self.path) as _reader:
+            self.assertEqual(len(_reader), 0)
+
+    def test_convert_pickle(self):
+        _packets = mk_call(8)
+        _src = os.path.join(self.dir, 'recording.pickle')
+        with open(_src, 'wb') as _f:
+            pickle.dump(_packets, _f)
+        self.assertEqual(convert_legacy(_src, self.path), len(_packets))
+        with captureReader(self.path) as _reader:
+            self.assertEqual(list(_reader.packets()), _packets)
+            self.assertEqual(_reader.record(0)[0], 0.0)
+
+    def test_convert_template_bin(self):
+        with open(TEMPLATE_BIN, 'rb') as _f:
+            _raw = _f.read()
+        _packets = []
+        _offset = 0
+        while _offset < len(_raw):
+            _length = ord(_raw[_offset]) | ord(_raw[_offset + 1]) << 8
+            _packets.append(_raw[_offset + 4:_offset + 4 + _length])
+            _offset += 4 + _length
+
+        self.assertEqual(convert_legacy(TEMPLATE_BIN, self.path), len(_packets))
+        with captureReader(self.path) as _reader:
+            self.assertEqual(list(_reader.packets()), _packets)
+            self.assertEqual(len(_reader.find(VOICE_HEAD)), 3)
+            self.assertEqual(len(_reader.find(VOICE_TERM)), 1)
+            self.assertEqual(_reader.template(VOICE_TERM), _packets[-1])
+
+    def test_convert_nothing(self):
+        _src = os.path.join(self.dir, 'empty.bin')
+        open(_src, 'wb').close()
+        self.assertRaises(CaptureError, convert_legacy, _src, self.path)
+        self.assertFalse(os.path.exists(self.path))
+
+
+# One slot a second keeps the ring small: 0.1 minutes is 6 slots
+#
+class smallRecorder(ringRecorder):
+    RATE = 1
+    SLOT_SIZE = 64
+
+
+class ringRecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.recorder = smallRecorder('IPSC1', 0.1)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_partly_full(self):
+        _packets = mk_call(2)
+        for i, _packet in enumerate(_packets):
+            self.recorder.record(_packet, 100.0 + i)
+        self.assertEqual(len(self.recorder), 4)
+        self.assertEqual(self.recorder.snapshot(104.0), [(100.0 + i, _packet) for i, _packet in enumerate(_packets)])
+
+    def test_wraparound(self):
+        _packets = mk_call(8)
+        for i, _packet in enumerate(_packets):
+            self.recorder.record(_packet, 100.0 + i)
+        # Only the newest 6 are left, still oldest first
+        self.assertEqual(len(self.recorder), 6)
+        self.assertEqual(self.recorder.snapshot(110.0), [(100.0 + i, _packets[i]) for i in range(4, 10)])
+
+    def test_window(self):
+        for i in range(4):
+            self.recorder.record(mk_packet(GROUP_VOICE, SLOT1_VOICE, i), 100.0 + i * 2)
+        # Anything older than the 6 second window is left out, even though the ring holds it
+        self.assertEqual([_time for _time, _packet in self.recorder.snapshot(110.0)], [104.0, 106.0])
+        self.assertEqual([_time for _time, _packet in self.recorder.snapshot(106.0)], [100.0, 102.0, 104.0, 106.0])
+        self.assertEqual(self.recorder.snapshot(200.0), [])
+
+    def test_truncated(self):
+        _long = mk_packet(GROUP_DATA, '\x06', 1, 100)
+        _short = mk_packet(GROUP_VOICE, SLOT1_VOICE, 2)
+        self.recorder.record(_long, 100.0)
+        self.recorder.record(_short, 101.0)
+        self.assertEqual(self.recorder.truncated, 1)
+        self.assertEqual(self.recorder.snapshot(101.0), [(100.0, _long[:64]), (101.0, _short)])
+
+    def test_dump(self):
+        _packets = mk_call(3)
+        for i, _packet in enumerate(_packets):
+            self.recorder.record(_packet, 100.0 + i)
+        _file = ringRecorder.dump('IPSC1', self.recorder.snapshot(105.0), self.dir)
+        self.assertTrue(os.path.basename(_file).startswith('IPSC1-'))
+        with captureReader(_file) as _reader:
+            self.assertEqual([_reader.record(i) for i in range(len(_reader))], [(100.0 + i, _packet) for i, _packet in enumerate(_packets)])
+
+    def test_dumps_never_share_a_file(self):
+        # Every dump in the same millisecond gets the same name to start with
+        _saved = capture.time
+        capture.time = lambda: 1000000000.5
+        try:
+            _files = [ringRecorder.dump('IPSC1', [(100.0 + i, mk_packet(GROUP_VOICE, SLOT1_VOICE, i))], self.dir) for i in range(3)]
+            _threaded = []
+            _threads = [threading.Thread(target=lambda i=i: _threaded.append(ringRecorder.dump('IPSC1', [(200.0 + i, mk_packet(GROUP_VOICE, SLOT1_VOICE, 10 + i))], self.dir))) for i in range(4)]
+            for _thread in _threads:
+                _thread.start()
+            for _thread in _threads:
+                _thread.join()
+        finally:
+            capture.time = _saved
+
+        self.assertEqual(_files[1], _files[0][:-len('.cap')] + '-1.cap')
+        _files += _threaded
+        self.assertEqual(len(set(_files)), 7)
+        self.assertEqual(sorted(os.listdir(self.dir)), sorted(os.path.basename(_file) for _file in _files))
+        # Each has just the one packet it was given
+        _packets = set()
+        for _file in _files:
+            with captureReader(_file) as _reader:
+                self.assertEqual(len(_reader), 1)
+                _packets.add(_reader.packet(0))
+        self.assertEqual(len(_packets), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# Tests for ipsc.data_assembly. Times are given explicitly, so nothing here waits.
+#
+#   python -m unittest ipsc.test_data_assembly
+
+import unittest
+
+from ipsc.data_assembly import dataReassembly, blocks_to_follow, DATA_HEADER, DATA_BLOCK, DATA_TIMEOUT
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+# A data header as the 24 hex characters process_packet hands over: _first3 are the
+# characters handed back with the call, _udt is the 4th (5 for an MD-380 style UDT header),
+# and blocks-to-follow is the byte at BTF_BYTE
+#
+def mk_header(_btf, _first3='024', _udt='0'):
+    return _first3 + _udt + '0' * 12 + '{:02x}'.format(_btf) + '0' * 6
+
+# A distinct 24 hex character block for block _n of call _call
+#
+def mk_block(_call, _n):
+    return '{:02x}{:02x}'.format(_call, _n) * 6
+
+
+class dataReassemblyTest(unittest.TestCase):
+    def setUp(self):
+        self.reassembly = dataReassembly()
+
+    def test_blocks_to_follow(self):
+        self.assertEqual(blocks_to_follow(mk_header(3)), 3)
+        # Only the low 7 bits are the count
+        self.assertEqual(blocks_to_follow(mk_header(0x83)), 3)
+
+    def test_interleaved_calls(self):
+        # Four calls at once, from different systems, radios, destinations and timeslots
+        _calls = [
+            (('IPSC1', '\x00\x00\x01', '\x00\x00\x09', 1), 3, '024'),
+            (('IPSC1', '\x00\x00\x02', '\x00\x00\x09', 1), 2, '025'),
+            (('IPSC1', '\x00\x00\x01', '\x00\x00\x09', 2), 4, '026'),
+            (('IPSC2', '\x00\x00\x01', '\x00\x00\x08', 1), 1, '027')
+        ]
+        _now = 100.0
+        for _key, _btf, _first3 in _calls:
+            self.assertIsNone(self.reassembly.receive(*(_key + (DATA_HEADER, mk_header(_btf, _first3), _now))))
+        self.assertEqual(len(self.reassembly), 4)
+
+        _done = {}
+        for _n in range(4):
+            for i, (_key, _btf, _first3) in enumerate(_calls):
+                if _n >= _btf:
+                    continue
+                _now += 0.06
+                _result = self.reassembly.receive(*(_key + (DATA_BLOCK, mk_block(i, _n), _now)))
+                if _n < _btf - 1:
+                    self.assertIsNone(_result)
+                    self.assertEqual(self.reassembly.pending(*_key), _btf - _n - 1)
+                else:
+                    _done[_key] = _result
+
+        for i, (_key, _btf, _first3) in enumerate(_calls):
+            self.assertEqual(_done[_key], ('DATA', _first3, ''.join(mk_block(i, _n) for _n in range(_btf))))
+            self.assertIsNone(self.reassembly.pending(*_key))
+        _stats = self.reassembly.stats()
+        self.assertEqual(_stats['ACTIVE'], 0)
+        self.assertEqual(_stats['COMPLETED'], 4)
+        self.assertEqual(_stats['ORPHANS'], 0)
+
+    def test_udt_header(self):
+        _key = ('IPSC1', '\x00\x00\x01', '\x00\x00\x09', 1)
+        self.reassembly.receive(*(_key + (DATA_HEADER, mk_header(0, '024', '5'), 100.0)))
+        self.assertEqual(self.reassembly.pending(*_key), 1)
+        self.assertEqual(self.reassembly.receive(*(_key + (DATA_BLOCK, mk_block(0, 0), 100.06))), ('UDT', '024', mk_block(0, 0)))
+
+    def test_header_with_nothing_to_follow(self):
+        _key = ('IPSC1', '\x00\x00\x01', '\x00\x00\x09', 1)
+        self.reassembly.receive(*(_key + (DATA_HEADER, mk_header(0), 100.0)))
+        self.assertEqual(len(self.reassembly), 0)
+
+    def test_orphan_block(self):
+        _key = ('IPSC1', '\x00\x00\x01', '\x00\x00\x09', 1)
+        self.assertIsNone(self.reassembly.receive(*(_key + (DATA_BLOCK, mk_block(0, 0), 100.0))))
+        _stats = self.reassembly.stats()
+        self.assertEqual(_stats['ORPHANS'], 1)
+        self.assertEqual(_stats['ACTIVE'], 0)
+
+        # A block for some other call doesn't count towards one in progress
+        self.reassembly.receive(*(_key + (DATA_HEADER, mk_header(2), 101.0)))
+        self.reassembly.receive('IPSC1', '\x00\x00\x02', '\x00\x00\x09', 1, DATA_BLOCK, mk_block(1, 0), 101.06)
+        self.assertEqual(self.reassembly.pending(*_key), 2)
+        self.assertEqual(self.reassembly.stats()['ORPHANS'], 2)
+
+    def test_other_data_types_ignored(self):
+        _key = ('IPSC1', '\x00\x00\x01', '\x00\x00\x09', 1)
+        self.reassembly.receive(*(_key + (DATA_HEADER, mk_header(2), 100.0)))
+        self.assertIsNone(self.reassembly.receive(*(_key + (8, mk_block(0, 0), 100.06))))
+        self.assertEqual(self.reassembly.pending(*_key), 2)
+        self.assertEqual(self.reassembly.stats()['ORPHANS'], 0)
+
+    def test_restarted_call_abandons_the_old_one(self):
+        _key = ('IPSC1', '\x00\x00\x01', '\x00\x00\x09', 1)
+        self.reassembly.receive(*(_key + (DATA_HEADER, mk_header(3), 100.0)))
+        self.reassembly.receive(*(_key + (DATA_BLOCK, mk_block(0, 0), 100.06)))
+        self.reassembly.receive(*(_key + (DATA_HEADER, mk_header(1, '025'), 100.12)))
+        self.assertEqual(self.reassembly.receive(*(_key + (DATA_BLOCK, mk_block(1, 0), 100.18))), ('DATA', '025', mk_block(1, 0)))
+        self.assertEqual(self.reassembly.stats()['ABANDONED'], 1)
+
+    def test_expire(self):
+        _stale = ('IPSC1', '\x00\x00\x01', '\x00\x00\x09', 1)
+        _live = ('IPSC1', '\x00\x00\x02', '\x00\x00\x09', 1)
+        self.reassembly.receive(*(_stale + (DATA_HEADER, mk_header(3), 100.0)))
+        self.reassembly.receive(*(_stale + (DATA_BLOCK, mk_block(0, 0), 100.06)))
+        self.reassembly.receive(*(_live + (DATA_HEADER, mk_header(2), 100.0 + DATA_TIMEOUT)))
+
+        # Not yet: the timeout runs from the last block, not the header
+        self.assertEqual(self.reassembly.expire(100.06 + DATA_TIMEOUT - 0.01), [])
+        self.assertEqual(self.reassembly.expire(100.06 + DATA_TIMEOUT + 0.01), [_stale])
+        self.assertIsNone(self.reassembly.pending(*_stale))
+        self.assertEqual(self.reassembly.pending(*_live), 2)
+        _stats = self.reassembly.stats()
+        self.assertEqual(_stats['EXPIRED'], 1)
+        self.assertEqual(_stats['ACTIVE'], 1)
+
+        # The rest of the expired call has nothing to go with
+        self.assertIsNone(self.reassembly.receive(*(_stale + (DATA_BLOCK, mk_block(0, 1), 100.06 + DATA_TIMEOUT + 0.02))))
+        self.assertEqual(self.reassembly.stats()['ORPHANS'], 1)
+
+    def test_receive_sweeps_stale_calls(self):
+        _stale = ('IPSC1', '\x00\x00\x01', '\x00\x00\x09', 1)
+        self.reassembly.receive(*(_stale + (DATA_HEADER, mk_header(3), 100.0)))
+        # Any burst, for any call, more than a timeout later clears it out
+        self.reassembly.receive('IPSC2', '\x00\x00\x05', '\x00\x00\x09', 2, DATA_HEADER, mk_header(1), 100.0 + DATA_TIMEOUT * 2)
+        self.assertIsNone(self.reassembly.pending(*_stale))
+        self.assertEqual(self.reassembly.stats()['EXPIRED'], 1)
+        self.assertEqual(len(self.reassembly), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# Tests for ipsc.maidenhead. The expected values are what mh_to_aprs.py (Python 3,
+# maidenhead 1.8.0) printed for each square, e.g.
+#
+#   python3 mh_to_aprs.py CN97uk
+#
+#   python -m unittest ipsc.test_maidenhead
+
+import unittest
+
+from ipsc import maidenhead
+from ipsc.maidenhead import grid_to_aprs, to_location
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+# Captured from mh_to_aprs.py
+MH_TO_APRS = {
+    # 6 characters, all four quarters of the globe
+    'CN97uk': ('4725.  N', '12020.  W'),
+    'FN31pr': ('4142.  N', '07245.  W'),
+    'IO83qm': ('5330.  N', '00240.  W'),
+    'KP20le': ('6010.  N', '02455.  E'),
+    'QF56od': ('3352.  S', '15110.  E'),
+    'RE78ir': ('4117.  S', '17440.  E'),
+    'GG66sv': ('0237.  S', '04630.  W'),
+    'AB77lw': ('0724.  S', '01655.  W'),
+    'RR99xx': ('8957.  N', '17955.  E'),
+    'AA00aa': ('0900.  S', '01800.  W'),
+    # Single digit degrees or minutes, where zfill() pads the front
+    'JK30ed': ('0107.  N', '00620.  E'),
+    'JJ55mx': ('0557.  N', '00110.  E'),
+    'AD99aw': ('0505.  S', '01620.  W'),
+    # 4 characters
+    'CN97':   ('0470.  N', '01220.  W'),
+    'FN31':   ('0410.  N', '00740.  W'),
+    'KP20':   ('0600.  N', '00240.  E'),
+    'PF95':   ('0350.  S', '01380.  E'),
+    'GG66':   ('0240.  S', '00480.  W'),
+    'IJ99':   ('0090.  N', '00020.  W'),
+    'AA00':   ('0900.  S', '01800.  W'),
+    'RR99':   ('0890.  N', '01780.  E')
+}
+
+# mh_to_aprs.py failed on these too: within a degree of the equator or the prime meridian
+# it has no N/S or E/W, and fell over with a NameError
+NO_HEMISPHERE = ('JO01ab', 'IO91wm', 'JJ00aa', 'II99xx', 'JJ00')
+
+# Not grid squares. mh_to_aprs.py gave a ValueError for all but CN97zz, which it turned into
+# a position outside of CN97.
+NOT_SQUARES = ('SS00', 'CZ97', 'CN97zz', 'CN9X', 'AA0', 'C', '')
+
+
+class maidenheadTest(unittest.TestCase):
+    def setUp(self):
+        self._cache_size = maidenhead.GRID_CACHE_SIZE
+        maidenhead._GRID_CACHE.clear()
+
+    def tearDown(self):
+        maidenhead.GRID_CACHE_SIZE = self._cache_size
+        maidenhead._GRID_CACHE.clear()
+
+    def test_to_location(self):
+        # maidenhead.to_location(), Python 3
+        self.assertEqual(to_location('CN97uk'), (47.416666666666664, -120.33333333333333))
+        self.assertEqual(to_location('QF56od'), (-33.875, 151.16666666666666))
+        self.assertEqual(to_location('RR99xx'), (89.95833333333333, 179.91666666666666))
+        self.assertEqual(to_location('CN97'), (47.0, -122.0))
+        self.assertEqual(to_location('AA00aa'), (-90.0, -180.0))
+
+    def test_mh_to_aprs(self):
+        for _grid, _coord in MH_TO_APRS.items():
+            self.assertEqual(grid_to_aprs(_grid), _coord, _grid)
+
+    def test_case_and_whitespace(self):
+        self.assertEqual(grid_to_aprs('cn97uk'), MH_TO_APRS['CN97uk'])
+        self.assertEqual(grid_to_aprs('Fn31Pr'), MH_TO_APRS['FN31pr'])
+        self.assertEqual(grid_to_aprs(' qf56OD\n'), MH_TO_APRS['QF56od'])
+        self.assertEqual(grid_to_aprs('kp20'), MH_TO_APRS['KP20'])
+        # All of them are the same square as far as the cache goes
+        grid_to_aprs('CN97UK')
+        self.assertEqual(list(maidenhead._GRID_CACHE), ['FN31PR', 'QF56OD', 'KP20', 'CN97UK'])
+
+    def test_no_hemisphere(self):
+        for _grid in NO_HEMISPHERE:
+            self.assertRaises(ValueError, grid_to_aprs, _grid)
+        self.assertEqual(len(maidenhead._GRID_CACHE), 0)
+
+    def test_not_squares(self):
+        for _grid in NOT_SQUARES:
+            self.assertRaises(ValueError, grid_to_aprs, _grid)
+        self.assertEqual(len(maidenhead._GRID_CACHE), 0)
+
+    def test_cache_eviction(self):
+        maidenhead.GRID_CACHE_SIZE = 3
+        for _grid in ('CN97uk', 'FN31pr', 'QF56od'):
+            grid_to_aprs(_grid)
+        # Using CN97UK again makes FN31PR the least recently used
+        self.assertEqual(grid_to_aprs('CN97uk'), MH_TO_APRS['CN97uk'])
+        self.assertEqual(list(maidenhead._GRID_CACHE), ['FN31PR', 'QF56OD', 'CN97UK'])
+
+        self.assertEqual(grid_to_aprs('RE78ir'), MH_TO_APRS['RE78ir'])
+        self.assertEqual(list(maidenhead._GRID_CACHE), ['QF56OD', 'CN97UK', 'RE78IR'])
+
+        # An evicted square is worked out again, and evicts the next oldest
+        self.assertEqual(grid_to_aprs('FN31pr'), MH_TO_APRS['FN31pr'])
+        self.assertEqual(list(maidenhead._GRID_CACHE), ['CN97UK', 'RE78IR', 'FN31PR'])
+
+    def test_cache_hit(self):
+        _coord = grid_to_aprs('CN97uk')
+        self.assertIs(grid_to_aprs('CN97uk'), _coord)
+        self.assertEqual(len(maidenhead._GRID_CACHE), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# D-APRS user settings (SSID, icon, comment), kept in memory and keyed by DMR ID:
+#
+#   {3120001: [{'call': 'N0CALL'}, {'ssid': ''}, {'icon': ''}, {'comment': ''}], ...}
+#
+# The file holds the same dict written out as a Python literal, as it always has, so it can
+# still be edited by hand. It is read once and then only again when its mtime changes (checked
+# at most once every CHECK_INTERVAL seconds). Changes are written back SAVE_DELAY seconds after
+# the last one, so a burst of settings SMS is one write. Writes go to a temporary file that is
+# then renamed over the old one, in a thread, so a reader never sees half a file and the
+# reactor never waits on the disk.
+#
+# Everything except the file write happens in the reactor thread.
+
+import os
+
+from ast import literal_eval
+from time import time
+
+from twisted.internet import reactor, threads
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+CHECK_INTERVAL = 1.0
+SAVE_DELAY     = 2.0
+
+# Position of each setting in a user's entry
+SETTING_INDEX  = {'CALL': 0, 'SSID': 1, 'ICON': 2, 'COM': 3}
+SETTING_KEYS   = {'CALL': 'call', 'SSID': 'ssid', 'ICON': 'icon', 'COM': 'comment'}
+
+
+# Write _text to _path so that it's either all there or not at all
+#
+def atomic_write(_path, _text):
+    _tmp = '{}.tmp'.format(_path)
+    with open(_tmp, 'w') as _f:
+        _f.write(_text)
+        _f.flush()
+        os.fsync(_f.fileno())
+    os.rename(_tmp, _path)
+
+
+class userSettings(object):
+    def __init__(self, _path, _logger):
+        self.path = _path
+        self._logger = _logger
+        self._settings = {}
+        self._mtime = None
+        self._checked = 0
+        self._save_call = None
+        self._saving = False
+
+        self.loads = 0
+        self.saves = 0
+        self.load()
+
+    # Read the file, if it's there. A file that can't be read or parsed leaves the settings we
+    # already have alone.
+    #
+    def load(self):
+        try:
+            _mtime = os.stat(self.path).st_mtime
+            with open(self.path, 'r') as _f:
+                _text = _f.read()
+        except (IOError, OSError) as e:
+            if self._mtime is not None or not self.loads:
+                self._logger.info('User settings file %s not found (%s), starting with no user settings', self.path, e)
+            self._mtime = None
+            self.loads += 1
+            return
+        self._mtime = _mtime
+        self.loads += 1
+        try:
+            _settings = literal_eval(_text) if _text.strip() else {}
+        except (ValueError, SyntaxError) as e:
+            self._logger.error('User settings file %s could not be parsed (%s), keeping the settings already loaded', self.path, e)
+            return
+        if not isinstance(_settings, dict):
+            self._logger.error('User settings file %s does not hold a dict, keeping the settings already loaded', self.path)
+            return
+        self._settings = _settings
+        self._logger.info('User settings loaded from %s: %s users', self.path, len(self._settings))
+
+    # Reload if the file has changed since we last read or wrote it. Not while our own changes
+    # are waiting to be saved, as they would be lost; they are written over it instead.
+    #
+    def _check(self):
+        _now = time()
+        if _now - self._checked < CHECK_INTERVAL:
+            return
+        self._checked = _now
+        if self._save_call is not None or self._saving:
+            return
+        try:
+            _mtime = os.stat(self.path).st_mtime
+        except OSError:
+            _mtime = None
+        if _mtime != self._mtime:
+            self.load()
+
+    # All of the settings, as a dict keyed by DMR ID. Don't change it; use set().
+    #
+    def settings(self):
+        self._check()
+        return self._settings
+
+    # One user's entry, or None
+    #
+    def get(self, _dmr_id):
+        self._check()
+        return self._settings.get(_dmr_id)
+
+    # Change one setting ('SSID', 'ICON' or 'COM') for a user, creating their entry with
+    # _call if they don't have one yet
+    #
+    def set(self, _dmr_id, _setting, _value, _call=''):
+        _setting = _setting.upper()
+        if _setting not in SETTING_INDEX:
+            raise KeyError('unknown user setting "{}"'.format(_setting))
+        self._check()
+        if _dmr_id not in self._settings:
+            self._settings[_dmr_id] = [{'call': str(_call)}, {'ssid': ''}, {'icon': ''}, {'comment': ''}]
+        self._settings[_dmr_id][SETTING_INDEX[_setting]][SETTING_KEYS[_setting]] = _value
+        self.schedule_save()
+
+    def schedule_save(self):
+        if self._save_call is not None and self._save_call.active():
+            self._save_call.reset(SAVE_DELAY)
+        else:
+            self._save_call = reactor.callLater(SAVE_DELAY, self.save)
+
+    # Write the settings out now. Returns a Deferred that fires when they're on disk.
+    #
+    def save(self):
+        if self._save_call is not None and self._save_call.active():
+            self._save_call.cancel()
+        self._save_call = None
+        self._saving = True
+        _d = threads.deferToThread(atomic_write, self.path, str(self._settings))
+        _d.addCallbacks(self._saved, self._save_failed)
+        return _d
+
+    def _saved(self, _result):
+        self._saving = False
+        self.saves += 1
+        try:
+            self._mtime = os.stat(self.path).st_mtime
+        except OSError:
+            self._mtime = None
+        self._logger.info('User settings saved to %s', self.path)
+
+    def _save_failed(self, _failure):
+        self._saving = False
+        self._logger.error('User settings could not be saved to %s: %s', self.path, _failure.getErrorMessage())
+
+    # Save anything waiting, e.g. at shutdown
+    #
+    def flush(self):
+        if self._save_call is not None:
+            return self.save()
@@ -0,0 +1,165 @@
+###############################################################################
+#   Copyright (C) 2016  Cortney T. Buffington, N0MJS <n0mjs@me.com>
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software Foundation,
+#   Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+###############################################################################
+
+# A small pool of worker threads for the slow side effects of D-APRS traffic: SMTP, dashboard
+# files, user commands. The reactor only decides what has to be done and queues it; a worker
+# does it and, if asked, hands the result back to a callback in the reactor thread.
+#
+# The queue is bounded. When it's full, new work is refused and counted rather than letting
+# a dead SMTP server pile up work without limit. Every job belongs to a stage (a name such as
+# 'EMAIL'), and for each stage we keep how long jobs waited in the queue and how long they
+# took to run.
+
+from threading import Thread, Lock
+from Queue import Queue, Full
+from time import time
+
+from twisted.internet import reactor
+
+__author__     = 'Cortney T. Buffington, N0MJS'
+__copyright__  = 'Copyright (c) 2016 Cortney T. Buffington, N0MJS and the K0USY Group'
+__license__    = 'GNU GPLv3'
+__maintainer__ = 'Cort Buffington, N0MJS'
+__email__      = 'n0mjs@me.com'
+
+
+WORKERS    = 2
+QUEUE_SIZE = 100
+
+
+class stageStats(object):
+    __slots__ = ('done', 'failed', 'dropped', 'wait_sum', 'wait_max', 'run_sum', 'run_max')
+
+    def __init__(self):
+        self.done = 0
+        self.failed = 0
+        self.dropped = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.run_sum = 0.0
+        self.run_max = 0.0
+
+
+class workerPool(object):
+    def __init__(self, _logger, _workers=WORKERS, _queue_size=QUEUE_SIZE, _name='worker'):
+        self._logger = _logger
+        self._workers = _workers
+        self._name = _name
+        self._queue = Queue(_queue_size)
+        self._threads = []
+        self._lock = Lock()
+        self._stages = {}
+
+    def start(self):
+        if not self._threads:
+            for i in xrange(self._workers):
+                _thread = Thread(target=self._run, name='{}-{}'.format(self._name, i))
+                _thread.daemon = True
+                _thread.start()
+                self._threads.append(_thread)
+        return self
+
+    # Let the workers finish what's queued, waiting up to _timeout seconds for them
+    #
+    def stop(self, _timeout=5.0):
+        for _thread in self._threads:
+            try:
+                self._queue.put(None, timeout=_timeout)
+            except Full:
+                break
+        _deadline = time() + _timeout
+        for _thread in self._threads:
+            _thread.join(max(_deadline - time(), 0))
+        self._threads = []
+        self._logger.info('Worker pool stopped: %s', self.stats())
+
+    def _stage(self, _name):
+        _stats = self._stages.get(_name)
+        if _stats is None:
+            _stats = self._stages[_name] = stageStats()
+        return _stats
+
+    # Queue _func(*_args) to run in a worker. If _callback is given, it's called in the reactor
+    # thread with the result. Returns False, and the job is dropped, if the queue is full.
+    #
+    def submit(self, _stage, _func, *_args, **_kwargs):
+        _callback = _kwargs.pop('_callback', None)
+        try:
+            self._queue.put_nowait((_stage, _func, _args, _callback, time()))
+        except Full:
+            with self._lock:
+                self._stage(_stage).dropped += 1
+            self._logger.warning('Worker queue full, %s job dropped', _stage)
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            _job = self._queue.get()
+            if _job is None:
+                return
+            _stage, _func, _args, _callback, _queued = _job
+            _start = time()
+            try:
+                _result = _func(*_args)
+                _failed = None
+            except Exception as e:
+                _result = None
+                _failed = e
+            _end = time()
+
+            with self._lock:
+                _stats = self._stage(_stage)
+                _wait = _start - _queued
+                _took = _end - _start
+                _stats.wait_sum += _wait
+                _stats.run_sum += _took
+                if _wait > _stats.wait_max:
+                    _stats.wait_max = _wait
+                if _took > _stats.run_max:
+                    _stats.run_max = _took
+                if _failed is None:
+                    _stats.done += 1
+                else:
+                    _stats.failed += 1
+
+            if _failed is not None:
+                reactor.callFromThread(self._logger.error, '%s job failed: %s', _stage, _failed)
+            elif _callback is not None:
+                reactor.callFromThread(_callback, _result)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    # Per stage: jobs done, failed and dropped, and mean/max queue wait and run time in ms
+    #
+    def stats(self):
+        _stats = {'QUEUED': self._queue.qsize()}
+        with self._lock:
+            for _name, _stage in self._stages.iteritems():
+                _count = _stage.done + _stage.failed
+                _stats[_name] = {
+                    'DONE': _stage.done,
+                    'FAILED': _stage.failed,
+                    'DROPPED': _stage.dropped,
+                    'WAIT_MEAN': _stage.wait_sum / _count * 1000 if _count else 0.0,
+                    'WAIT_MAX': _stage.wait_max * 1000,
+                    'RUN_MEAN': _stage.run_sum / _count * 1000 if _count else 0.0,
+                    'RUN_MAX': _stage.run_max * 1000
+                }
+        return _stats
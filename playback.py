@@ -45,10 +45,17 @@ HEX_TGID    = hex_str_3(TGID)
 HEX_SUB     = hex_str_3(SUB)
 BOGUS_SUB   = '\xFF\xFF\xFF'
 
+# Playback starts this long (seconds) after the end of the recorded transmission
+GROUP_HOLDOFF   = 2
+PRIVATE_HOLDOFF = 1
+
+
 class playbackIPSC(IPSC):
     def __init__(self, _name, _config, _logger, _report):
         IPSC.__init__(self, _name, _config, _logger, _report)
-        self.CALL_DATA = []
+        
+        # Transmissions being recorded, per timeslot
+        self.CALL_DATA = {1: [], 2: []}
         
         if GROUP_SRC_SUB:
             self._logger.info('Playback: USING SUBSCRIBER ID: %s FOR GROUP REPEAT', GROUP_SRC_SUB)
@@ -60,6 +67,15 @@ class playbackIPSC(IPSC):
         if PRIVATE_REPEAT:
             self._logger.info('Playback: PRIVATE REPEAT ENABLED')
         
+    # Play _frames back on timeslot _ts after _delay seconds, paced from the reactor
+    #
+    def play(self, _ts, _frames, _delay):
+        self.send_paced(_ts, _frames, _delay, lambda _pacer: self.playback_done(_ts, _pacer))
+        
+    def playback_done(self, _ts, _pacer):
+        _stats = _pacer.stats()
+        self._logger.info('(%s) Playback on TS%s complete: %s frames, %s late, jitter mean %.1fms max %.1fms', self._system, _ts, _stats['FRAMES'], _stats['LATE'], _stats['JITTER_MEAN'], _stats['JITTER_MAX'])
+    
     #************************************************
     #     CALLBACK FUNCTIONS FOR USER PACKET TYPES
     #************************************************
@@ -68,49 +84,49 @@ class playbackIPSC(IPSC):
         def group_voice(self, _src_sub, _dst_sub, _ts, _end, _peerid, _data):
             if HEX_TGID == _dst_sub and _ts in GROUP_TS:
                 if not _end:
-                    if not self.CALL_DATA:
+                    if not self.CALL_DATA[_ts]:
                         self._logger.info('(%s) Receiving transmission to be played back from subscriber: %s', self._system, int_id(_src_sub))
                     _tmp_data = _data
                     #_tmp_data = dmr_nat(_data, _src_sub, self._config['LOCAL']['RADIO_ID'])
-                    self.CALL_DATA.append(_tmp_data)
+                    self.CALL_DATA[_ts].append(_tmp_data)
                 if _end:
-                    self.CALL_DATA.append(_data)
-                    time.sleep(2)
+                    self.CALL_DATA[_ts].append(_data)
                     self._logger.info('(%s) Playing back transmission from subscriber: %s', self._system, int_id(_src_sub))
-                    for i in self.CALL_DATA:
+                    _frames = []
+                    for i in self.CALL_DATA[_ts]:
                         _tmp_data = i
                         _tmp_data = _tmp_data.replace(_peerid, self._config['LOCAL']['RADIO_ID'])
                         if GROUP_SRC_SUB:
                             _tmp_data = _tmp_data.replace(_src_sub, self.GROUP_SRC_SUB)
-                        # Send the packet to all peers in the target IPSC
-                        self.send_to_ipsc(_tmp_data)
-                        time.sleep(0.06)
-                    self.CALL_DATA = []
+                        _frames.append(_tmp_data)
+                    # Send the packets to all peers in the target IPSC
+                    self.play(_ts, _frames, GROUP_HOLDOFF)
+                    self.CALL_DATA[_ts] = []
                 
     if PRIVATE_REPEAT:
         def private_voice(self, _src_sub, _dst_sub, _ts, _end, _peerid, _data):
             if HEX_SUB == _dst_sub and _ts in PRIVATE_TS:
                 if not _end:
-                    if not self.CALL_DATA:
+                    if not self.CALL_DATA[_ts]:
                         self._logger.info('(%s) Receiving transmission to be played back from subscriber: %s, to subscriber: %s', self._system, int_id(_src_sub), int_id(_dst_sub))
                     _tmp_data = _data
-                    self.CALL_DATA.append(_tmp_data)
+                    self.CALL_DATA[_ts].append(_tmp_data)
                 if _end:
-                    self.CALL_DATA.append(_data)
-                    time.sleep(1)
+                    self.CALL_DATA[_ts].append(_data)
                     self._logger.info('(%s) Playing back transmission from subscriber: %s, to subscriber %s', self._system, int_id(_src_sub), int_id(_dst_sub))
                     _orig_src = _src_sub
                     _orig_dst = _dst_sub
-                    for i in self.CALL_DATA:
+                    _frames = []
+                    for i in self.CALL_DATA[_ts]:
                         _tmp_data = i
                         _tmp_data = _tmp_data.replace(_peerid, self._config['LOCAL']['RADIO_ID'])
                         _tmp_data = _tmp_data.replace(_dst_sub, BOGUS_SUB)
                         _tmp_data = _tmp_data.replace(_src_sub, _orig_dst)
                         _tmp_data = _tmp_data.replace(BOGUS_SUB, _orig_src)
-                        # Send the packet to all peers in the target IPSC
-                        self.send_to_ipsc(_tmp_data)
-                        time.sleep(0.06)
-                    self.CALL_DATA = []
+                        _frames.append(_tmp_data)
+                    # Send the packets to all peers in the target IPSC
+                    self.play(_ts, _frames, PRIVATE_HOLDOFF)
+                    self.CALL_DATA[_ts] = []
         
 
 if __name__ == '__main__':
@@ -120,7 +136,7 @@ if __name__ == '__main__':
     import signal
     
     from ipsc.dmrlink_config import build_config
-    from ipsc.dmrlink_log import config_logging
+    from ipsc.dmrlink_log import config_logging, flush_logging
     
     # Change the current directory to the location of the application
     os.chdir(os.path.dirname(os.path.realpath(sys.argv[0])))
@@ -152,10 +168,15 @@ if __name__ == '__main__':
         for system in systems:
             systems[system].de_register_self()
         reactor.stop()
+        flush_logging(logger)
     
     for sig in [signal.SIGTERM, signal.SIGINT, signal.SIGQUIT]:
         signal.signal(sig, sig_handler)
     
+    # The reactor replaces our SIGINT/SIGTERM handlers with its own, so flush the log queue
+    # on its way down too
+    reactor.addSystemEventTrigger('after', 'shutdown', flush_logging, logger)
+    
     # INITIALIZE THE REPORTING LOOP
     report_server = config_reports(CONFIG, logger, reportFactory)
     
@@ -51,11 +51,13 @@ from time import time
 from importlib import import_module
 
 import sys
+import logging
 
 from dmr_utils.utils import hex_str_3, hex_str_4, int_id
 
 from dmrlink import IPSC, mk_ipsc_systems, systems, reportFactory, REPORT_OPCODES, build_aliases, config_reports
 from ipsc.ipsc_const import BURST_DATA_TYPE
+from ipsc.dmrlink_acl import load_acl
 
 
 __author__      = 'Cortney T. Buffington, N0MJS'
@@ -67,52 +69,14 @@ __email__       = 'n0mjs@me.com'
 
 
 # Import subscriber ACL
-# ACL may be a single list of subscriber IDs
-# Global action is to allow or deny them. Multiple lists with different actions and ranges
-# are not yet implemented.
+# ACL may be a single 'PERMIT|DENY:id,start-end,...' list, or several of them where the
+# first list containing an ID decides. See ipsc/dmrlink_acl.py
 def build_acl(_sub_acl):
-    try:
-        logger.info('ACL file found, importing entries. This will take about 1.5 seconds per 1 million IDs')
-        acl_file = import_module(_sub_acl)
-        sections = acl_file.ACL.split(':')
-        ACL_ACTION = sections[0]
-        entries_str = sections[1]
-        ACL = set()
-        
-        for entry in entries_str.split(','):
-            if '-' in entry:
-                start,end = entry.split('-')
-                start,end = int(start), int(end)
-                for id in range(start, end+1):
-                    ACL.add(hex_str_3(id))
-            else:
-                id = int(entry)
-                ACL.add(hex_str_3(id))
-        
-        logger.info('ACL loaded: action "{}" for {:,} radio IDs'.format(ACL_ACTION, len(ACL)))
-    
-    except ImportError:
-        logger.info('ACL file not found or invalid - all subscriber IDs are valid')
-        ACL_ACTION = 'NONE'
+    ACL = load_acl(_sub_acl, logger)
 
-    # Depending on which type of ACL is used (PERMIT, DENY... or there isn't one)
-    # define a differnet function to be used to check the ACL
+    # The function used to check the ACL in the packet handlers
     global allow_sub
-    if ACL_ACTION == 'PERMIT':
-        def allow_sub(_sub):
-            if _sub in ACL:
-                return True
-            else:
-                return False
-    elif ACL_ACTION == 'DENY':
-        def allow_sub(_sub):
-            if _sub not in ACL:
-                return True
-            else:
-                return False
-    else:
-        def allow_sub(_sub):
-            return True
+    allow_sub = ACL.allow
     
     return ACL
 
@@ -131,11 +95,13 @@ class proxyIPSC(IPSC):
     def group_voice(self, _src_sub, _dst_group, _ts, _end, _peerid, _data):
         # Check for ACL match, and return if the subscriber is not allowed
         if allow_sub(_src_sub) == False:
-            self._logger.warning('(%s) Group Voice Packet ***REJECTED BY ACL*** From: %s, IPSC Peer %s, Destination %s', self._system, int_id(_src_sub), int_id(_peerid), int_id(_dst_group))
+            if self._limiter.allow('ACL', int_id(_src_sub)):
+                self._logger.warning('(%s) Group Voice Packet ***REJECTED BY ACL*** From: %s, IPSC Peer %s, Destination %s', self._system, int_id(_src_sub), int_id(_peerid), int_id(_dst_group))
             return
         
         # Process the packet
-        self._logger.debug('(%s) Group Voice Packet Received From: %s, IPSC Peer %s, Destination %s', self._system, int_id(_src_sub), int_id(_peerid), int_id(_dst_group))
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug('(%s) Group Voice Packet Received From: %s, IPSC Peer %s, Destination %s', self._system, int_id(_src_sub), int_id(_peerid), int_id(_dst_group))
         _burst_data_type = _data[30] # Determine the type of voice packet this is (see top of file for possible types)
         _seq_id = _data[5]
         
@@ -191,7 +157,7 @@ if __name__ == '__main__':
     import signal
     
     from ipsc.dmrlink_config import build_config
-    from ipsc.dmrlink_log import config_logging
+    from ipsc.dmrlink_log import config_logging, flush_logging
     
     # Change the current directory to the location of the application
     os.chdir(os.path.dirname(os.path.realpath(sys.argv[0])))
@@ -223,10 +189,15 @@ if __name__ == '__main__':
         for system in systems:
             systems[system].de_register_self()
         reactor.stop()
+        flush_logging(logger)
     
     for sig in [signal.SIGTERM, signal.SIGINT, signal.SIGQUIT]:
         signal.signal(sig, sig_handler)
     
+    # The reactor replaces our SIGINT/SIGTERM handlers with its own, so flush the log queue
+    # on its way down too
+    reactor.addSystemEventTrigger('after', 'shutdown', flush_logging, logger)
+    
     
     
     # PROXY.PY SPECIFIC ITEMS GO HERE:
@@ -2,5 +2,28 @@
 # Each entry may be a single radio id, or a hypenated range (e.g. 1-2999)
 # Format:
 # ACL = 'action:id|start-end|,id|start-end,....'
+#
+# Several lists may be given, most specific first. The first list that
+# contains a radio id decides for it; ids in none of the lists get the
+# opposite of the last list's action. For example, to allow only 3120000-
+# 3129999 except for 3120500:
+# ACL = ['DENY:3120500', 'PERMIT:3120000-3129999']
 
-ACL = 'DENY:1-2999,16777215'
\ No newline at end of file
+ACL = 'DENY:1-2999,16777215'
+
+# Optional ACLs for a single IPSC system (as named in dmrlink.cfg), checked
+# by confbridge.py when a call starts, both on the system it comes in on and
+# on every system it would be bridged to. Every ACL that applies to a call
+# has to allow it, in addition to ACL above:
+#   SUB       - source radio ids
+#   TGID      - destination talkgroups
+#   TGID_SUB  - source radio ids, for one destination talkgroup
+#   TS1, TS2  - any of the above, for one timeslot only
+#
+# SYSTEM_ACL = {
+#     'IPSC1': {
+#         'TGID': 'PERMIT:1-99,3100',
+#         'TGID_SUB': {3100: 'PERMIT:3120000-3129999'},
+#         'TS2': {'TGID': 'PERMIT:9'}
+#     }
+# }